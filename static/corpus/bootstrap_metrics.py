@@ -0,0 +1,343 @@
+"""
+Bootstrap confidence intervals of the layout metrics.
+
+The lines of the corpus are the resampled units. For each layout, the
+n-grams of every line are first projected on the masks of the evaluator,
+giving a small array of counts per line: bigrams on keys, same finger
+bigrams and their distance, skipgrams, trigrams, rolls… A resample draws
+as many lines as the corpus has, with replacement, so its totals are the
+number of draws of each line times this array: a matrix product, computed
+for batches of resamples across processes.
+
+The same resamples are used for every layout, so the differences between
+two layouts get their own intervals: a difference whose interval contains
+zero is within the noise of the corpus.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from layout_metrics import (
+    LAYOUTS_DIRECTORY,
+    LayoutEvaluator,
+    load_layout,
+    typed_character,
+)
+from ngrams import (
+    ALPHABET,
+    CORPUS_DIRECTORY,
+    OTHER,
+    SIZE,
+    corpus_files,
+    count_files,
+    encode,
+    read_corpus_text,
+)
+
+# The counts of each line, per layout
+STATISTICS = (
+    "bigrams",
+    "sfb",
+    "distance",
+    "skipgrams",
+    "sfs",
+    "trigrams",
+    "alternation",
+    "roll_in",
+    "roll_out",
+    "redirect",
+)
+# Each metric is a sum of statistics over another one
+METRICS = {
+    "sfb": (("sfb",), "bigrams"),
+    "sfs": (("sfs",), "skipgrams"),
+    "distance": (("distance",), "bigrams"),
+    "alternation": (("alternation",), "trigrams"),
+    "rolls": (("roll_in", "roll_out"), "trigrams"),
+    "redirect": (("redirect",), "trigrams"),
+}
+
+# Index ending each file, past the alphabet and OTHER
+SEPARATOR = SIZE
+
+# Resamples drawn by a process at a time, in a single matrix product
+BATCH_SIZE = 50
+
+
+@dataclass
+class CorpusLines:
+    """The corpus as typed characters, with the line of each one.
+
+    Attributes:
+        characters: The index of each character among those of the
+            evaluator, its length for the characters it ignores and for
+            the separators between files.
+        lines: The line index of each character.
+        count: The number of lines.
+    """
+
+    characters: np.ndarray
+    lines: np.ndarray
+    count: int
+
+    @classmethod
+    def from_files(
+        cls, paths: list[Path], evaluator: LayoutEvaluator
+    ) -> "CorpusLines":
+        outside = len(evaluator.characters)
+        fold = np.full(SIZE + 1, outside, dtype=np.int16)
+        fold[:OTHER] = [
+            evaluator.characters.index(typed_character(char))
+            for char in ALPHABET
+        ]
+        # Each file is followed by a separator, so that no n-gram spans
+        # two files, as in the corpus counts
+        indices = np.concatenate(
+            [
+                np.append(
+                    encode(read_corpus_text(path)).astype(np.int16), SEPARATOR
+                )
+                for path in paths
+            ]
+        )
+        ends = (indices == ALPHABET.index("\n")) | (indices == SEPARATOR)
+        lines = np.concatenate([[0], np.cumsum(ends[:-1])])
+        return cls(fold[indices], lines, int(lines[-1]) + 1)
+
+
+def finger_travel(evaluator: LayoutEvaluator) -> np.ndarray:
+    """Distance between the keys of each same finger bigram, flattened."""
+    keyboard = evaluator.keyboard
+    row = np.append(keyboard.row, 0)
+    column = np.append(keyboard.column, 0)
+    travel = np.hypot(
+        row[:, None] - row[None, :], column[:, None] - column[None, :]
+    )
+    return travel.ravel() * evaluator.bigram_masks[1]
+
+
+def line_statistics(
+    evaluator: LayoutEvaluator, corpus: CorpusLines, layout: dict[str, str]
+) -> np.ndarray:
+    """The STATISTICS of each line, an array of shape (lines, STATISTICS).
+
+    An n-gram counts in the line of its first character.
+    """
+    keyboard = evaluator.keyboard
+    placement = np.append(evaluator.placement(layout), keyboard.none)
+    keys = placement[corpus.characters].astype(np.intp)
+    pairs = keys[:-1] * keyboard.size + keys[1:]
+    skips = keys[:-2] * keyboard.size + keys[2:]
+    triples = pairs[:-1] * keyboard.size + keys[2:]
+
+    real_bigram, same_finger = evaluator.bigram_masks
+    masked = {
+        "bigrams": (real_bigram, pairs),
+        "sfb": (same_finger, pairs),
+        "distance": (finger_travel(evaluator), pairs),
+        "skipgrams": (real_bigram, skips),
+        "sfs": (same_finger, skips),
+        **{
+            name: (mask, triples)
+            for name, mask in zip(
+                ("trigrams", "alternation", "roll_in", "roll_out", "redirect"),
+                evaluator.trigram_masks,
+            )
+        },
+    }
+    statistics = np.empty((corpus.count, len(STATISTICS)))
+    for column, name in enumerate(STATISTICS):
+        mask, ngrams = masked[name]
+        statistics[:, column] = np.bincount(
+            corpus.lines[: len(ngrams)],
+            weights=mask[ngrams],
+            minlength=corpus.count,
+        )
+    return statistics
+
+
+def metric_values(totals: np.ndarray) -> np.ndarray:
+    """The METRICS of statistics totals, along the last axis."""
+    values = []
+    for numerators, denominator in METRICS.values():
+        numerator = sum(
+            totals[..., STATISTICS.index(name)] for name in numerators
+        )
+        total = totals[..., STATISTICS.index(denominator)]
+        values.append(np.divide(numerator, np.maximum(total, 1)))
+    return np.stack(values, axis=-1)
+
+
+_statistics = None
+
+
+def _set_statistics(statistics: np.ndarray) -> None:
+    global _statistics
+    _statistics = statistics
+
+
+def _resample_totals(seed: np.random.SeedSequence, resamples: int):
+    """Statistics totals of resamples of the lines, in batches."""
+    lines = len(_statistics)
+    generator = np.random.default_rng(seed)
+    totals = []
+    for start in range(0, resamples, BATCH_SIZE):
+        batch = min(BATCH_SIZE, resamples - start)
+        draws = np.stack(
+            [
+                np.bincount(
+                    generator.integers(0, lines, lines), minlength=lines
+                )
+                for _ in range(batch)
+            ]
+        )
+        totals.append(draws @ _statistics)
+    return np.concatenate(totals)
+
+
+def bootstrap_totals(
+    statistics: np.ndarray,
+    resamples: int = 1000,
+    seed: int = 0,
+    nb_processes: int | None = None,
+) -> np.ndarray:
+    """Totals of resamples of the lines of per line statistics.
+
+    Args:
+        statistics: The statistics of each line, as returned by
+            `line_statistics`, or such arrays of several layouts stacked
+            along a second axis.
+        resamples: The number of resamples.
+        seed: The seed of the resamples, split between the processes.
+
+    Returns:
+        An array of shape (resamples, *statistics.shape[1:]).
+    """
+    flat = statistics.reshape(len(statistics), -1)
+    chunks = min(nb_processes or os.cpu_count() or 1, resamples)
+    with ProcessPoolExecutor(
+        chunks, initializer=_set_statistics, initargs=(flat,)
+    ) as executor:
+        sizes = [len(part) for part in np.array_split(range(resamples), chunks)]
+        seeds = np.random.SeedSequence(seed).spawn(chunks)
+        totals = np.concatenate(
+            list(executor.map(_resample_totals, seeds, sizes))
+        )
+    return totals.reshape(resamples, *statistics.shape[1:])
+
+
+@dataclass
+class Interval:
+    """A metric estimated on the corpus and its confidence interval."""
+
+    estimate: float
+    low: float
+    high: float
+
+    @property
+    def significant(self) -> bool:
+        """Whether the interval of a difference excludes zero."""
+        return self.low > 0 or self.high < 0
+
+
+def intervals(
+    estimates: np.ndarray, resampled: np.ndarray, confidence: float
+) -> dict[str, Interval]:
+    """Percentile intervals of METRICS values and of their resamples."""
+    low, high = np.quantile(
+        resampled, [(1 - confidence) / 2, (1 + confidence) / 2], axis=0
+    )
+    return {
+        name: Interval(float(estimates[i]), float(low[i]), float(high[i]))
+        for i, name in enumerate(METRICS)
+    }
+
+
+def bootstrap_layouts(
+    layouts: dict[str, dict[str, str]],
+    paths: list[Path],
+    reference: str,
+    resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    nb_processes: int | None = None,
+) -> tuple[dict, dict]:
+    """Confidence intervals of the metrics of layouts on corpus files.
+
+    Returns:
+        The intervals of the metrics of each layout, and those of their
+        differences with the `reference` layout.
+    """
+    evaluator = LayoutEvaluator(count_files(paths))
+    corpus = CorpusLines.from_files(paths, evaluator)
+    names = list(layouts)
+    statistics = np.stack(
+        [line_statistics(evaluator, corpus, layouts[name]) for name in names],
+        axis=1,
+    )
+    estimates = metric_values(statistics.sum(axis=0))
+    resampled = metric_values(
+        bootstrap_totals(statistics, resamples, seed, nb_processes)
+    )
+
+    index = names.index(reference)
+    by_layout = {
+        name: intervals(estimates[i], resampled[:, i], confidence)
+        for i, name in enumerate(names)
+    }
+    differences = {
+        name: intervals(
+            estimates[i] - estimates[index],
+            resampled[:, i] - resampled[:, index],
+            confidence,
+        )
+        for i, name in enumerate(names)
+        if i != index
+    }
+    return by_layout, differences
+
+
+def main(corpus="fr", reference="ergopti_v2.2", resamples=1000):
+    start = time.perf_counter()
+    layouts = {
+        path.stem: load_layout(path)
+        for path in sorted(LAYOUTS_DIRECTORY.glob("*.json"))
+    }
+    by_layout, differences = bootstrap_layouts(
+        layouts,
+        corpus_files(CORPUS_DIRECTORY / corpus),
+        reference,
+        resamples,
+    )
+
+    def row(name: str, metrics: dict[str, Interval], sign: str = "") -> str:
+        cells = []
+        for metric, interval in metrics.items():
+            # The distance is in keys per bigram, the others are rates
+            spec = f"{sign}.4f" if metric == "distance" else f"{sign}.2%"
+            cell = (
+                f"{interval.estimate:{spec}} "
+                f"[{interval.low:{spec}}, {interval.high:{spec}}]"
+            )
+            if sign and interval.significant:
+                cell += "*"
+            cells.append(f"{cell:<27}")
+        return f"{name:<18} " + " ".join(cells)
+
+    print(f"{'Disposition':<18} " + " ".join(f"{m:<27}" for m in METRICS))
+    for name, metrics in by_layout.items():
+        print(row(name, metrics))
+    print(f"\nDifférences avec {reference} (* : hors du bruit)")
+    for name, metrics in differences.items():
+        print(row(name, metrics, "+"))
+    print(
+        f"{resamples} rééchantillonnages en {time.perf_counter() - start:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
@@ -1,269 +1,38 @@
-import os
+import codecs
+import csv
+import io
+import json
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from hotstrings_rules import load_compiled_stages
+from ngrams import is_compressed, open_corpus_file
+from rewrite_engine import RewriteStage
 
 
 # ==================================================
 # ==================================================
-# ======= Fonctions de remplacement de texte =======
+# ========= Règles de remplacement de texte ========
 # ==================================================
 # ==================================================
 
 
-def conversion_apostrophe_typo(texte):
-    texte = texte.replace("’", "'")
-    return texte
-
-
-# Raccourcis avec ★
-def raccourcis_magique(texte):
-    texte = texte.replace("ainsi", "a★")
-    texte = texte.replace("c'est", "c★")
-    texte = texte.replace("c'était", "ct★")
-    texte = texte.replace("déjà", "dé★")
-    texte = texte.replace("donc", "d★")
-    texte = texte.replace("d'être", "dê★")
-    texte = texte.replace("l'être", "lê★")
-    texte = texte.replace("être", "ê★")
-    texte = texte.replace("faire", "f★")
-    texte = texte.replace("heure", "h★")
-    texte = texte.replace("j'étais", "gt★")
-    texte = texte.replace("j'ai", "g★")
-    texte = texte.replace("mais", "m★")
-    texte = texte.replace("nouveau", "n★")
-    texte = texte.replace("prendre", "p★")
-    texte = texte.replace("question", "q★")
-    texte = texte.replace("rien", "r★")
-    texte = texte.replace("sous", "s★")
-    texte = texte.replace("très", "t★")
-    texte = texte.replace("exemple", "x★")
-    return texte
-
-
-# La touche A devient un J si elle est suivie d’une voyelle
-def virgule_devient_j(texte):
-    texte = texte.replace("ja", ",a")
-    texte = texte.replace("Ja", ";a")
-    texte = texte.replace("JA", ";A")
-    texte = texte.replace("je", ",e")
-    texte = texte.replace("Je", ";e")
-    texte = texte.replace("JE", ";E")
-    texte = texte.replace("ji", ",i")
-    texte = texte.replace("Ji", ";i")
-    texte = texte.replace("JI", ";I")
-    texte = texte.replace("jo", ",o")
-    texte = texte.replace("Jo", ";o")
-    texte = texte.replace("JO", ";O")
-    texte = texte.replace("ju", ",ê")
-    texte = texte.replace("Ju", ";ê")
-    texte = texte.replace("JU", ";Ê")
-    texte = texte.replace("jé", ",é")
-    texte = texte.replace("Jé", ";é")
-    texte = texte.replace("JÉ", ";É")
-    texte = texte.replace("j'", ",'")
-    texte = texte.replace("J'", ";'")
-    texte = texte.replace("j", ",à")
-    texte = texte.replace("J", ";à")
-    return texte
-
-
-def diminution_SFBs_virgule(texte):
-    texte = texte.replace("cd", ",c")
-    texte = texte.replace("ds", ",d")
-    texte = texte.replace("fs", ",f")
-    texte = texte.replace("gl", ",g")
-    texte = texte.replace("ph", ",h")
-    texte = texte.replace("Ph", ";h")
-    texte = texte.replace("PH", ";H")
-    texte = texte.replace("cl", ",l")
-    texte = texte.replace("Cl", ";l")
-    texte = texte.replace("CL", ";L")
-    texte = texte.replace("dv", ",m")
-    texte = texte.replace("nl", ",n")
-    texte = texte.replace("xp", ",p")
-    texte = texte.replace("q'", ",q")
-    texte = texte.replace("Q'", ";q")
-    texte = texte.replace("rq", ",r")
-    texte = texte.replace("sc", ",s")
-    texte = texte.replace("Sc", ";s")
-    texte = texte.replace("SC", ";S")
-    texte = texte.replace("pt", ",t")
-    texte = texte.replace("Pt", ";t")
-    texte = texte.replace("PT", ";T")
-    texte = texte.replace("dv", ",v")
-    texte = texte.replace("'re", ",x")
-    texte = texte.replace("bj", ",z")
-    return texte
+CONVERSION_APOSTROPHE_TYPO = [
+    ("’", "'"),
+]
 
-
-def conversion_qu(texte):
-    texte = texte.replace("qu", "q")
-    texte = texte.replace("Qu", "Q")
-    texte = texte.replace("QU", "Q")
-    return texte
-
-
-# La touche Ê devient une touche morte circonflexe
-def touche_morte_circonflexe(texte):
-    texte = texte.replace("^a", "éê")
-    texte = texte.replace("â", "éê")
-    texte = texte.replace("a^i", "êé")
-    texte = texte.replace("aî", "êé")
-    texte = texte.replace("^i", "êi")
-    texte = texte.replace("î", "êi")
-    texte = texte.replace("^e", "ê")
-    texte = texte.replace("^o", "êo")
-    texte = texte.replace("ô", "êo")
-    texte = texte.replace("^u", "êu")
-    texte = texte.replace("û", "êu")
-    return texte
-
-
-# SFBs sur la main gauche
-def diminution_SFBs_e_circ(texte):
-    texte = texte.replace("eo", "êe")
-    texte = texte.replace("oe", "eê")
-    return texte
-
-
-def diminution_SFBs_e_grave(texte):
-    texte = texte.replace("éi", "èy")
-    texte = texte.replace("ié", "yè")
-    texte = texte.replace("bu", "èu")
-    texte = texte.replace("Bu", "Èu")
-    texte = texte.replace("ub", "uè")
-    texte = texte.replace("Ub", "Uè")
-    texte = texte.replace("u,", "è,")
-    texte = texte.replace("u.", "è.")
-    return texte
-
-
-def suffixes_a_grave(texte):
-    texte = texte.replace("aire", "àa")
-    texte = texte.replace("ence", "àc")
-    texte = texte.replace("ould", "àd")
-    texte = texte.replace("ying", "àé")
-    texte = texte.replace("able", "àê")
-    texte = texte.replace("iste", "àf")
-    texte = texte.replace("ight", "àg")
-    texte = texte.replace("techn", "àh")
-    # texte = texte.replace("ight", "ài")
-    texte = texte.replace("ique", "àk")
-    texte = texte.replace("elle", "àl")
-    texte = texte.replace("isme", "àm")
-    texte = texte.replace("ation", "àn")
-    texte = texte.replace("ought", "àp")
-    texte = texte.replace("ique", "àq")
-    texte = texte.replace("erre", "àr")
-    texte = texte.replace("ement", "às")
-    texte = texte.replace("ction", "àt")
-    texte = texte.replace("ieux", "àx")
-    return texte
-
-
-# Roulements sur la main droite
-def roulements_main_droite(texte):
-    texte = texte.replace("ght", "ghc")
-    texte = texte.replace("GHT", "GHC")
-
-    texte = texte.replace("q'", "p'")
-    texte = texte.replace("Q'", "P'")
-
-    texte = texte.replace("wh", "hc")
-    texte = texte.replace("Wh", "Hc")
-    texte = texte.replace("WH", "HC")
-
-    texte = texte.replace("gt", "gx")
-    texte = texte.replace("Gt", "Gx")
-    texte = texte.replace("GT", "GX")
-    return texte
-
-
-# Touche de répétition ★
-def touche_repetition(texte):
-    # for i in range(10):
-    texte = texte.replace("àà", "à★")
-    texte = texte.replace("ÀÀ", "À★")
-    texte = texte.replace("aa", "a★")
-    texte = texte.replace("AA", "A★")
-    texte = texte.replace("bb", "b★")
-    texte = texte.replace("BB", "B★")
-    texte = texte.replace("cc", "c★")
-    texte = texte.replace("CC", "C★")
-    texte = texte.replace("dd", "d★")
-    texte = texte.replace("DD", "D★")
-    texte = texte.replace("ee", "e★")
-    texte = texte.replace("EE", "E★")
-    texte = texte.replace("éé", "é★")
-    texte = texte.replace("ÉÉ", "É★")
-    texte = texte.replace("èè", "è★")
-    texte = texte.replace("ÈÈ", "È★")
-    texte = texte.replace("êê", "ê★")
-    texte = texte.replace("ÊÊ", "Ê★")
-    texte = texte.replace("ff", "f★")
-    texte = texte.replace("FF", "F★")
-    texte = texte.replace("gg", "g★")
-    texte = texte.replace("GG", "G★")
-    texte = texte.replace("hh", "h★")
-    texte = texte.replace("HH", "H★")
-    texte = texte.replace("ii", "i★")
-    texte = texte.replace("II", "I★")
-    texte = texte.replace("jj", "j★")
-    texte = texte.replace("JJ", "J★")
-    texte = texte.replace("kk", "k★")
-    texte = texte.replace("KK", "K★")
-    texte = texte.replace("ll", "l★")
-    texte = texte.replace("LL", "L★")
-    texte = texte.replace("mm", "m★")
-    texte = texte.replace("MM", "M★")
-    texte = texte.replace("nn", "n★")
-    texte = texte.replace("NN", "N★")
-    texte = texte.replace("oo", "o★")
-    texte = texte.replace("OO", "O★")
-    texte = texte.replace("pp", "p★")
-    texte = texte.replace("PP", "P★")
-    texte = texte.replace("qq", "q★")
-    texte = texte.replace("QQ", "Q★")
-    texte = texte.replace("rr", "r★")
-    texte = texte.replace("RR", "R★")
-    texte = texte.replace("ss", "s★")
-    texte = texte.replace("SS", "S★")
-    texte = texte.replace("tt", "t★")
-    texte = texte.replace("TT", "T★")
-    texte = texte.replace("uu", "u★")
-    texte = texte.replace("UU", "U★")
-    texte = texte.replace("vv", "v★")
-    texte = texte.replace("VV", "V★")
-    texte = texte.replace("ww", "w★")
-    texte = texte.replace("WW", "W★")
-    texte = texte.replace("xx", "x★")
-    texte = texte.replace("XX", "X★")
-    texte = texte.replace("yy", "y★")
-    texte = texte.replace("YY", "Y★")
-    texte = texte.replace("zz", "z★")
-    texte = texte.replace("ZZ", "Z★")
-    texte = texte.replace("00", "0★")
-    texte = texte.replace("11", "1★")
-    texte = texte.replace("22", "2★")
-    texte = texte.replace("33", "3★")
-    texte = texte.replace("44", "4★")
-    texte = texte.replace("55", "5★")
-    texte = texte.replace("66", "6★")
-    texte = texte.replace("77", "7★")
-    texte = texte.replace("88", "8★")
-    texte = texte.replace("99", "9★")
-    texte = texte.replace(",,", ",★")
-    texte = texte.replace("..", ".★")
-    texte = texte.replace(">>", ">★")
-    texte = texte.replace("<<", "<★")
-    texte = texte.replace("{{", "{★")
-    texte = texte.replace("}}", "}★")
-    texte = texte.replace("((", "(★")
-    texte = texte.replace("))", ")★")
-    texte = texte.replace("[", "[★")
-    texte = texte.replace("]", "]★")
-    # texte = texte.replace("  ", " ")
-    # texte = texte.replace("\n\n", "\n★")
-    texte = texte.replace("★u", "★ê")  # Évite les SFBs comme con★u en tapant con★ê
-    return texte
+# Les accents circonflexes tapés à part (« temp^ete ») sont recomposés, puis
+# convertis comme â, î, ô et û par la touche morte circonflexe
+CONVERSION_CIRCONFLEXE_SEPARE = [
+    ("^a", "â"),
+    ("^e", "ê"),
+    ("^i", "î"),
+    ("^o", "ô"),
+    ("^u", "û"),
+]
 
 
 # Archives
@@ -283,41 +52,393 @@ def touche_repetition(texte):
 # ==========================
 # ==========================
 
+DOSSIER_CORPUS = Path(__file__).resolve().parent
+
+# Tout le reste des règles part du principe qu’on est en apostrophe droite.
+# Les étapes suivantes découlent des hotstrings Ergopti+ (fichiers TOML) :
+# chaque sortie d’un hotstring est remplacée par son déclencheur.
+ETAPES_COMPILEES = [
+    ("conversion_apostrophe_typo", RewriteStage(CONVERSION_APOSTROPHE_TYPO)),
+    (
+        "conversion_circonflexe_separe",
+        RewriteStage(CONVERSION_CIRCONFLEXE_SEPARE),
+    ),
+    *load_compiled_stages(),
+]
+
+
+@dataclass
+class StatistiquesConversion:
+    """Occurrences de chaque motif et temps passé dans chaque étape."""
+
+    caracteres: int = 0
+    durees: dict[str, float] = field(
+        default_factory=lambda: {nom: 0.0 for nom, _ in ETAPES_COMPILEES}
+    )
+    occurrences: dict[str, Counter] = field(
+        default_factory=lambda: {nom: Counter() for nom, _ in ETAPES_COMPILEES}
+    )
+
+    def fusionner(self, autres):
+        """Ajoute les statistiques d’une autre conversion (autre fragment)."""
+        self.caracteres += autres.caracteres
+        for nom, duree in autres.durees.items():
+            self.durees[nom] += duree
+        for nom, occurrences in autres.occurrences.items():
+            self.occurrences[nom].update(occurrences)
+
+
+def convertir_texte(texte, statistiques=None):
+    """Applique toutes les étapes de conversion à un texte, dans l’ordre.
+
+    Si statistiques est fourni, les remplacements de chaque motif et la
+    durée de chaque étape y sont ajoutés (conversion plus lente).
+    """
+    if statistiques is None:
+        for _, etape in ETAPES_COMPILEES:
+            texte = etape.apply(texte)
+        return texte
+
+    statistiques.caracteres += len(texte)
+    for nom, etape in ETAPES_COMPILEES:
+        depart = time.perf_counter()
+        texte = etape.apply(texte, statistiques.occurrences[nom])
+        statistiques.durees[nom] += time.perf_counter() - depart
+    return texte
 
-for nom_fichier in os.listdir("original"):
-    if os.path.isfile("original/" + nom_fichier):
-        input = open("original/" + nom_fichier, "r", encoding="utf-8")
-        ancien_texte = input.read()
-        input.close()
-
-        nouveau_texte = ancien_texte
-        nouveau_texte = conversion_apostrophe_typo(
-            nouveau_texte
-        )  # Tout le reste des fonctions part du principe qu’on est en apostrophe droite
-        nouveau_texte = raccourcis_magique(
-            nouveau_texte
-        )  # Avant de s’embêter à faire les combinaisons pour réduire les SFBs, etc. autant directement taper un mot entier avec la touche ★
-
-        nouveau_texte = conversion_qu(nouveau_texte)
-        nouveau_texte = touche_morte_circonflexe(nouveau_texte)
-
-        nouveau_texte = diminution_SFBs_virgule(nouveau_texte)
-        nouveau_texte = virgule_devient_j(nouveau_texte)
-
-        nouveau_texte = roulements_main_droite(nouveau_texte)
-        nouveau_texte = diminution_SFBs_e_circ(nouveau_texte)
-        nouveau_texte = diminution_SFBs_e_grave(nouveau_texte)
-        nouveau_texte = suffixes_a_grave(nouveau_texte)
-
-        nouveau_texte = touche_repetition(nouveau_texte)
-        # nouveau_texte = nouveau_texte.replace("★,", "★à") # Correction pour éviter les SFBs comme pex★, donnant "par exemple,"
-        # nouveau_texte = nouveau_texte.replace("★.", "★àé") # Correction pour éviter les SFBs comme pex★, donnant "par exemple."
-
-        # Créer le dossier s'il n'existe pas
-        dossier = "modifie/"
-        if not os.path.exists(dossier):
-            os.makedirs(dossier)
 
-        output = open(dossier + nom_fichier + " (converti).txt", "w", encoding="utf-8")
-        output.write(nouveau_texte)
-        output.close()
+def caracteres_separateurs(etapes):
+    """Caractères blancs qu’aucun motif ne contient.
+
+    Aucune règle ne peut trouver d’occurrence à cheval sur un tel caractère,
+    qui survit donc à toutes les étapes : le texte peut être coupé juste
+    après lui et ses deux moitiés converties indépendamment.
+    """
+    caracteres_motifs = {
+        caractere
+        for _, etape in etapes
+        for motif in etape.patterns
+        for caractere in motif
+    }
+    return [
+        caractere
+        for caractere in ("\n", " ", "\t")
+        if caractere not in caracteres_motifs
+    ]
+
+
+SEPARATEURS = caracteres_separateurs(ETAPES_COMPILEES)
+
+# Nombre de caractères lus à la fois en mode streaming
+TAILLE_BLOC = 1 << 20
+
+
+def convertir_flux(entree, sortie, taille_bloc=TAILLE_BLOC, statistiques=None):
+    """Convertit un flux texte bloc par bloc, en mémoire bornée.
+
+    Chaque bloc est coupé après son dernier séparateur ; la fin du bloc est
+    reportée au début du suivant pour qu’aucun motif ne soit coupé en deux.
+    Le résultat est identique à la conversion du texte entier. La mémoire
+    utilisée reste de l’ordre de taille_bloc, sauf si un bloc entier ne
+    contient aucun séparateur (il est alors reporté en totalité).
+    """
+    report = ""
+    while bloc := entree.read(taille_bloc):
+        texte = report + bloc
+        coupure = max(texte.rfind(separateur) for separateur in SEPARATEURS)
+        report = texte[coupure + 1 :]
+        if coupure >= 0:
+            sortie.write(convertir_texte(texte[: coupure + 1], statistiques))
+    sortie.write(convertir_texte(report, statistiques))
+
+
+# Au-delà de cette taille (en octets), un fichier est découpé en fragments
+# convertis en parallèle
+TAILLE_FRAGMENT = 4 << 20
+
+# Encodage des fichiers du corpus qui ne sont pas en UTF-8 valide
+ENCODAGE_SECOURS = "latin-1"
+
+
+def detecter_encodage(chemin):
+    """Renvoie "utf-8" si tout le fichier est valide, ENCODAGE_SECOURS sinon."""
+    decodeur = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open_corpus_file(chemin) as fichier:
+            while bloc := fichier.read(TAILLE_BLOC):
+                decodeur.decode(bloc)
+        decodeur.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return ENCODAGE_SECOURS
+    return "utf-8"
+
+
+def decouper_en_fragments(chemin, taille_fragment=TAILLE_FRAGMENT):
+    """Bornes (début, fin) en octets des fragments d’un fichier.
+
+    Chaque fragment se termine juste après un séparateur, ASCII donc codé
+    sur un seul octet quel que soit l’encodage : les fragments se convertissent
+    indépendamment, comme les blocs de convertir_flux. Un fichier compressé
+    ne se découpe pas sans être décompressé : il forme un seul fragment.
+    """
+    taille = chemin.stat().st_size
+    if not SEPARATEURS or is_compressed(chemin):
+        return [(0, taille)]
+    separateur = SEPARATEURS[0].encode("ascii")
+
+    bornes = []
+    debut = 0
+    with open(chemin, "rb") as fichier:
+        while taille - debut > taille_fragment:
+            position = debut + taille_fragment
+            fichier.seek(position)
+            while bloc := fichier.read(1 << 16):
+                index = bloc.find(separateur)
+                if index >= 0:
+                    position += index + 1
+                    break
+                position += len(bloc)
+            bornes.append((debut, position))
+            debut = position
+    if debut < taille or not bornes:
+        bornes.append((debut, taille))
+    return bornes
+
+
+def convertir_fichier(
+    chemin_entree,
+    chemin_sortie,
+    streaming=True,
+    encodage="utf-8",
+    statistiques=None,
+):
+    """Convertit un fichier du corpus en écrivant le résultat au fil du flux.
+
+    Un fichier compressé (.gz, .xz, .bz2) est décompressé et décodé au fil
+    de la lecture, sans que le texte décompressé soit écrit sur le disque.
+    """
+    with (
+        io.TextIOWrapper(
+            open_corpus_file(chemin_entree), encoding=encodage
+        ) as entree,
+        open(chemin_sortie, "w", encoding="utf-8") as sortie,
+    ):
+        if streaming and SEPARATEURS:
+            convertir_flux(entree, sortie, statistiques=statistiques)
+        else:
+            sortie.write(convertir_texte(entree.read(), statistiques))
+
+
+def convertir_fragment(
+    chemin_entree,
+    debut,
+    fin,
+    encodage,
+    chemin_sortie,
+    streaming=True,
+    statistiques=False,
+):
+    """Convertit les octets [debut, fin[ d’un fichier (tâche d’un processus).
+
+    Renvoie le nombre d’octets lus, la durée de conversion en secondes et,
+    si statistiques est vrai, les StatistiquesConversion du fragment (None
+    sinon).
+    """
+    depart = time.perf_counter()
+    statistiques = StatistiquesConversion() if statistiques else None
+    if is_compressed(chemin_entree):
+        # Seul fragment du fichier, décompressé au fil de la lecture
+        binaire = open_corpus_file(chemin_entree)
+    else:
+        with open(chemin_entree, "rb") as fichier:
+            fichier.seek(debut)
+            binaire = io.BytesIO(fichier.read(fin - debut))
+    # Même lecture qu’un fichier ouvert en mode texte (fins de ligne incluses)
+    with (
+        io.TextIOWrapper(binaire, encoding=encodage) as entree,
+        open(chemin_sortie, "w", encoding="utf-8") as sortie,
+    ):
+        if streaming and SEPARATEURS:
+            convertir_flux(entree, sortie, statistiques=statistiques)
+        else:
+            sortie.write(convertir_texte(entree.read(), statistiques))
+    return fin - debut, time.perf_counter() - depart, statistiques
+
+
+def assembler_parties(parties, chemin_sortie):
+    """Concatène les fragments convertis dans le fichier final, dans l’ordre."""
+    with open(chemin_sortie, "wb") as sortie:
+        for partie in parties:
+            with open(partie, "rb") as entree:
+                while bloc := entree.read(TAILLE_BLOC):
+                    sortie.write(bloc)
+            partie.unlink()
+
+
+def ecrire_rapport(statistiques, chemin_rapport):
+    """Écrit le rapport d’un fichier converti en JSON et en CSV.
+
+    Toutes les règles y figurent, y compris celles qui n’ont rien remplacé,
+    dans l’ordre des étapes puis de leur définition.
+    """
+    etapes = []
+    for nom, etape in ETAPES_COMPILEES:
+        occurrences = statistiques.occurrences[nom]
+        etapes.append(
+            {
+                "nom": nom,
+                "duree_s": statistiques.durees[nom],
+                "occurrences": sum(occurrences.values()),
+                "regles": [
+                    {
+                        "motif": motif,
+                        "remplacement": remplacement,
+                        "occurrences": occurrences[motif],
+                    }
+                    for motif, remplacement in etape.replacements.items()
+                ],
+            }
+        )
+    rapport = {
+        "caracteres": statistiques.caracteres,
+        "duree_s": sum(statistiques.durees.values()),
+        "etapes": etapes,
+    }
+
+    chemin_rapport.parent.mkdir(parents=True, exist_ok=True)
+    chemin_rapport.with_suffix(".json").write_text(
+        json.dumps(rapport, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    with open(
+        chemin_rapport.with_suffix(".csv"), "w", encoding="utf-8", newline=""
+    ) as fichier:
+        ecrivain = csv.writer(fichier)
+        ecrivain.writerow(
+            ["etape", "duree_etape_s", "motif", "remplacement", "occurrences"]
+        )
+        for etape in etapes:
+            for regle in etape["regles"]:
+                ecrivain.writerow(
+                    [
+                        etape["nom"],
+                        f"{etape['duree_s']:.6f}",
+                        regle["motif"],
+                        regle["remplacement"],
+                        regle["occurrences"],
+                    ]
+                )
+
+
+def convertir_corpus(
+    dossier_original,
+    dossier_modifie,
+    streaming=True,
+    nb_processus=None,
+    taille_fragment=TAILLE_FRAGMENT,
+    dossier_rapports=None,
+):
+    """Convertit récursivement un dossier de corpus avec un pool de processus.
+
+    L’arborescence de dossier_original est reproduite dans dossier_modifie.
+    Les gros fichiers sont découpés en fragments répartis entre les
+    processus, puis réassemblés. Le débit de chaque fichier est affiché.
+    Si dossier_rapports est fourni, les occurrences de chaque règle et la
+    durée de chaque étape y sont écrites pour chaque fichier (JSON et CSV),
+    dans la même arborescence.
+    """
+    avec_statistiques = dossier_rapports is not None
+    fichiers = sorted(p for p in dossier_original.rglob("*") if p.is_file())
+    suivi = {}
+    taches = {}
+    depart = time.perf_counter()
+
+    with ProcessPoolExecutor(nb_processus) as executeur:
+        for chemin in fichiers:
+            relatif = chemin.relative_to(dossier_original)
+            sortie = dossier_modifie / relatif.parent
+            nom = relatif.name
+            if is_compressed(chemin):
+                nom = nom.removesuffix(chemin.suffix)
+            sortie = sortie / (nom + " (converti).txt")
+            sortie.parent.mkdir(parents=True, exist_ok=True)
+
+            encodage = detecter_encodage(chemin)
+            bornes = decouper_en_fragments(chemin, taille_fragment)
+            if len(bornes) == 1:
+                parties = [sortie]
+            else:
+                parties = [
+                    sortie.with_name(f"{sortie.name}.partie{index}")
+                    for index in range(len(bornes))
+                ]
+            suivi[chemin] = {
+                "sortie": sortie,
+                "parties": parties,
+                "restants": len(bornes),
+                "octets": 0,
+                "duree": 0.0,
+                "statistiques": StatistiquesConversion(),
+            }
+            for (debut, fin), partie in zip(bornes, parties):
+                futur = executeur.submit(
+                    convertir_fragment,
+                    chemin,
+                    debut,
+                    fin,
+                    encodage,
+                    partie,
+                    streaming,
+                    avec_statistiques,
+                )
+                taches[futur] = chemin
+
+        for futur in as_completed(taches):
+            chemin = taches[futur]
+            octets, duree, statistiques = futur.result()
+            etat = suivi[chemin]
+            etat["octets"] += octets
+            etat["duree"] += duree
+            if statistiques is not None:
+                etat["statistiques"].fusionner(statistiques)
+            etat["restants"] -= 1
+            if etat["restants"]:
+                continue
+
+            if len(etat["parties"]) > 1:
+                assembler_parties(etat["parties"], etat["sortie"])
+            relatif = chemin.relative_to(dossier_original)
+            if avec_statistiques:
+                ecrire_rapport(
+                    etat["statistiques"],
+                    dossier_rapports
+                    / relatif.parent
+                    / (relatif.name + " (statistiques).json"),
+                )
+            mega_octets = etat["octets"] / 1e6
+            print(
+                f"{relatif} : "
+                f"{mega_octets:.2f} Mo en {etat['duree']:.2f} s "
+                f"({mega_octets / max(etat['duree'], 1e-9):.1f} Mo/s, "
+                f"{len(etat['parties'])} fragment(s))"
+            )
+
+    duree_totale = time.perf_counter() - depart
+    mega_octets = sum(etat["octets"] for etat in suivi.values()) / 1e6
+    print(
+        f"Total : {len(fichiers)} fichier(s), {mega_octets:.2f} Mo "
+        f"en {duree_totale:.2f} s ({mega_octets / duree_totale:.1f} Mo/s)"
+    )
+
+
+def main(streaming=True, nb_processus=None, rapports=False):
+    convertir_corpus(
+        DOSSIER_CORPUS / "original",
+        DOSSIER_CORPUS / "modifie",
+        streaming=streaming,
+        nb_processus=nb_processus,
+        dossier_rapports=DOSSIER_CORPUS / "rapports" if rapports else None,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Representative sample of the corpus, for fast iterative evaluation.
+
+Each language folder of corpus/original is sampled on its own, line by
+line, by reservoir sampling: the lines are streamed once and a uniform
+sample of a fixed size is kept, in their original order. The n-gram
+distributions of the sample are then compared to those of the whole folder
+with the Jensen-Shannon divergence. A sample exceeding the bound of
+DIVERGENCE_BOUNDS is drawn again with another seed, and after a few
+attempts with a larger fraction of the lines.
+
+The samples are written to cache/sample, one file per language folder,
+with a report of their divergences. They are read like the corpus itself,
+`corpus_files(SAMPLE_DIRECTORY / "fr")`, and rebuilt when the corpus or
+the sampling settings change.
+"""
+
+import json
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+from ngrams import (
+    CORPUS_DIRECTORY,
+    NGramCounts,
+    corpus_files,
+    count_files,
+    count_text,
+    read_corpus_text,
+)
+from suffix_index import files_hash
+
+SAMPLE_DIRECTORY = Path(__file__).resolve().parent / "cache" / "sample"
+REPORT_NAME = "rapport.json"
+
+# Bump when the sampling or the written files change
+SAMPLE_VERSION = 1
+
+SAMPLE_FRACTION = 0.05
+# Maximum Jensen-Shannon divergence, in bits, of the n-gram distributions
+# of a sample. Trigrams are only reported: most of them are too rare for
+# a 5% sample to reproduce.
+DIVERGENCE_BOUNDS = {"unigrams": 0.001, "bigrams": 0.005}
+# Samples drawn at a fraction before growing it
+ATTEMPTS = 3
+GROWTH = 1.5
+
+
+def stratum_lines(paths: list[Path]):
+    """Yield the lines of corpus files, each one ending with a line feed."""
+    for path in paths:
+        for line in read_corpus_text(path).splitlines(keepends=True):
+            yield line if line.endswith("\n") else line + "\n"
+
+
+def reservoir_sample(lines, size: int, generator: np.random.Generator):
+    """A uniform sample of `size` lines of a stream, read once.
+
+    Algorithm L: the number of lines skipped before the next replacement
+    is drawn directly, so the random draws grow with the size of the
+    sample rather than with the length of the stream.
+
+    Returns:
+        The (index, line) pairs of the sample, by increasing index.
+    """
+    reservoir = []
+    if size <= 0:
+        return reservoir
+    weight = math.exp(math.log(generator.random()) / size)
+    following = size + math.floor(
+        math.log(generator.random()) / math.log1p(-weight)
+    )
+    for index, line in enumerate(lines):
+        if index < size:
+            reservoir.append((index, line))
+        elif index == following:
+            reservoir[generator.integers(size)] = (index, line)
+            weight *= math.exp(math.log(generator.random()) / size)
+            following += 1 + math.floor(
+                math.log(generator.random()) / math.log1p(-weight)
+            )
+    return sorted(reservoir)
+
+
+def js_divergence(first: np.ndarray, second: np.ndarray) -> float:
+    """Jensen-Shannon divergence, in bits, of two arrays of counts."""
+    p = first.ravel() / max(first.sum(), 1)
+    q = second.ravel() / max(second.sum(), 1)
+    m = (p + q) / 2
+    divergence = 0.0
+    for distribution in (p, q):
+        present = distribution > 0
+        divergence += 0.5 * float(
+            np.sum(
+                distribution[present]
+                * np.log2(distribution[present] / m[present])
+            )
+        )
+    return divergence
+
+
+def divergences(full: NGramCounts, sample: NGramCounts) -> dict[str, float]:
+    return {
+        name: js_divergence(getattr(full, name), getattr(sample, name))
+        for name in ("unigrams", "bigrams", "trigrams")
+    }
+
+
+def sample_stratum(
+    paths: list[Path],
+    fraction: float = SAMPLE_FRACTION,
+    seed: int = 0,
+    bounds: dict[str, float] = DIVERGENCE_BOUNDS,
+) -> tuple[str, dict]:
+    """Sample the lines of a language folder within the divergence bounds.
+
+    Returns:
+        The text of the sample, and its report: the number of lines, the
+        fraction reached, the number of draws and the divergences of the
+        sample.
+    """
+    full = count_files(paths)
+    total_lines = sum(1 for _ in stratum_lines(paths))
+    attempt = 0
+    while True:
+        size = min(max(1, round(fraction * total_lines)), total_lines)
+        generator = np.random.default_rng([seed, attempt])
+        lines = reservoir_sample(stratum_lines(paths), size, generator)
+        text = "".join(line for _, line in lines)
+        measured = divergences(full, count_text(text))
+        within = all(measured[name] <= bound for name, bound in bounds.items())
+        attempt += 1
+        if within or size == total_lines:
+            break
+        if attempt % ATTEMPTS == 0:
+            fraction *= GROWTH
+    return text, {
+        "lignes": total_lines,
+        "lignes_echantillon": size,
+        "fraction": size / max(total_lines, 1),
+        "tirages": attempt,
+        "divergences": measured,
+        "dans_les_bornes": within,
+    }
+
+
+def build_sample(
+    directory: Path = CORPUS_DIRECTORY,
+    sample_directory: Path = SAMPLE_DIRECTORY,
+    fraction: float = SAMPLE_FRACTION,
+    seed: int = 0,
+    strata: list[str] | None = None,
+) -> dict:
+    """Sample the language folders, unless their sample is up to date.
+
+    Only the folders of `strata` are read and hashed, all of them by
+    default. The samples of the folders removed from the corpus are
+    dropped, with their entry in the report.
+
+    Returns:
+        The report of the samples, by language folder.
+    """
+    report_path = sample_directory / REPORT_NAME
+    report = {}
+    if report_path.exists():
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+
+    settings = {
+        "version": SAMPLE_VERSION,
+        "fraction": fraction,
+        "graine": seed,
+        "bornes": DIVERGENCE_BOUNDS,
+    }
+    folders = {path.name: path for path in directory.iterdir() if path.is_dir()}
+    for name in [name for name in report if name not in folders]:
+        del report[name]
+        (sample_directory / name / "echantillon.txt").unlink(missing_ok=True)
+
+    for name in sorted(folders if strata is None else strata):
+        if name not in folders:
+            continue
+        stratum = folders[name]
+        paths = corpus_files(stratum)
+        if not paths:
+            continue
+        digest = files_hash(paths, SAMPLE_VERSION)
+        previous = report.get(stratum.name, {})
+        sample_path = sample_directory / stratum.name / "echantillon.txt"
+        if (
+            previous.get("hash") == digest
+            and previous.get("parametres") == settings
+            and sample_path.exists()
+        ):
+            continue
+
+        text, stratum_report = sample_stratum(paths, fraction, seed)
+        sample_path.parent.mkdir(parents=True, exist_ok=True)
+        sample_path.write_text(text, encoding="utf-8")
+        report[stratum.name] = {
+            "hash": digest,
+            "parametres": settings,
+            **stratum_report,
+        }
+
+    sample_directory.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(
+        json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return report
+
+
+def sample_files(
+    corpus: str = "fr",
+    sample_directory: Path = SAMPLE_DIRECTORY,
+    fraction: float = SAMPLE_FRACTION,
+) -> list[Path]:
+    """The files of the sample of a language folder, built if needed."""
+    build_sample(
+        sample_directory=sample_directory, fraction=fraction, strata=[corpus]
+    )
+    return corpus_files(sample_directory / corpus)
+
+
+def main(fraction=SAMPLE_FRACTION, seed=0):
+    start = time.perf_counter()
+    report = build_sample(fraction=fraction, seed=seed)
+    print(
+        f"{'Corpus':<8} {'Lignes':>8} {'Échantillon':>11} {'Part':>6} "
+        f"{'JS 1-g':>8} {'JS 2-g':>8} {'JS 3-g':>8}"
+    )
+    for name, stratum in report.items():
+        divergence = stratum["divergences"]
+        print(
+            f"{name:<8} {stratum['lignes']:>8} "
+            f"{stratum['lignes_echantillon']:>11} "
+            f"{stratum['fraction']:>6.1%} {divergence['unigrams']:>8.5f} "
+            f"{divergence['bigrams']:>8.5f} {divergence['trigrams']:>8.5f}"
+            + ("" if stratum["dans_les_bornes"] else " (hors bornes)")
+        )
+    print(f"Échantillon écrit en {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
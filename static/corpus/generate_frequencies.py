@@ -0,0 +1,206 @@
+"""
+Regenerate the letter frequency files of frequences_lettres/ from the corpus.
+
+The analyse_LdS exports are rewritten entirely, in their current formats.
+bigrammes.txt and frequences_suffixes.txt are annotated by hand, so only
+their numbers are refreshed and the notes around them are kept.
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+from ngrams import (
+    CORPUS_DIRECTORY,
+    count_files,
+    corpus_files,
+    letter_counts,
+    read_corpus_text,
+)
+
+FREQUENCIES_DIRECTORY = Path(__file__).resolve().parent / "frequences_lettres"
+LDS_DIRECTORY = FREQUENCIES_DIRECTORY / "analyse_LdS"
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+VOWELS = "AEIOU"
+# Y is neither a vowel nor a consonant in the LdS bigram lists
+CONSONANTS = "".join(letter for letter in LETTERS if letter not in VOWELS + "Y")
+VOWEL_BIGRAMS_COUNT = 10
+CONSONANT_BIGRAMS_COUNT = 32
+
+# Invisible characters are shown with a symbol in "Character frequency"
+VISIBLE_CHARACTERS = {" ": "␣", "\n": "⮐", "\t": "⇥"}
+
+# Corpus subfolder of each "===" separated section of frequences_suffixes
+SUFFIXES_SECTIONS_CORPORA = ("en", "fr")
+
+_SUFFIX_LINE = re.compile(
+    r"^(?P<label>[^\d\s]\S*(?: \S+)*?)(?P<separator>[ \t]+)"
+    r"(?P<count>\d{1,3}(?: \d{3})*)(?P<rest>(?: .*)?)$"
+)
+_BIGRAM_PERCENT_LINE = re.compile(r"^\d+(?:\.\d+)?%$")
+
+
+def lds_percent(count: int, total: int) -> str:
+    """Percentage as written by LdS: 2 decimals at most, no trailing zero."""
+    return f"{round(100 * count / total, 2):g}%" if total else "0%"
+
+
+def lds_ranking(
+    counts: dict[str, int], total: int, limit: int | None = None
+) -> list[str]:
+    """Lines "ES : 16989--2.99%", by decreasing count then label."""
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return [
+        f"{label} : {count}--{lds_percent(count, total)}"
+        for label, count in ranked[:limit]
+    ]
+
+
+def lds_header(total: int) -> str:
+    return f"Nombre de caractères analysés du texte : {total}"
+
+
+def character_frequency(characters: dict[str, int]) -> str:
+    """Content of "LdS - Character frequency.txt"."""
+    total = sum(characters.values())
+    ranked = sorted(characters.items(), key=lambda item: (-item[1], item[0]))
+    lines = ["Rank \tCharacter \tAppearances \tPercent"]
+    for rank, (char, count) in enumerate(ranked, start=1):
+        shown = VISIBLE_CHARACTERS.get(char, char)
+        lines.append(f"#{rank} \t{shown} \t{count} \t{100 * count / total:.2f}")
+    return "\n".join(lines)
+
+
+def bigram_counts(
+    bigrams: np.ndarray, first: str = LETTERS, second: str = LETTERS
+) -> dict[str, int]:
+    """Counts of the letter bigrams whose letters belong to given sets."""
+    return {
+        a + b: int(bigrams[LETTERS.index(a), LETTERS.index(b)])
+        for a in first
+        for b in second
+    }
+
+
+def keep_notes(path: Path, content: str) -> str:
+    """Append the notes that follow the generated lines in `path`.
+
+    Notes are separated from the generated lines by a blank line.
+    """
+    if not path.exists():
+        return content
+    _, separator, notes = path.read_text(encoding="utf-8").partition("\n\n")
+    return content + separator + notes
+
+
+def refresh_bigram_notes(text: str, percents: dict[str, float]) -> str:
+    """Update the percentage following each bigram of bigrammes.txt."""
+    lines = text.split("\n")
+    for i in range(len(lines) - 1):
+        if lines[i] in percents and _BIGRAM_PERCENT_LINE.match(lines[i + 1]):
+            lines[i + 1] = f"{percents[lines[i]]:.2f}%"
+    return "\n".join(lines)
+
+
+def format_count(count: int, width: int) -> str:
+    """Count with spaces between thousands, right-aligned to `width`."""
+    return f"{count:,}".replace(",", " ").rjust(width)
+
+
+def refresh_suffix_counts(text: str, sections_texts: list[list[str]]) -> str:
+    """Update the counts of frequences_suffixes.txt.
+
+    Each "===" separated section is counted in its own list of texts.
+    Lines that are not "label<whitespace>count" are left untouched.
+    """
+    section = 0
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if line.startswith("==="):
+            section += 1
+            continue
+        match = _SUFFIX_LINE.match(line)
+        if match is None or section >= len(sections_texts):
+            continue
+        label = match["label"]
+        count = sum(corpus.count(label) for corpus in sections_texts[section])
+        lines[i] = (
+            label
+            + match["separator"]
+            + format_count(count, len(match["count"]))
+            + match["rest"]
+        )
+    return "\n".join(lines)
+
+
+def write_text(path: Path, content: str) -> None:
+    path.write_text(content, encoding="utf-8", newline="\n")
+    print(f"Écrit : {path.relative_to(FREQUENCIES_DIRECTORY)}")
+
+
+def main(corpus="fr"):
+    paths = corpus_files(CORPUS_DIRECTORY / corpus)
+    counts = count_files(paths)
+    letters, bigrams = letter_counts(counts)
+    total_letters = int(letters.sum())
+
+    letter_dict = {
+        letter: int(count) for letter, count in zip(LETTERS, letters)
+    }
+    write_text(
+        LDS_DIRECTORY / "LdS - Lettres.txt",
+        "\n".join(
+            [lds_header(total_letters)]
+            + lds_ranking(letter_dict, total_letters)
+        ),
+    )
+    write_text(
+        LDS_DIRECTORY / "LdS - Bigrammes.txt",
+        "\n".join(
+            [lds_header(total_letters)]
+            + lds_ranking(bigram_counts(bigrams), total_letters)
+        ),
+    )
+    for name, letter_set, limit in (
+        ("LdS - Bigrammes voyelles.txt", VOWELS, VOWEL_BIGRAMS_COUNT),
+        ("LdS - Bigrammes consonnes.txt", CONSONANTS, CONSONANT_BIGRAMS_COUNT),
+    ):
+        path = LDS_DIRECTORY / name
+        ranking = lds_ranking(
+            bigram_counts(bigrams, letter_set, letter_set),
+            total_letters,
+            limit,
+        )
+        write_text(path, keep_notes(path, "\n".join(ranking)))
+    write_text(
+        LDS_DIRECTORY / "LdS - Character frequency.txt",
+        character_frequency(counts.characters),
+    )
+
+    bigram_percents = {
+        pair: 100 * count / total_letters
+        for pair, count in bigram_counts(bigrams).items()
+    }
+    path = FREQUENCIES_DIRECTORY / "bigrammes.txt"
+    write_text(
+        path,
+        refresh_bigram_notes(path.read_text(encoding="utf-8"), bigram_percents),
+    )
+
+    sections_texts = [
+        [
+            read_corpus_text(path)
+            for path in corpus_files(CORPUS_DIRECTORY / name)
+        ]
+        for name in SUFFIXES_SECTIONS_CORPORA
+    ]
+    path = FREQUENCIES_DIRECTORY / "frequences_suffixes.txt"
+    write_text(
+        path,
+        refresh_suffix_counts(path.read_text(encoding="utf-8"), sections_texts),
+    )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
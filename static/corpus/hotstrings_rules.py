@@ -0,0 +1,207 @@
+"""
+Corpus conversion rules derived from the Ergopti+ hotstrings TOML files.
+
+Each hotstring rewrites a typed trigger into its output. Converting a
+corpus goes the other way: every output found in the text is replaced by
+the trigger that produces it, so that the corpus reflects the keystrokes
+of an Ergopti+ typist. The compiled stages are cached on disk, keyed by
+the content hash of the TOML files and of the code deriving the rules, and
+only rebuilt when they change.
+"""
+
+import hashlib
+import json
+import sys
+import tomllib
+from pathlib import Path
+
+import rewrite_engine
+from rewrite_engine import Rule, RewriteStage
+
+DRIVERS_DIRECTORY = Path(__file__).resolve().parent.parent / "drivers"
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from utilities.mappings_functions import (  # noqa: E402
+    generate_case_variants_for_trigger_replacement,
+)
+
+HOTSTRINGS_DIRECTORY = DRIVERS_DIRECTORY / "hotstrings"
+CACHE_DIRECTORY = Path(__file__).resolve().parent / "cache"
+
+# Bump when the rule derivation or the serialized format changes
+CACHE_FORMAT_VERSION = 1
+# The code compiling the stages and generating the case variants, hashed
+# with the TOML files so that editing it invalidates the cache too
+RULE_SOURCES = [
+    Path(__file__).resolve(),
+    Path(rewrite_engine.__file__).resolve(),
+    DRIVERS_DIRECTORY / "utilities" / "mappings_functions.py",
+]
+
+# Conversion stages in application order: (name, [(TOML file, sections)]),
+# None selecting all the sections of the file
+HOTSTRINGS_STAGES = [
+    # Before bothering with the combinations reducing SFBs, etc., it is
+    # simpler to type a whole word with the ★ key
+    ("raccourcis_magique", [("magic.toml", None)]),
+    ("conversion_qu", [("plus/qu.toml", None)]),
+    ("touche_morte_circonflexe", [("plus/e_deadkey.toml", None)]),
+    (
+        "diminution_SFBs_virgule",
+        [
+            (
+                "plus/comma.toml",
+                ("comma_top_row", "comma_middle_row", "comma_bottom_row"),
+            )
+        ],
+    ),
+    # The far letters sections are optional alternatives, left out
+    ("virgule_devient_j", [("plus/comma.toml", ("commaj_general",))]),
+    ("roulements_main_droite", [("plus/rolls.toml", None)]),
+    (
+        "diminution_SFBs_e_circ",
+        [("plus/sfb_reduction.toml", ("ecirc_general",))],
+    ),
+    (
+        "diminution_SFBs_e_grave",
+        [("plus/sfb_reduction.toml", ("ie_general", "egrave_general"))],
+    ),
+    ("suffixes_a_grave", [("plus/suffixes.toml", None)]),
+    ("touche_repetition", [("repeat.toml", None)]),
+]
+
+# The corpus is converted to straight apostrophes first, and the layout
+# inserts the narrow no-break space before "?" and ";" by itself
+OUTPUT_NORMALIZATION = str.maketrans({"’": "'"})
+TRIGGER_NORMALIZATION = str.maketrans({"’": "'", "\u202f": ""})
+
+
+def load_hotstrings(
+    toml_path: Path, sections: tuple[str, ...] | None = None
+) -> list[tuple[str, str, bool, bool]]:
+    """Read the (trigger, output, is_word, auto_expand) hotstrings of a TOML
+    file.
+
+    Args:
+        toml_path: The TOML file, in the `[[section]]` format.
+        sections: The sections to read, or None for all of them.
+
+    Returns:
+        The hotstrings, in file order.
+    """
+    with open(toml_path, "rb") as file:
+        data = tomllib.load(file)
+
+    hotstrings = []
+    for section in sections or data:
+        if section not in data:
+            raise KeyError(f"No section [[{section}]] in {toml_path.name}.")
+        for table in data[section]:
+            for trigger, value in table.items():
+                if isinstance(value, str):
+                    # Short form used by repeat.toml: trigger = output
+                    hotstrings.append((trigger, value, False, True))
+                else:
+                    hotstrings.append(
+                        (
+                            trigger,
+                            value["output"],
+                            value.get("is_word", False),
+                            value.get("auto_expand", True),
+                        )
+                    )
+    return hotstrings
+
+
+def reversed_rules(
+    hotstrings: list[tuple[str, str, bool, bool]],
+) -> list[Rule]:
+    """Turn hotstrings into (output, trigger, is_word) conversion rules.
+
+    Every case variant of a hotstring gets its own rule. When several
+    triggers produce the same output, the shortest one is kept, the first
+    one on ties. Hotstrings whose trigger equals their output only exist
+    to block another hotstring while typing, and are skipped.
+    """
+    best: dict[str, tuple[str, bool]] = {}
+    for trigger, output, is_word, _ in hotstrings:
+        variants = generate_case_variants_for_trigger_replacement(
+            trigger, output
+        )
+        for variant_trigger, variant_output in variants:
+            pattern = variant_output.translate(OUTPUT_NORMALIZATION)
+            typed = variant_trigger.translate(TRIGGER_NORMALIZATION)
+            if not pattern or pattern == typed:
+                continue
+            if pattern not in best or len(typed) < len(best[pattern][0]):
+                best[pattern] = (typed, is_word)
+    return [
+        (pattern, typed, is_word) for pattern, (typed, is_word) in best.items()
+    ]
+
+
+def _source_files(stages) -> list[str]:
+    return sorted({name for _, sources in stages for name, _ in sources})
+
+
+def hotstrings_hash(stages=HOTSTRINGS_STAGES) -> str:
+    """SHA-256 of the stage definitions, of the TOML files they read and of
+    the code deriving the rules from them."""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_FORMAT_VERSION}\n{stages!r}\n".encode())
+    paths = [HOTSTRINGS_DIRECTORY / name for name in _source_files(stages)]
+    for path in [*paths, *RULE_SOURCES]:
+        content = path.read_bytes()
+        digest.update(f"{path.name}\n{len(content)}\n".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def compile_stages(stages=HOTSTRINGS_STAGES) -> list[tuple[str, RewriteStage]]:
+    """Compile the stages from the TOML files, without using the cache."""
+    compiled = []
+    for stage_name, sources in stages:
+        hotstrings = []
+        for name, sections in sources:
+            hotstrings += load_hotstrings(HOTSTRINGS_DIRECTORY / name, sections)
+        stage = RewriteStage(reversed_rules(hotstrings), ordered=False)
+        compiled.append((stage_name, stage))
+    return compiled
+
+
+def load_compiled_stages(
+    stages=HOTSTRINGS_STAGES, cache_directory: Path = CACHE_DIRECTORY
+) -> list[tuple[str, RewriteStage]]:
+    """Return the compiled stages, from the disk cache when it is current.
+
+    The cache file is named after the content hash of the TOML files and
+    of RULE_SOURCES, so editing a hotstring or the rule derivation
+    invalidates it. Stale cache files are removed when
+    a new one is written.
+    """
+    digest = hotstrings_hash(stages)
+    cache_path = cache_directory / f"hotstrings_{digest[:16]}.json"
+    if cache_path.exists():
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+        if data.get("hash") == digest:
+            return [
+                (item["name"], RewriteStage.from_dict(item["stage"]))
+                for item in data["stages"]
+            ]
+
+    compiled = compile_stages(stages)
+    cache_directory.mkdir(parents=True, exist_ok=True)
+    for stale_path in cache_directory.glob("hotstrings_*.json"):
+        stale_path.unlink()
+    data = {
+        "hash": digest,
+        "stages": [
+            {"name": name, "stage": stage.to_dict()} for name, stage in compiled
+        ],
+    }
+    temporary_path = cache_path.with_suffix(".tmp")
+    temporary_path.write_text(
+        json.dumps(data, ensure_ascii=False), encoding="utf-8"
+    )
+    temporary_path.replace(cache_path)
+    return compiled
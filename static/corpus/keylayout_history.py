@@ -0,0 +1,355 @@
+"""
+Score every macOS keylayout of the repository on the corpus n-gram counts.
+
+Each .keylayout file is parsed into the KeyLayout model of the drivers, then
+into a table mapping every character to the key code and the layer typing
+it. The key codes are then placed on the geometry of
+trier_lignes_colonnes.py: ISO variants on the ISO board, ANSI variants on
+the same board without the key right of the left shift, and with the
+backslash key above Enter. All the versions and variants (old, raw KbdEdit
+exports, bundles with their plus and plus plus variants) are parsed in
+parallel and scored with the evaluator of the cached corpus counts, which
+takes a millisecond per layout.
+"""
+
+import csv
+import html
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from hotstrings_rules import DRIVERS_DIRECTORY
+from layout_metrics import (
+    GEOMETRY,
+    MACOS_KEY_CODES,
+    Keyboard,
+    LayoutEvaluator,
+    LayoutMetrics,
+)
+from ngrams import CORPUS_DIRECTORY, NGramCounts, corpus_files, count_files
+
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from utilities.keylayout_model import KeyLayout  # noqa: E402
+
+KEYLAYOUTS_DIRECTORY = DRIVERS_DIRECTORY / "macos"
+REPORT_PATH = (
+    Path(__file__).resolve().parent / "rapports" / "historique_keylayouts.csv"
+)
+
+# The layers scored, by decreasing priority: a character typed on several
+# layers counts on the first one
+LAYERS = ("base", "shift", "option", "shift option")
+# Required modifiers of each layer, in a <modifier keys="…"/> element
+LAYER_MODIFIERS = {
+    frozenset(): "base",
+    frozenset({"anyShift"}): "shift",
+    frozenset({"anyOption"}): "option",
+    frozenset({"anyOption", "anyShift"}): "shift option",
+}
+
+# On ANSI Apple keyboards, the key left of 1 sends 50 and there is no key
+# right of the left shift
+ANSI_KEY_CODES = {
+    **{
+        code: macos_code
+        for code, macos_code in MACOS_KEY_CODES.items()
+        if code not in ("Backquote", "IntlBackslash")
+    },
+    "Backquote": 50,
+}
+
+_VERSION = re.compile(r"v(\d+)[._](\d+)[._](\d+)")
+
+
+@dataclass
+class Keylayout:
+    """A keylayout file of the repository and the characters it types.
+
+    Attributes:
+        path: The .keylayout file.
+        source: "ancien" (0_old), "brut" (KbdEdit exports) or "bundle".
+        version: The version of the layout, like "2.2.1".
+        variant: "ISO", "ANSI", "plus", "plus ANSI", "plus plus"…
+        characters: The (key code, layer) typing each character.
+    """
+
+    path: Path
+    source: str
+    version: str
+    variant: str
+    characters: dict[str, tuple[int, str]]
+
+    @property
+    def ansi(self) -> bool:
+        return self.variant.endswith("ANSI")
+
+
+def keylayout_paths(directory: Path = KEYLAYOUTS_DIRECTORY) -> list[Path]:
+    """The keylayout files of every version, from the oldest."""
+    return [
+        *sorted((directory / "0_old").glob("*.keylayout")),
+        *sorted((directory / "raw_kbdedit_keylayouts").glob("*.keylayout")),
+        *sorted(
+            directory.glob("bundles/*.bundle/Contents/Resources/*.keylayout")
+        ),
+    ]
+
+
+def layer_of(modifiers: str) -> str | None:
+    """The layer of a modifier combination, None for the unscored ones.
+
+    Optional modifiers ("caps?") are ignored. Combinations with caps lock
+    type the capitals of the shift layer, and those with command or
+    control are shortcuts.
+    """
+    required = frozenset(
+        modifier for modifier in modifiers.split() if "?" not in modifier
+    )
+    return LAYER_MODIFIERS.get(required)
+
+
+def action_output(layout: KeyLayout, action_id: str) -> tuple[str, bool]:
+    """The characters an action types with no dead key pending.
+
+    An action entering a state, like a dead key or the dead-key rolls of
+    the plus plus variants, types the output of the terminator of that
+    state when nothing follows. Without any output, the action id is
+    returned, like `get_symbol` does.
+
+    Returns:
+        The characters, and whether they are typed through a state.
+    """
+    action = layout.action(action_id)
+    when = action.whens.get("none") if action else None
+    if when is not None and when.output is not None:
+        return html.unescape(when.output), False
+    entering = when is not None and when.next is not None
+    if entering and layout.terminators:
+        terminator = layout.terminators.get(when.next)
+        if terminator is not None and terminator.output is not None:
+            return html.unescape(terminator.output), True
+    return html.unescape(action_id), entering
+
+
+def parse_keylayout(body: str) -> dict[str, tuple[int, str]]:
+    """Map each character typed by a key to its (key code, layer).
+
+    Keys typing several characters are skipped. A character typed by a key
+    entering a state, like a dead key, is only placed there when no key
+    types it directly.
+    """
+    layout = KeyLayout.parse(body)
+    layers = {
+        index: layer_of(modifiers[0]) if modifiers else None
+        for index, modifiers in layout.key_map_selects.items()
+    }
+
+    by_layer = {
+        (layer, state): {} for layer in LAYERS for state in (False, True)
+    }
+    for key_map_set in layout.key_map_sets.values():
+        for index, key_map in key_map_set.key_maps.items():
+            layer = layers.get(index)
+            if layer is None:
+                continue
+            for code, key in key_map.keys.items():
+                if key.kind == "action":
+                    char, state = action_output(layout, key.value)
+                else:
+                    char, state = html.unescape(key.value), False
+                char = "\n" if char == "\r" else char
+                if len(char) == 1:
+                    by_layer[layer, state].setdefault(char, (code, layer))
+
+    characters = {}
+    for state in (False, True):
+        for layer in LAYERS:
+            for char, key in by_layer[layer, state].items():
+                characters.setdefault(char, key)
+    # The straight apostrophe is converted to the typographic one
+    for char, other in (("'", "’"), ("’", "'")):
+        if char in characters:
+            characters.setdefault(other, characters[char])
+    return characters
+
+
+def load_keylayout_history(path: Path) -> Keylayout:
+    """Parse a keylayout file, its version and variant read from its name."""
+    name = path.stem.lower()
+    if path.parent.name == "0_old":
+        source = "ancien"
+    elif path.parent.name == "raw_kbdedit_keylayouts":
+        source = "brut"
+        name = name.removesuffix("_v0")
+    else:
+        source = "bundle"
+    version = ".".join(_VERSION.search(name).groups())
+    words = name[_VERSION.search(name).end() :].split("_")
+    variant = " ".join(word for word in words if word and word != "ansi")
+    if name.endswith("ansi"):
+        variant = f"{variant} ANSI".strip()
+    return Keylayout(
+        path,
+        source,
+        version,
+        variant or "ISO",
+        parse_keylayout(path.read_text(encoding="utf-8")),
+    )
+
+
+def ansi_geometry() -> list[dict]:
+    """The ISO geometry changed into an ANSI board.
+
+    The key right of the left shift is removed, and the backslash key goes
+    above Enter, at the end of the second row.
+    """
+    keys = []
+    for key in GEOMETRY["iso"]:
+        if key.get("code") == "IntlBackslash":
+            continue
+        if key.get("code") == "Backslash":
+            key = {**key, "row": "2", "column": "15"}
+        elif key.get("code") == "Enter":
+            key = {**key, "row": "3", "column": "14"}
+        keys.append(key)
+    return keys
+
+
+def keylayout_layout(keylayout: Keylayout) -> dict[str, str]:
+    """Map each character to the geometry code of its key."""
+    key_codes = ANSI_KEY_CODES if keylayout.ansi else MACOS_KEY_CODES
+    codes = {macos_code: code for code, macos_code in key_codes.items()}
+    return {
+        char: codes[macos_code]
+        for char, (macos_code, _) in keylayout.characters.items()
+        if macos_code in codes
+    }
+
+
+def score_keylayouts(
+    paths: list[Path], counts: NGramCounts, nb_processes: int | None = None
+) -> list[tuple[Keylayout, LayoutMetrics]]:
+    """Parse keylayout files in parallel and score them on `counts`."""
+    evaluators = {
+        False: LayoutEvaluator(counts),
+        True: LayoutEvaluator(counts, Keyboard.from_geometry(ansi_geometry())),
+    }
+    with ProcessPoolExecutor(nb_processes) as executor:
+        keylayouts = list(executor.map(load_keylayout_history, paths))
+    return [
+        (
+            keylayout,
+            evaluators[keylayout.ansi].evaluate(keylayout_layout(keylayout)),
+        )
+        for keylayout in keylayouts
+    ]
+
+
+def plus_plus_differences(
+    keylayouts: list[Keylayout],
+) -> dict[Path, set[str]]:
+    """The characters placed differently by each plus plus variant.
+
+    A plus plus variant only adds dead keys to its plus variant: every
+    character must stay on the same key and layer. Returns, for each plus
+    plus file differing from the plus file of its version, the characters
+    missing, added or moved.
+    """
+    plus = {
+        (keylayout.source, keylayout.version, keylayout.ansi): keylayout
+        for keylayout in keylayouts
+        if keylayout.variant.removesuffix(" ANSI") == "plus"
+    }
+    differences = {}
+    for keylayout in keylayouts:
+        if keylayout.variant.removesuffix(" ANSI") != "plus plus":
+            continue
+        reference = plus.get(
+            (keylayout.source, keylayout.version, keylayout.ansi)
+        )
+        if reference is None:
+            continue
+        changed = {
+            char
+            for char in reference.characters.keys() | keylayout.characters
+            if reference.characters.get(char) != keylayout.characters.get(char)
+        }
+        if changed:
+            differences[keylayout.path] = changed
+    return differences
+
+
+def write_report(
+    scores: list[tuple[Keylayout, LayoutMetrics]], path: Path = REPORT_PATH
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            [
+                "Version",
+                "Variante",
+                "Source",
+                "Fichier",
+                "SFB",
+                "SFS",
+                "Alternance",
+                "Roulements in",
+                "Roulements out",
+                "Redirections",
+            ]
+        )
+        for keylayout, metrics in scores:
+            writer.writerow(
+                [
+                    keylayout.version,
+                    keylayout.variant,
+                    keylayout.source,
+                    keylayout.path.name,
+                    metrics.sfb,
+                    metrics.sfs,
+                    metrics.alternation,
+                    metrics.roll_in,
+                    metrics.roll_out,
+                    metrics.redirect,
+                ]
+            )
+
+
+def main(corpus="fr", nb_processes=None):
+    start = time.perf_counter()
+    counts = count_files(corpus_files(CORPUS_DIRECTORY / corpus))
+    scores = score_keylayouts(keylayout_paths(), counts, nb_processes)
+    write_report(scores)
+    differences = plus_plus_differences([keylayout for keylayout, _ in scores])
+    for path, chars in differences.items():
+        print(
+            f"⚠️ {path.name} ne place pas les mêmes caractères que sa "
+            f"variante plus : {' '.join(sorted(chars))}"
+        )
+
+    print(
+        f"{'Version':<8} {'Variante':<15} {'Source':<7} {'SFB':>6} "
+        f"{'SFS':>6} {'Alt.':>6} {'Roul. in':>8} {'Roul. out':>9} "
+        f"{'Redir.':>6}"
+    )
+    for keylayout, metrics in scores:
+        print(
+            f"{keylayout.version:<8} {keylayout.variant:<15} "
+            f"{keylayout.source:<7} {metrics.sfb:6.2%} {metrics.sfs:6.2%} "
+            f"{metrics.alternation:6.2%} {metrics.roll_in:8.2%} "
+            f"{metrics.roll_out:9.2%} {metrics.redirect:6.2%}"
+        )
+    print(
+        f"{len(scores)} keylayouts évalués en "
+        f"{time.perf_counter() - start:.2f} s, tableau écrit dans "
+        f"{REPORT_PATH.name}"
+    )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
@@ -0,0 +1,219 @@
+"""
+Keystrokes saved on the corpus by the Ergopti+ hotstrings.
+
+Every hotstring TOML file is loaded into a single trie, mapping each output
+to its shortest trigger. The simulated typist walks the text and, at each
+position, types the trigger of the longest output starting there instead
+of the output itself. Only the hotstrings typed in fewer keystrokes than
+their output are kept, so every hotstring used is a saving.
+
+One keystroke is counted per character, the ★ key included: shifted and
+dead key characters cost one keystroke like the others. The trie is
+compiled by the rewrite engine into a single regex, so a file is scanned at
+the speed of the re module rather than character by character in Python.
+"""
+
+import re
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from hotstrings_rules import (
+    DRIVERS_DIRECTORY,
+    HOTSTRINGS_DIRECTORY,
+    OUTPUT_NORMALIZATION,
+    TRIGGER_NORMALIZATION,
+    load_hotstrings,
+)
+from ngrams import CORPUS_DIRECTORY, corpus_files, read_corpus_text
+from rewrite_engine import longest_match_regex
+
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from utilities.mappings_functions import (  # noqa: E402
+    generate_case_variants_for_trigger_replacement,
+)
+
+
+@dataclass(frozen=True)
+class Hotstring:
+    """The cheapest way known to type an output.
+
+    Attributes:
+        trigger: The characters typed.
+        source: The TOML file defining the hotstring, relative to the
+            hotstrings directory.
+        word_start: Whether the output must start a word.
+        word_end: Whether the output must end a word, for the hotstrings
+            only expanded by an ending character (typed anyway).
+    """
+
+    trigger: str
+    source: str
+    word_start: bool
+    word_end: bool
+
+
+def load_saving_hotstrings(
+    directory: Path = HOTSTRINGS_DIRECTORY,
+) -> dict[str, Hotstring]:
+    """Map each output to the hotstring typing it in the fewest keystrokes.
+
+    All the TOML files below `directory` are read, with every case variant
+    of their hotstrings. Hotstrings whose trigger is not shorter than their
+    output save nothing and are left out.
+    """
+    best: dict[str, Hotstring] = {}
+    for toml_path in sorted(directory.rglob("*.toml")):
+        source = toml_path.relative_to(directory).as_posix()
+        for trigger, output, is_word, auto_expand in load_hotstrings(toml_path):
+            variants = generate_case_variants_for_trigger_replacement(
+                trigger, output
+            )
+            for variant_trigger, variant_output in variants:
+                pattern = variant_output.translate(OUTPUT_NORMALIZATION)
+                typed = variant_trigger.translate(TRIGGER_NORMALIZATION)
+                if len(typed) >= len(pattern):
+                    continue
+                if pattern not in best or len(typed) < len(
+                    best[pattern].trigger
+                ):
+                    best[pattern] = Hotstring(
+                        typed, source, is_word, not auto_expand
+                    )
+    return best
+
+
+def hotstrings_regex(hotstrings: dict[str, Hotstring]) -> str:
+    """Regex source of the longest output starting at each position.
+
+    Outputs flagged as word starts only match where no word character
+    precedes, and those flagged as word ends where none follows, like the
+    unordered stages of the rewrite engine.
+    """
+    return longest_match_regex(
+        hotstrings,
+        word_start={
+            pattern
+            for pattern, hotstring in hotstrings.items()
+            if hotstring.word_start
+        },
+        word_end={
+            pattern
+            for pattern, hotstring in hotstrings.items()
+            if hotstring.word_end
+        },
+    )
+
+
+@dataclass
+class SimulationResult:
+    """Hotstrings used while typing a text.
+
+    Attributes:
+        characters: The number of characters of the text, which is also
+            its number of keystrokes without hotstrings.
+        hits: The number of uses of each hotstring, by output.
+    """
+
+    characters: int = 0
+    hits: Counter = field(default_factory=Counter)
+
+    def __iadd__(self, other: "SimulationResult") -> "SimulationResult":
+        self.characters += other.characters
+        self.hits.update(other.hits)
+        return self
+
+
+class KeystrokeSimulator:
+    """Replay texts through a set of hotstrings.
+
+    Args:
+        hotstrings: The hotstrings by output, all saving keystrokes. By
+            default, those of every TOML file.
+    """
+
+    def __init__(self, hotstrings: dict[str, Hotstring] | None = None):
+        if hotstrings is None:
+            hotstrings = load_saving_hotstrings()
+        self.hotstrings = hotstrings
+        self.regex = re.compile(hotstrings_regex(hotstrings))
+
+    def saving(self, pattern: str) -> int:
+        """Keystrokes saved by each use of the hotstring typing `pattern`."""
+        return len(pattern) - len(self.hotstrings[pattern].trigger)
+
+    def simulate(self, text: str) -> SimulationResult:
+        """Type `text`, using a hotstring wherever an output starts."""
+        text = text.translate(OUTPUT_NORMALIZATION)
+        # Without capturing groups, findall returns the matched outputs
+        return SimulationResult(len(text), Counter(self.regex.findall(text)))
+
+    def simulate_files(self, paths: list[Path]) -> SimulationResult:
+        result = SimulationResult()
+        for path in paths:
+            result += self.simulate(read_corpus_text(path))
+        return result
+
+    def saved(self, result: SimulationResult) -> int:
+        """Total number of keystrokes saved in a simulation."""
+        return sum(
+            self.saving(pattern) * count
+            for pattern, count in result.hits.items()
+        )
+
+    def saved_by_source(self, result: SimulationResult) -> Counter:
+        """Keystrokes saved by the hotstrings of each TOML file."""
+        saved = Counter()
+        for pattern, count in result.hits.items():
+            source = self.hotstrings[pattern].source
+            saved[source] += self.saving(pattern) * count
+        return saved
+
+
+def main(corpus="fr", top=30):
+    start = time.perf_counter()
+    simulator = KeystrokeSimulator()
+    print(
+        f"{len(simulator.hotstrings)} hotstrings économes en "
+        f"{time.perf_counter() - start:.2f} s"
+    )
+
+    start = time.perf_counter()
+    result = simulator.simulate_files(corpus_files(CORPUS_DIRECTORY / corpus))
+    duration = time.perf_counter() - start
+    saved = simulator.saved(result)
+    print(
+        f"Corpus {corpus} : {result.characters} caractères simulés "
+        f"en {duration:.2f} s"
+    )
+    print(
+        f"Frappes : {result.characters - saved} au lieu de "
+        f"{result.characters}, {saved} économisées "
+        f"({saved / max(result.characters, 1):.2%})"
+    )
+
+    print(f"\n{'Fichier':<28} {'Économies':>10} {'Part':>7}")
+    for source, count in simulator.saved_by_source(result).most_common():
+        print(f"{source:<28} {count:>10} {count / max(saved, 1):>7.2%}")
+
+    print(
+        f"\n{'Sortie':<20} {'Déclencheur':<14} {'Utilisations':>12} "
+        f"{'Économies':>10}"
+    )
+    by_rule = sorted(
+        result.hits.items(),
+        key=lambda item: -simulator.saving(item[0]) * item[1],
+    )
+    for pattern, count in by_rule[:top]:
+        hotstring = simulator.hotstrings[pattern]
+        print(
+            f"{pattern!r:<20} {hotstring.trigger!r:<14} {count:>12} "
+            f"{simulator.saving(pattern) * count:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
@@ -0,0 +1,418 @@
+"""
+Layout metrics computed from the key geometry and the corpus n-gram counts.
+
+The geometry of trier_lignes_colonnes.py (hand, finger, row and column of
+each physical key) becomes lookup vectors indexed by key. Every metric is
+then a mask over key bigrams or key trigrams, built once per keyboard.
+Scoring a layout only projects the sparse character n-gram counts onto
+keys with a weighted np.bincount and takes dot products with the masks,
+which takes about a millisecond.
+"""
+
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from ngrams import (
+    ALPHABET,
+    CORPUS_DIRECTORY,
+    OTHER,
+    SIZE,
+    NGramCounts,
+    corpus_files,
+    count_files,
+)
+
+LAYOUTS_DIRECTORY = (
+    Path(__file__).resolve().parent.parent / "layouts" / "visualisation"
+)
+DRIVERS_DIRECTORY = Path(__file__).resolve().parent.parent / "drivers"
+sys.path.append(str(LAYOUTS_DIRECTORY))
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from trier_lignes_colonnes import data as GEOMETRY  # noqa: E402
+from utilities.keylayout_extraction import SymbolTable  # noqa: E402
+
+# Position of each finger on its hand, from the outside towards the thumb
+FINGER_POSITIONS = {
+    "auriculaire": 0,
+    "annulaire": 1,
+    "majeur": 2,
+    "index": 3,
+    "thumb": 4,
+}
+THUMB = FINGER_POSITIONS["thumb"]
+HANDS = ("left", "right")
+FINGER_NAMES = [
+    f"{hand} {finger}" for hand in HANDS for finger in FINGER_POSITIONS
+]
+
+# Characters typed by the keys whose name is not the character itself
+KEY_CHARACTERS = {
+    "Space": " ",
+    "enter": "\n",
+    "Enter": "\n",
+    "Tab": "\t",
+    "magique": "★",
+}
+
+# macOS virtual key code of each physical key code of the geometry. On ISO
+# Apple keyboards, the key left of 1 sends 10 and the key right of the left
+# shift sends 50, the other way round from the ANSI names of these codes.
+MACOS_KEY_CODES = {
+    "KeyA": 0,
+    "KeyS": 1,
+    "KeyD": 2,
+    "KeyF": 3,
+    "KeyH": 4,
+    "KeyG": 5,
+    "KeyZ": 6,
+    "KeyX": 7,
+    "KeyC": 8,
+    "KeyV": 9,
+    "Backquote": 10,
+    "KeyB": 11,
+    "KeyQ": 12,
+    "KeyW": 13,
+    "KeyE": 14,
+    "KeyR": 15,
+    "KeyY": 16,
+    "KeyT": 17,
+    "Digit1": 18,
+    "Digit2": 19,
+    "Digit3": 20,
+    "Digit4": 21,
+    "Digit6": 22,
+    "Digit5": 23,
+    "Equal": 24,
+    "Digit9": 25,
+    "Digit7": 26,
+    "Minus": 27,
+    "Digit8": 28,
+    "Digit0": 29,
+    "BracketRight": 30,
+    "KeyO": 31,
+    "KeyU": 32,
+    "BracketLeft": 33,
+    "KeyI": 34,
+    "KeyP": 35,
+    "Enter": 36,
+    "KeyL": 37,
+    "KeyJ": 38,
+    "Quote": 39,
+    "KeyK": 40,
+    "Semicolon": 41,
+    "Backslash": 42,
+    "Comma": 43,
+    "Slash": 44,
+    "KeyN": 45,
+    "KeyM": 46,
+    "Period": 47,
+    "Tab": 48,
+    "Space": 49,
+    "IntlBackslash": 50,
+}
+
+
+@dataclass
+class Keyboard:
+    """Geometry of the physical keys, as vectors indexed by key.
+
+    The last index (`none`) stands for characters that the layout does not
+    place on a key, and is excluded from every metric.
+    """
+
+    codes: list[str]
+    hand: np.ndarray
+    finger: np.ndarray
+    row: np.ndarray
+    column: np.ndarray
+
+    @classmethod
+    def from_geometry(cls, keys: list[dict] | None = None) -> "Keyboard":
+        """Build the keyboard from entries like those of GEOMETRY["iso"].
+
+        Keys without a code (modifiers) are left out.
+        """
+        keys = [key for key in keys or GEOMETRY["iso"] if "code" in key]
+        return cls(
+            codes=[key["code"] for key in keys],
+            hand=np.array([HANDS.index(key["hand"]) for key in keys]),
+            finger=np.array([FINGER_POSITIONS[key["finger"]] for key in keys]),
+            row=np.array([int(key["row"]) for key in keys]),
+            column=np.array([int(key["column"]) for key in keys]),
+        )
+
+    @property
+    def none(self) -> int:
+        return len(self.codes)
+
+    @property
+    def size(self) -> int:
+        return len(self.codes) + 1
+
+    @property
+    def finger_ids(self) -> np.ndarray:
+        """Finger of each key among the 10 of FINGER_NAMES."""
+        return self.hand * len(FINGER_POSITIONS) + self.finger
+
+
+@dataclass
+class LayoutMetrics:
+    """Rates of a layout, as fractions of the n-grams typed on its keys.
+
+    Attributes:
+        sfb: Same finger bigrams, on two different keys.
+        sfs: Same finger skipgrams, with any character in between.
+        alternation: Trigrams alternating hands twice.
+        roll_in: Trigrams rolling two fingers of a hand towards the thumb.
+        roll_out: Trigrams rolling two fingers of a hand outwards.
+        redirect: One-hand trigrams changing direction.
+        finger_load: Share of the keystrokes of each finger of FINGER_NAMES.
+    """
+
+    sfb: float
+    sfs: float
+    alternation: float
+    roll_in: float
+    roll_out: float
+    redirect: float
+    finger_load: np.ndarray
+
+
+def layout_from_keys(keys: list[dict]) -> dict[str, str]:
+    """Map each character to the code of its key, from layout entries.
+
+    Entries are those of the "iso" list of the layout JSON files. Keys
+    typing no single character (dead keys, modifiers) are skipped.
+    """
+    layout = {}
+    for key in keys:
+        char = KEY_CHARACTERS.get(key["key"], key["key"])
+        if "code" in key and len(char) == 1:
+            layout.setdefault(char, key["code"])
+    return layout
+
+
+def load_layout(path: Path) -> dict[str, str]:
+    """Read a layout JSON file of static/layouts/visualisation."""
+    with open(path, encoding="utf-8") as file:
+        return layout_from_keys(json.load(file)["iso"])
+
+
+def load_keylayout(path: Path) -> dict[str, str]:
+    """Read the base layer of a macOS .keylayout file.
+
+    Keys whose output (or action output without state) is not a single
+    character, such as dead keys, are skipped.
+    """
+    symbol_table = SymbolTable(Path(path).read_text(encoding="utf-8"))
+    layout = {}
+    for code, macos_code in MACOS_KEY_CODES.items():
+        char = symbol_table.symbol(0, macos_code)
+        char = "\n" if char == "\r" else char
+        if len(char) == 1:
+            layout.setdefault(char, code)
+    return layout
+
+
+def typed_character(char: str) -> str:
+    """Character whose key types `char`: uppercase letters are shifted."""
+    lower = char.lower()
+    return lower if len(lower) == 1 and lower in ALPHABET else char
+
+
+class LayoutEvaluator:
+    """Score layouts of a keyboard on fixed n-gram counts.
+
+    Args:
+        counts: The corpus n-gram counts. Uppercase characters count as
+            their lowercase key, characters outside the alphabet are
+            ignored.
+        keyboard: The key geometry, the ISO board by default.
+    """
+
+    def __init__(self, counts: NGramCounts, keyboard: Keyboard | None = None):
+        self.keyboard = keyboard or Keyboard.from_geometry()
+        self.characters = sorted(
+            {typed_character(char) for char in ALPHABET}, key=ALPHABET.index
+        )
+        fold = np.full(SIZE, -1)
+        for index, char in enumerate(ALPHABET):
+            fold[index] = self.characters.index(typed_character(char))
+
+        self.unigrams = np.bincount(
+            fold[:OTHER],
+            weights=counts.unigrams[:OTHER],
+            minlength=len(self.characters),
+        )
+        skipgrams = counts.trigrams.sum(axis=1)
+        self.bigrams = self._sparse(counts.bigrams, fold)
+        self.skipgrams = self._sparse(skipgrams, fold)
+        self.trigrams = self._sparse(counts.trigrams, fold)
+        self._build_masks()
+
+    def _sparse(self, counts: np.ndarray, fold: np.ndarray):
+        """Fold n-gram counts onto typed characters, as sparse arrays.
+
+        Returns:
+            The indices of each position of the n-grams, and their counts.
+        """
+        counts = counts[(slice(0, OTHER),) * counts.ndim]
+        nonzero = np.nonzero(counts)
+        size = len(self.characters)
+        combined = np.zeros(len(nonzero[0]), dtype=np.intp)
+        for indices in nonzero:
+            combined = combined * size + fold[indices]
+        folded = np.bincount(
+            combined, weights=counts[nonzero], minlength=size**counts.ndim
+        )
+        present = np.flatnonzero(folded)
+        positions = np.unravel_index(present, (size,) * counts.ndim)
+        return positions, folded[present]
+
+    def _build_masks(self) -> None:
+        keyboard = self.keyboard
+        real = np.arange(keyboard.size) < keyboard.none
+        hand = np.append(keyboard.hand, -1)
+        finger = np.append(keyboard.finger, -1)
+        typing = real & (finger != THUMB)
+
+        # Bigram masks, first key along the first axis
+        a, b = np.ix_(range(keyboard.size), range(keyboard.size))
+        real_bigram = real[a] & real[b]
+        same_finger = (
+            real_bigram & (hand[a] == hand[b]) & (finger[a] == finger[b])
+        )
+        same_finger &= a != b
+        self.bigram_masks = np.array(
+            [real_bigram.ravel(), same_finger.ravel()], dtype=np.float64
+        )
+
+        # Trigram masks, thumbs taking part in no alternation nor roll
+        a, b, c = np.ix_(*[range(keyboard.size)] * 3)
+        real_trigram = real[a] & real[b] & real[c]
+        fingers = typing[a] & typing[b] & typing[c]
+        ha, hb, hc = hand[a], hand[b], hand[c]
+        fa, fb, fc = finger[a], finger[b], finger[c]
+        alternation = fingers & (ha != hb) & (hb != hc)
+        first_roll = fingers & (ha == hb) & (hb != hc) & (fa != fb)
+        second_roll = fingers & (ha != hb) & (hb == hc) & (fb != fc)
+        roll_in = (first_roll & (fb > fa)) | (second_roll & (fc > fb))
+        roll_out = (first_roll & (fb < fa)) | (second_roll & (fc < fb))
+        one_hand = fingers & (ha == hb) & (hb == hc)
+        redirect = (
+            one_hand
+            & (fa != fc)
+            & (((fa < fb) & (fb > fc)) | ((fa > fb) & (fb < fc)))
+        )
+        self.trigram_masks = np.array(
+            [
+                mask.ravel()
+                for mask in (
+                    real_trigram,
+                    alternation,
+                    roll_in,
+                    roll_out,
+                    redirect,
+                )
+            ],
+            dtype=np.float64,
+        )
+
+    def placement(self, layout: dict[str, str]) -> np.ndarray:
+        """Key index of each typed character, `none` if not on the layout."""
+        code_index = {code: i for i, code in enumerate(self.keyboard.codes)}
+        return np.array(
+            [
+                code_index.get(layout.get(char), self.keyboard.none)
+                for char in self.characters
+            ]
+        )
+
+    def _key_counts(self, sparse, placement: np.ndarray) -> np.ndarray:
+        positions, counts = sparse
+        size = self.keyboard.size
+        combined = np.zeros(len(counts), dtype=np.intp)
+        for indices in positions:
+            combined = combined * size + placement[indices]
+        return np.bincount(
+            combined, weights=counts, minlength=size ** len(positions)
+        )
+
+    def evaluate(self, layout: dict[str, str] | np.ndarray) -> LayoutMetrics:
+        """Compute the metrics of a layout.
+
+        Args:
+            layout: A character to key code mapping, or a placement array
+                as returned by `placement`, faster when scoring many
+                variations of a layout.
+        """
+        placement = (
+            self.placement(layout) if isinstance(layout, dict) else layout
+        )
+        bigram_total, sfb = self.bigram_masks @ self._key_counts(
+            self.bigrams, placement
+        )
+        skipgram_total, sfs = self.bigram_masks @ self._key_counts(
+            self.skipgrams, placement
+        )
+        trigram_total, alternation, roll_in, roll_out, redirect = (
+            self.trigram_masks @ self._key_counts(self.trigrams, placement)
+        )
+
+        keyboard = self.keyboard
+        on_keys = placement != keyboard.none
+        finger_load = np.bincount(
+            keyboard.finger_ids[placement[on_keys]],
+            weights=self.unigrams[on_keys],
+            minlength=len(FINGER_NAMES),
+        )
+        return LayoutMetrics(
+            sfb=_rate(sfb, bigram_total),
+            sfs=_rate(sfs, skipgram_total),
+            alternation=_rate(alternation, trigram_total),
+            roll_in=_rate(roll_in, trigram_total),
+            roll_out=_rate(roll_out, trigram_total),
+            redirect=_rate(redirect, trigram_total),
+            finger_load=finger_load / max(finger_load.sum(), 1),
+        )
+
+
+def _rate(count: float, total: float) -> float:
+    return float(count / total) if total else 0.0
+
+
+def main(corpus="fr", repetitions=1000):
+    evaluator = LayoutEvaluator(
+        count_files(corpus_files(CORPUS_DIRECTORY / corpus))
+    )
+    layouts = {
+        path.stem: load_layout(path)
+        for path in sorted(LAYOUTS_DIRECTORY.glob("*.json"))
+    }
+    print(
+        f"{'Disposition':<18} {'SFB':>6} {'SFS':>6} {'Alt.':>6} "
+        f"{'Roul. in':>8} {'Roul. out':>9} {'Redir.':>6}"
+    )
+    for name, layout in layouts.items():
+        metrics = evaluator.evaluate(layout)
+        print(
+            f"{name:<18} {metrics.sfb:6.2%} {metrics.sfs:6.2%} "
+            f"{metrics.alternation:6.2%} {metrics.roll_in:8.2%} "
+            f"{metrics.roll_out:9.2%} {metrics.redirect:6.2%}"
+        )
+
+    placement = evaluator.placement(next(iter(layouts.values())))
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        evaluator.evaluate(placement)
+    duration = (time.perf_counter() - start) / repetitions
+    print(f"Évaluation d’une disposition : {duration * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
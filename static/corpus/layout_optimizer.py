@@ -0,0 +1,430 @@
+"""
+Simulated annealing layout optimizer, scoring each key swap by its delta.
+
+The cost of a layout is a quadratic assignment: a weight for every pair of
+characters (their bigram and skipgram frequencies) times a cost for the
+pair of keys they are placed on (1 for a same finger bigram), plus an
+effort per key weighted by the character frequencies. Swapping two keys
+only changes the rows and columns of the two characters moved, so the
+delta of a swap is computed from them alone, in O(number of keys).
+
+Independent chains run in a process pool, and each one regularly saves
+its state to disk, so that an interrupted run resumes where it stopped.
+"""
+
+import hashlib
+import json
+import math
+import os
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from corpus_sample import sample_files
+from layout_metrics import (
+    GEOMETRY,
+    THUMB,
+    Keyboard,
+    LayoutEvaluator,
+    layout_from_keys,
+    load_keylayout,
+)
+from ngrams import CORPUS_DIRECTORY, corpus_files, count_files
+
+CHECKPOINT_DIRECTORY = Path(__file__).resolve().parent / "cache" / "optimizer"
+
+# Characters that stay on their key unless told otherwise
+DEFAULT_PINNED = " \n\t" + string.digits
+
+# Weights of the cost terms, relative to the same finger bigrams
+SKIPGRAM_WEIGHT = 0.5
+EFFORT_WEIGHT = 0.01
+# Effort of a key: by finger (pinky to thumb), then by distance to the
+# home row (row 3 of the geometry)
+FINGER_EFFORT = (1.6, 1.3, 1.0, 1.0, 1.0)
+ROW_EFFORT = (0.0, 0.5, 1.0, 1.5, 2.0)
+HOME_ROW = 3
+
+
+def key_efforts(keyboard: Keyboard) -> np.ndarray:
+    """Effort of typing each key of the keyboard."""
+    finger = np.array(FINGER_EFFORT)[keyboard.finger]
+    row = np.array(ROW_EFFORT)[np.abs(keyboard.row - HOME_ROW)]
+    return finger + row
+
+
+def same_finger_costs(keyboard: Keyboard) -> np.ndarray:
+    """1 for each pair of different keys typed by the same finger."""
+    same_finger = (keyboard.hand[:, None] == keyboard.hand[None, :]) & (
+        keyboard.finger[:, None] == keyboard.finger[None, :]
+    )
+    np.fill_diagonal(same_finger, False)
+    same_finger &= keyboard.finger[:, None] != THUMB
+    return same_finger.astype(np.float64)
+
+
+@dataclass
+class SwapProblem:
+    """The layout cost, restricted to the characters placed on keys.
+
+    Attributes:
+        characters: The characters placed on the layout.
+        codes: The key codes of the keyboard.
+        flows: Weight of each ordered pair of characters, (n, n).
+        unigrams: Frequency of each character, (n,).
+        key_costs: Cost of each ordered pair of keys, (K, K).
+        key_efforts: Effort of each key, (K,).
+        movable: Indices of the characters that may be swapped.
+    """
+
+    characters: list[str]
+    codes: list[str]
+    flows: np.ndarray
+    unigrams: np.ndarray
+    key_costs: np.ndarray
+    key_efforts: np.ndarray
+    movable: np.ndarray
+
+    @classmethod
+    def from_layout(
+        cls,
+        evaluator: LayoutEvaluator,
+        layout: dict[str, str],
+        pinned: str = DEFAULT_PINNED,
+    ) -> tuple["SwapProblem", np.ndarray]:
+        """Build the problem of improving `layout`.
+
+        Returns:
+            The problem, and the starting placement: the key index of each
+            of its characters.
+        """
+        keyboard = evaluator.keyboard
+        full_placement = evaluator.placement(layout)
+        placed = np.flatnonzero(full_placement != keyboard.none)
+        # Index among the placed characters of each evaluator character
+        reindex = np.full(len(evaluator.characters), -1)
+        reindex[placed] = np.arange(len(placed))
+
+        flows = np.zeros((len(placed), len(placed)))
+        for (first, second), counts, weight in (
+            (*evaluator.bigrams, 1.0),
+            (*evaluator.skipgrams, SKIPGRAM_WEIGHT),
+        ):
+            kept = (reindex[first] >= 0) & (reindex[second] >= 0)
+            np.add.at(
+                flows,
+                (reindex[first[kept]], reindex[second[kept]]),
+                weight * counts[kept] / counts.sum(),
+            )
+        unigrams = evaluator.unigrams[placed] / evaluator.unigrams.sum()
+
+        characters = [evaluator.characters[index] for index in placed]
+        problem = cls(
+            characters=characters,
+            codes=list(keyboard.codes),
+            flows=flows,
+            unigrams=unigrams,
+            key_costs=same_finger_costs(keyboard),
+            key_efforts=EFFORT_WEIGHT * key_efforts(keyboard),
+            movable=np.array(
+                [i for i, char in enumerate(characters) if char not in pinned]
+            ),
+        )
+        return problem, full_placement[placed]
+
+    def score(self, placement: np.ndarray) -> float:
+        """Total cost of a placement, lower is better."""
+        pair_costs = self.key_costs[np.ix_(placement, placement)]
+        return float(
+            (self.flows * pair_costs).sum()
+            + self.unigrams @ self.key_efforts[placement]
+        )
+
+    def swap_delta(self, placement: np.ndarray, i: int, j: int) -> float:
+        """Change of the cost when characters i and j swap their keys.
+
+        Only the flows of rows and columns i and j are read: every other
+        character k keeps its key, so only its pairs with i and j change.
+        """
+        costs, flows = self.key_costs, self.flows
+        x, y = placement[i], placement[j]
+        # Cost changes of the pairs (k, moved) and (moved, k) for all k
+        column_change = costs[placement, y] - costs[placement, x]
+        row_change = costs[y, placement] - costs[x, placement]
+        delta = (flows[:, i] - flows[:, j]) @ column_change + (
+            flows[i] - flows[j]
+        ) @ row_change
+        # The terms for k = i and k = j above are wrong, as both characters
+        # move: replace them with the exact changes of the 2 x 2 block
+        delta -= (flows[i, i] - flows[i, j]) * column_change[i]
+        delta -= (flows[j, i] - flows[j, j]) * column_change[j]
+        delta -= (flows[i, i] - flows[j, i]) * row_change[i]
+        delta -= (flows[i, j] - flows[j, j]) * row_change[j]
+        delta += (flows[i, i] - flows[j, j]) * (costs[y, y] - costs[x, x])
+        delta += (flows[i, j] - flows[j, i]) * (costs[y, x] - costs[x, y])
+        efforts = self.key_efforts
+        delta += (self.unigrams[i] - self.unigrams[j]) * (
+            efforts[y] - efforts[x]
+        )
+        return float(delta)
+
+    def digest(self) -> str:
+        """SHA-256 identifying the problem, to match it with checkpoints."""
+        digest = hashlib.sha256()
+        digest.update("".join(self.characters).encode())
+        digest.update(json.dumps(self.codes).encode())
+        for array in (
+            self.flows,
+            self.unigrams,
+            self.key_costs,
+            self.key_efforts,
+            self.movable,
+        ):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+
+@dataclass
+class ChainResult:
+    seed: int
+    score: float
+    placement: np.ndarray
+    accepted: int
+    duration: float
+
+
+def initial_temperature(
+    problem: SwapProblem,
+    placement: np.ndarray,
+    rng: np.random.Generator,
+    samples: int = 200,
+) -> float:
+    """Median cost increase of random swaps, accepted 37 % of the time."""
+    deltas = []
+    for _ in range(samples):
+        i, j = _random_pair(problem.movable, rng)
+        deltas.append(abs(problem.swap_delta(placement, i, j)))
+    return float(np.median(deltas)) or 1e-9
+
+
+def _random_pair(movable: np.ndarray, rng: np.random.Generator):
+    """Two different movable characters, drawn uniformly."""
+    first, second = rng.integers(len(movable), size=2)
+    while second == first:
+        second = rng.integers(len(movable))
+    return movable[first], movable[second]
+
+
+def run_chain(
+    problem: SwapProblem,
+    placement: np.ndarray,
+    seed: int,
+    iterations: int,
+    checkpoint_path: Path | None = None,
+    checkpoint_every: int = 10_000,
+    final_temperature_ratio: float = 1e-3,
+) -> ChainResult:
+    """Anneal a placement with random swaps of movable characters.
+
+    The temperature decreases geometrically from the initial temperature
+    down to `final_temperature_ratio` times it. The chain state is saved
+    to `checkpoint_path` every `checkpoint_every` iterations and resumed
+    from it if it belongs to the same problem and seed.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    placement = placement.copy()
+    state = _load_checkpoint(checkpoint_path, problem, seed, iterations)
+    if state is not None:
+        placement = np.array(state["placement"])
+        best_placement = np.array(state["best_placement"])
+        best_score = state["best_score"]
+        iteration = state["iteration"]
+        initial = state["initial_temperature"]
+        accepted = state["accepted"]
+        rng.bit_generator.state = state["rng"]
+    else:
+        best_placement = placement.copy()
+        best_score = problem.score(placement)
+        iteration = 0
+        initial = initial_temperature(problem, placement, rng)
+        accepted = 0
+    cooling = final_temperature_ratio ** (1 / max(iterations, 1))
+
+    score = problem.score(placement)
+    movable = problem.movable
+    while iteration < iterations:
+        temperature = initial * cooling**iteration
+        i, j = _random_pair(movable, rng)
+        delta = problem.swap_delta(placement, i, j)
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            placement[i], placement[j] = placement[j], placement[i]
+            score += delta
+            accepted += 1
+            if score < best_score:
+                best_score = score
+                best_placement = placement.copy()
+        iteration += 1
+        if checkpoint_path is not None and iteration % checkpoint_every == 0:
+            _save_checkpoint(
+                checkpoint_path,
+                {
+                    "problem": problem.digest(),
+                    "seed": seed,
+                    "iterations": iterations,
+                    "iteration": iteration,
+                    "initial_temperature": initial,
+                    "accepted": accepted,
+                    "placement": placement.tolist(),
+                    "best_placement": best_placement.tolist(),
+                    "best_score": best_score,
+                    "rng": rng.bit_generator.state,
+                },
+            )
+
+    # Accumulated deltas drift slightly, so the best score is recomputed
+    return ChainResult(
+        seed=seed,
+        score=problem.score(best_placement),
+        placement=best_placement,
+        accepted=accepted,
+        duration=time.perf_counter() - start,
+    )
+
+
+def _load_checkpoint(
+    path: Path | None, problem: SwapProblem, seed: int, iterations: int
+) -> dict | None:
+    if path is None or not path.exists():
+        return None
+    state = json.loads(path.read_text(encoding="utf-8"))
+    if (
+        state.get("problem") != problem.digest()
+        or state.get("seed") != seed
+        or state.get("iterations") != iterations
+    ):
+        return None
+    return state
+
+
+def _save_checkpoint(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    temporary_path.write_text(json.dumps(state), encoding="utf-8")
+    temporary_path.replace(path)
+
+
+def optimize(
+    problem: SwapProblem,
+    placement: np.ndarray,
+    chains: int = 4,
+    iterations: int = 200_000,
+    seed: int = 0,
+    processes: int | None = None,
+    checkpoint_directory: Path | None = CHECKPOINT_DIRECTORY,
+) -> list[ChainResult]:
+    """Run independent annealing chains in a process pool.
+
+    Chain i uses the seed `seed + i` and its own checkpoint file, so
+    running the same call again resumes every unfinished chain.
+
+    Returns:
+        The result of each chain, best score first.
+    """
+    processes = processes or min(chains, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                run_chain,
+                problem,
+                placement,
+                seed + index,
+                iterations,
+                checkpoint_directory / f"chain_{seed + index}.json"
+                if checkpoint_directory is not None
+                else None,
+            )
+            for index in range(chains)
+        ]
+        results = [future.result() for future in futures]
+    return sorted(results, key=lambda result: result.score)
+
+
+def placement_to_layout(
+    problem: SwapProblem, placement: np.ndarray
+) -> dict[str, str]:
+    """Character to key code mapping of a placement."""
+    return {
+        char: problem.codes[key]
+        for char, key in zip(problem.characters, placement)
+    }
+
+
+def print_layout(layout: dict[str, str], keyboard: Keyboard) -> None:
+    """Print the characters of a layout row by row, as on the keyboard."""
+    char_of_code = {code: char for char, code in layout.items()}
+    shown = {" ": "␣", "\n": "⮐", "\t": "⇥"}
+    for row in sorted(set(keyboard.row.tolist())):
+        keys = sorted(
+            (column, code)
+            for code, key_row, column in zip(
+                keyboard.codes, keyboard.row, keyboard.column
+            )
+            if key_row == row
+        )
+        print(
+            " ".join(
+                shown.get(
+                    char_of_code.get(code, "·"), char_of_code.get(code, "·")
+                )
+                for _, code in keys
+            )
+        )
+
+
+def main(
+    keylayout=None,
+    corpus="fr",
+    pinned=DEFAULT_PINNED,
+    chains=4,
+    iterations=200_000,
+    seed=0,
+    sample=False,
+):
+    # The representative sample of the corpus is enough to explore layouts
+    paths = (
+        sample_files(corpus)
+        if sample
+        else corpus_files(CORPUS_DIRECTORY / corpus)
+    )
+    evaluator = LayoutEvaluator(count_files(paths))
+    layout = (
+        load_keylayout(keylayout)
+        if keylayout is not None
+        else layout_from_keys(GEOMETRY["iso"])
+    )
+    problem, placement = SwapProblem.from_layout(evaluator, layout, pinned)
+    print(f"Score de départ : {problem.score(placement):.6f}")
+
+    results = optimize(problem, placement, chains, iterations, seed)
+    for result in results:
+        print(
+            f"Chaîne {result.seed} : {result.score:.6f} "
+            f"({result.accepted} échanges acceptés en {result.duration:.1f} s)"
+        )
+
+    best_layout = placement_to_layout(problem, results[0].placement)
+    print_layout(best_layout, evaluator.keyboard)
+    for name, candidate in (("Départ", layout), ("Optimisée", best_layout)):
+        metrics = evaluator.evaluate(candidate)
+        print(
+            f"{name} : SFB {metrics.sfb:.2%}, SFS {metrics.sfs:.2%}, "
+            f"roulements {metrics.roll_in + metrics.roll_out:.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main(keylayout=None, corpus="fr", chains=4, iterations=200_000)
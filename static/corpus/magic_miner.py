@@ -0,0 +1,255 @@
+"""
+Mine new ★ magic shortcuts from the frequent words and phrases of a corpus.
+
+Every frequent word or phrase gets candidate abbreviations (its first
+letters, its consonants, its initials…) typed before the ★ key. Candidates
+are ranked by the keystrokes they would save on the corpus, and picked
+greedily: no trigger or output may be used twice, nor collide with an
+existing hotstring. The selection is written as a TOML file in the format
+of the hotstrings directory, to be reviewed before copying it to
+magic.toml.
+
+The word and phrase counts of each corpus are cached in cache/words, so
+that mining again with another budget is immediate.
+"""
+
+import json
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from hotstrings_rules import (
+    DRIVERS_DIRECTORY,
+    HOTSTRINGS_DIRECTORY,
+    load_hotstrings,
+)
+from keystroke_savings import load_saving_hotstrings
+from ngrams import CORPUS_DIRECTORY, corpus_files, read_corpus_text
+from suffix_index import files_hash
+
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from hotstrings.generation.extract_hotstrings_from_ahk import (  # noqa: E402
+    convert_to_toml,
+)
+
+CACHE_DIRECTORY = Path(__file__).resolve().parent / "cache" / "words"
+MINED_TOML_PATH = Path(__file__).resolve().parent / "magic_mined.toml"
+
+# Bump when the counted words or the cache format change
+WORDS_VERSION = 1
+
+MAGIC_KEY = "★"
+MAX_PHRASE_WORDS = 3
+# Rarer words and phrases are not cached, nor worth a shortcut
+MIN_COUNT = 10
+
+# A word may contain apostrophes and hyphens: "c'est", "peut-être"
+_WORD = re.compile(r"\w+(?:['-]\w+)*")
+_WORD_PARTS = re.compile(r"[ '-]+")
+_VOWELS = set("aeiouyàâäéèêëîïôöùûüœæ")
+
+
+def folded_case(phrase: str) -> str | None:
+    """The lowercase form whose case variants include `phrase`.
+
+    Hotstrings are expanded with their capitalized variant, so "Mais"
+    counts as "mais". Other mixed case phrases ("ChatGPT") are left out.
+    """
+    lower = phrase.lower()
+    if phrase == lower or phrase == lower[0].upper() + lower[1:]:
+        return lower
+    return None
+
+
+def count_phrases(text: str) -> Counter:
+    """Count the words and the phrases of up to MAX_PHRASE_WORDS words.
+
+    A phrase is made of words separated by a single space, with their
+    case folded by `folded_case`.
+    """
+    text = text.replace("’", "'")
+    counts = Counter()
+    previous = []
+    for match in _WORD.finditer(text):
+        if previous and text[previous[-1].end() : match.start()] != " ":
+            previous = []
+        previous = [*previous[-(MAX_PHRASE_WORDS - 1) :], match]
+        for first in previous:
+            phrase = folded_case(text[first.start() : match.end()])
+            if phrase is not None:
+                counts[phrase] += 1
+    return counts
+
+
+def load_phrase_counts(
+    corpus: str = "fr", cache_directory: Path = CACHE_DIRECTORY
+) -> Counter:
+    """Words and phrases of a corpus seen at least MIN_COUNT times.
+
+    The counts are cached, keyed by the content of the corpus files.
+    """
+    paths = corpus_files(CORPUS_DIRECTORY / corpus)
+    digest = files_hash(paths, WORDS_VERSION)
+    cache_path = cache_directory / f"{corpus}_{digest[:16]}.json"
+    if cache_path.exists():
+        return Counter(json.loads(cache_path.read_text(encoding="utf-8")))
+
+    counts = Counter()
+    for path in paths:
+        counts += count_phrases(read_corpus_text(path))
+    counts = Counter(
+        {
+            phrase: count
+            for phrase, count in counts.items()
+            if count >= MIN_COUNT
+        }
+    )
+    cache_directory.mkdir(parents=True, exist_ok=True)
+    for stale_path in cache_directory.glob(f"{corpus}_*.json"):
+        stale_path.unlink()
+    temporary_path = cache_path.with_suffix(".tmp")
+    temporary_path.write_text(
+        json.dumps(counts, ensure_ascii=False), encoding="utf-8"
+    )
+    temporary_path.replace(cache_path)
+    return counts
+
+
+def abbreviations(phrase: str) -> set[str]:
+    """Candidate triggers of a phrase, without the ★ key.
+
+    A word is abbreviated by its first letters ("gra"), its first and last
+    letters ("gd") or its first consonants ("grn"); a phrase by the
+    initials of its words ("iya" for "il y a").
+    """
+    words = [word for word in _WORD_PARTS.split(phrase) if word]
+    if len(words) > 1:
+        initials = "".join(word[0] for word in words)
+        return {initials, initials[:-1] + words[-1][:2]}
+
+    word = words[0]
+    consonants = word[0] + "".join(
+        char for char in word[1:] if char not in _VOWELS
+    )
+    candidates = {word[:length] for length in range(1, 4)}
+    candidates.add(word[0] + word[-1])
+    candidates.update(consonants[:length] for length in range(2, 4))
+    return candidates
+
+
+def existing_triggers(
+    directory: Path = HOTSTRINGS_DIRECTORY,
+) -> tuple[set[str], set[str]]:
+    """The lowercased triggers of the hotstrings, and those firing anywhere.
+
+    A trigger firing anywhere, not only at the start of a word, also fires
+    at the end of any trigger ending with it. repeat.toml is left out: it
+    is generated after magic.toml, without the triggers already taken.
+    """
+    triggers = set()
+    anywhere = set()
+    for toml_path in directory.rglob("*.toml"):
+        if toml_path.name == "repeat.toml":
+            continue
+        for trigger, _, is_word, _ in load_hotstrings(toml_path):
+            triggers.add(trigger.lower())
+            if not is_word:
+                anywhere.add(trigger.lower())
+    return triggers, anywhere
+
+
+def mine_shortcuts(
+    counts: Counter,
+    budget: int = 100,
+    taken: set[str] | None = None,
+    anywhere: set[str] | None = None,
+    covered: set[str] | None = None,
+) -> list[tuple[str, str, int]]:
+    """Pick the magic shortcuts saving the most keystrokes.
+
+    Every (phrase, trigger) candidate is scored by the keystrokes saved on
+    each occurrence times the phrase count. Candidates are taken by
+    decreasing score, skipping triggers already used and phrases already
+    abbreviated, until `budget` shortcuts are chosen.
+
+    Args:
+        counts: The word and phrase counts.
+        budget: The maximum number of shortcuts.
+        taken: Existing triggers that may not be reused, lowercased.
+        anywhere: Existing triggers that may not end a new trigger either.
+        covered: Phrases already typed faster by an existing hotstring.
+
+    Returns:
+        (trigger, phrase, estimated savings) triples, by decreasing savings.
+    """
+    taken = set() if taken is None else set(taken)
+    anywhere = anywhere or set()
+    covered = covered or set()
+    candidates = []
+    for phrase, count in counts.items():
+        if phrase in covered:
+            continue
+        for abbreviation in abbreviations(phrase):
+            trigger = abbreviation + MAGIC_KEY
+            saved = len(phrase) - len(trigger)
+            shadowed = any(trigger.endswith(other) for other in anywhere)
+            if saved > 0 and not shadowed:
+                candidates.append((saved * count, phrase, trigger))
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[2]))
+
+    chosen = []
+    abbreviated = set()
+    for score, phrase, trigger in candidates:
+        if len(chosen) == budget:
+            break
+        if phrase in abbreviated or trigger in taken:
+            continue
+        chosen.append((trigger, phrase, score))
+        abbreviated.add(phrase)
+        taken.add(trigger)
+    return chosen
+
+
+def write_shortcuts(
+    shortcuts: list[tuple[str, str, int]], path: Path = MINED_TOML_PATH
+) -> None:
+    """Write shortcuts as word hotstrings, words and phrases apart."""
+    sections = {"mined_words": [], "mined_phrases": []}
+    for trigger, phrase, _ in shortcuts:
+        section = "mined_phrases" if " " in phrase else "mined_words"
+        sections[section].append((trigger, phrase, True, True))
+    path.write_text(convert_to_toml(sections, "mined") + "\n", encoding="utf-8")
+
+
+def main(corpus="fr", budget=100, shown=20):
+    start = time.perf_counter()
+    counts = load_phrase_counts(corpus)
+    print(
+        f"{len(counts)} mots et expressions de {corpus} "
+        f"comptés en {time.perf_counter() - start:.2f} s"
+    )
+
+    taken, anywhere = existing_triggers()
+    shortcuts = mine_shortcuts(
+        counts,
+        budget,
+        taken=taken,
+        anywhere=anywhere,
+        covered=set(load_saving_hotstrings()),
+    )
+    write_shortcuts(shortcuts)
+    saved = sum(score for *_, score in shortcuts)
+    print(
+        f"{len(shortcuts)} raccourcis écrits dans {MINED_TOML_PATH.name}, "
+        f"environ {saved} frappes économisées"
+    )
+    print(f"\n{'Déclencheur':<12} {'Sortie':<24} {'Économies':>10}")
+    for trigger, phrase, score in shortcuts[:shown]:
+        print(f"{trigger:<12} {phrase:<24} {score:>10}")
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
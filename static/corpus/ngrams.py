@@ -0,0 +1,451 @@
+"""
+Vectorized n-gram counting on the corpus texts.
+
+Characters are mapped to a dense index over a fixed alphabet, every other
+character sharing a single extra index. Unigrams, bigrams and trigrams are
+then counted with one np.bincount each over the combined indices, instead
+of a Python loop over the text. The exact count of every character, inside
+or outside the alphabet, is kept alongside.
+
+Corpus files may be compressed with gzip, xz or bzip2: they are then
+decompressed and decoded on the fly, and counted by chunks whose counts
+add up to those of the whole text.
+"""
+
+import bz2
+import codecs
+import gzip
+import hashlib
+import lzma
+import string
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# Bump whenever ALPHABET changes, as the count arrays depend on it
+ALPHABET_VERSION = 1
+
+_LOWERCASE_ACCENTED = "àâäçéèêëîïôöùûüÿœæ"
+ALPHABET = (
+    " \n\t\u00a0\u202f"
+    + string.ascii_lowercase
+    + _LOWERCASE_ACCENTED
+    + string.ascii_uppercase
+    + _LOWERCASE_ACCENTED.upper()
+    + string.digits
+    + ".,;:!?'’\"«»“”-–—…()[]{}<>/\\|@#$%&*+=_~^`★"
+)
+# Index shared by all the characters outside the alphabet
+OTHER = len(ALPHABET)
+SIZE = len(ALPHABET) + 1
+
+# Dense index of every Unicode code point
+_CODE_POINT_INDEX = np.full(0x110000, OTHER, dtype=np.uint8)
+_CODE_POINT_INDEX[[ord(char) for char in ALPHABET]] = np.arange(
+    len(ALPHABET), dtype=np.uint8
+)
+
+CORPUS_DIRECTORY = Path(__file__).resolve().parent / "original"
+CACHE_DIRECTORY = Path(__file__).resolve().parent / "cache" / "ngrams"
+FALLBACK_ENCODING = "latin-1"
+
+# Opener of the compressed corpus files, by suffix
+COMPRESSED_OPENERS = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open}
+# Characters decoded at a time from a compressed file
+CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class NGramCounts:
+    """N-gram counts of a text, indexed by position in ALPHABET.
+
+    Attributes:
+        characters: Count of every character, including those outside the
+            alphabet.
+        unigrams: Counts of shape (SIZE,).
+        bigrams: Counts of shape (SIZE, SIZE), first character first.
+        trigrams: Counts of shape (SIZE, SIZE, SIZE).
+    """
+
+    characters: dict[str, int]
+    unigrams: np.ndarray
+    bigrams: np.ndarray
+    trigrams: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "NGramCounts":
+        """Counts of an empty text."""
+        return cls(
+            characters={},
+            unigrams=np.zeros(SIZE, dtype=np.int64),
+            bigrams=np.zeros((SIZE, SIZE), dtype=np.int64),
+            trigrams=np.zeros((SIZE, SIZE, SIZE), dtype=np.int64),
+        )
+
+    @property
+    def total(self) -> int | float:
+        """Number of characters counted.
+
+        A float for the blended counts of a CorpusMix, which sum to 1.
+        """
+        total = self.unigrams.sum()
+        return float(total) if self.unigrams.dtype.kind == "f" else int(total)
+
+    def __add__(self, other: "NGramCounts") -> "NGramCounts":
+        characters = dict(self.characters)
+        for char, count in other.characters.items():
+            characters[char] = characters.get(char, 0) + count
+        return NGramCounts(
+            characters=characters,
+            unigrams=self.unigrams + other.unigrams,
+            bigrams=self.bigrams + other.bigrams,
+            trigrams=self.trigrams + other.trigrams,
+        )
+
+    def __iadd__(self, other: "NGramCounts") -> "NGramCounts":
+        # In place, to avoid reallocating the trigram array for each file
+        for char, count in other.characters.items():
+            self.characters[char] = self.characters.get(char, 0) + count
+        self.unigrams += other.unigrams
+        self.bigrams += other.bigrams
+        self.trigrams += other.trigrams
+        return self
+
+
+def encode(text: str) -> np.ndarray:
+    """Return the dense alphabet index of every character of `text`."""
+    code_points = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    return _CODE_POINT_INDEX[code_points]
+
+
+def count_text(text: str, skip: int = 0) -> NGramCounts:
+    """Count the characters, unigrams, bigrams and trigrams of `text`.
+
+    N-grams are counted inside the text only: concatenating two texts
+    creates n-grams that the sum of their counts does not contain.
+
+    Args:
+        text: The text to count.
+        skip: A number of leading characters, already counted with the
+            previous chunk of a text, whose only n-grams counted are those
+            ending after them.
+    """
+    code_points = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    per_code_point = np.bincount(code_points[skip:])
+    present = np.flatnonzero(per_code_point)
+    characters = {
+        chr(code_point): int(count)
+        for code_point, count in zip(present, per_code_point[present])
+    }
+
+    indices = _CODE_POINT_INDEX[code_points].astype(np.intp)
+    unigrams = np.bincount(indices[skip:], minlength=SIZE)
+    pairs = indices[:-1] * SIZE + indices[1:]
+    triples = pairs[:-1] * SIZE + indices[2:]
+    pairs = pairs[max(skip - 1, 0) :]
+    triples = triples[max(skip - 2, 0) :]
+    bigrams = np.bincount(pairs, minlength=SIZE**2).reshape(SIZE, SIZE)
+    trigrams = np.bincount(triples, minlength=SIZE**3).reshape(SIZE, SIZE, SIZE)
+    return NGramCounts(
+        characters=characters,
+        unigrams=unigrams.astype(np.int64, copy=False),
+        bigrams=bigrams.astype(np.int64, copy=False),
+        trigrams=trigrams.astype(np.int64, copy=False),
+    )
+
+
+def count_chunks(chunks) -> NGramCounts:
+    """Count a text given as consecutive chunks, like `count_text`.
+
+    Each chunk is counted after the last two characters of the previous
+    one, so the n-grams spanning two chunks are counted once.
+    """
+    total = NGramCounts.empty()
+    tail = ""
+    for chunk in chunks:
+        if chunk:
+            total += count_text(tail + chunk, skip=len(tail))
+            tail = (tail + chunk)[-2:]
+    return total
+
+
+def decode_corpus_bytes(content: bytes) -> str:
+    """Decode a corpus file, whose encoding is UTF-8 or else Latin-1.
+
+    Line endings are normalized to "\\n", as when reading in text mode.
+    """
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        text = content.decode(FALLBACK_ENCODING)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def open_corpus_file(path: Path):
+    """Open a corpus file in binary mode, decompressing it on the fly."""
+    opener = COMPRESSED_OPENERS.get(Path(path).suffix, open)
+    return opener(path, "rb")
+
+
+def is_compressed(path: Path) -> bool:
+    return Path(path).suffix in COMPRESSED_OPENERS
+
+
+def read_corpus_chunks(path: Path, encoding: str = "utf-8"):
+    """Yield the text of a corpus file by chunks, decoded incrementally.
+
+    Line endings are normalized to "\\n", as by `decode_corpus_bytes`.
+    """
+    with open_corpus_file(path) as file:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        # A "\r" ending a chunk may start a "\r\n" in the next one
+        carried = ""
+        while data := file.read(CHUNK_SIZE):
+            text = carried + decoder.decode(data)
+            carried = text[-1:] if text.endswith("\r") else ""
+            text = text[: len(text) - len(carried)]
+            yield text.replace("\r\n", "\n").replace("\r", "\n")
+        text = carried + decoder.decode(b"", final=True)
+        yield text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_corpus_text(path: Path) -> str:
+    """Read and decode a corpus file."""
+    with open_corpus_file(path) as file:
+        return decode_corpus_bytes(file.read())
+
+
+def corpus_files(directory: Path = CORPUS_DIRECTORY) -> list[Path]:
+    """All the corpus text files below `directory`, in a stable order.
+
+    Text files compressed with gzip, xz or bzip2 (.txt.gz…) are included.
+    """
+    return sorted(
+        path
+        for path in Path(directory).rglob("*.txt*")
+        if path.suffix == ".txt"
+        or (is_compressed(path) and path.suffixes[-2:-1] == [".txt"])
+    )
+
+
+def cache_key(content: bytes) -> str:
+    """Name of the cached counts of a file: its SHA-256, alphabet version."""
+    return f"{hashlib.sha256(content).hexdigest()}_v{ALPHABET_VERSION}"
+
+
+def save_counts(counts: NGramCounts, path: Path) -> None:
+    """Write counts to a compressed .npz file, n-grams stored sparse."""
+    arrays = {
+        "alphabet": np.array(ALPHABET),
+        "code_points": np.array(
+            [ord(char) for char in counts.characters], dtype=np.uint32
+        ),
+        "character_counts": np.array(
+            list(counts.characters.values()), dtype=np.int64
+        ),
+    }
+    for name in ("unigrams", "bigrams", "trigrams"):
+        flat = getattr(counts, name).ravel()
+        indices = np.flatnonzero(flat)
+        arrays[f"{name}_indices"] = indices.astype(np.uint32)
+        arrays[f"{name}_counts"] = flat[indices]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written aside then renamed, so that a concurrent reader never sees a
+    # partial file
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    temporary_path.replace(path)
+
+
+def load_counts(path: Path, into: NGramCounts | None = None) -> NGramCounts:
+    """Read counts written by `save_counts`.
+
+    Args:
+        path: The .npz file.
+        into: Counts to add the file counts to, in place, instead of
+            allocating new arrays.
+
+    Returns:
+        The counts read, added to `into` if given.
+    """
+    counts = into if into is not None else NGramCounts.empty()
+    with np.load(path) as arrays:
+        if str(arrays["alphabet"]) != ALPHABET:
+            raise ValueError(f"{path.name} was counted on another alphabet.")
+        for code_point, count in zip(
+            arrays["code_points"].tolist(), arrays["character_counts"].tolist()
+        ):
+            char = chr(code_point)
+            counts.characters[char] = counts.characters.get(char, 0) + count
+        for name in ("unigrams", "bigrams", "trigrams"):
+            # Indices are unique, so the fancy in-place addition is exact
+            getattr(counts, name).ravel()[arrays[f"{name}_indices"]] += arrays[
+                f"{name}_counts"
+            ]
+    return counts
+
+
+def count_file(
+    path: Path,
+    cache_directory: Path | None = CACHE_DIRECTORY,
+    into: NGramCounts | None = None,
+) -> NGramCounts:
+    """Count a corpus file, reusing its cached counts if it is unchanged.
+
+    Args:
+        path: The corpus file.
+        cache_directory: Where counts are cached, None to always count.
+        into: Counts to add the file counts to, in place.
+    """
+    content = Path(path).read_bytes()
+    cache_path = None
+    if cache_directory is not None:
+        cache_path = Path(cache_directory) / f"{cache_key(content)}.npz"
+        if cache_path.exists():
+            return load_counts(cache_path, into)
+
+    if is_compressed(path):
+        # Streamed, without holding the decompressed text in memory
+        try:
+            counts = count_chunks(read_corpus_chunks(path))
+        except UnicodeDecodeError:
+            counts = count_chunks(read_corpus_chunks(path, FALLBACK_ENCODING))
+    else:
+        counts = count_text(decode_corpus_bytes(content))
+    if cache_path is not None:
+        save_counts(counts, cache_path)
+    if into is not None:
+        into += counts
+        return into
+    return counts
+
+
+def count_files(
+    paths: list[Path], cache_directory: Path | None = CACHE_DIRECTORY
+) -> NGramCounts:
+    """Sum the n-gram counts of several corpus files.
+
+    Only new or modified files are counted, the others are read from the
+    cache.
+    """
+    total = NGramCounts.empty()
+    for path in paths:
+        count_file(path, cache_directory, into=total)
+    return total
+
+
+def letter_of(char: str) -> str | None:
+    """Uppercase base letter of `char` (É gives E), or None if not a letter.
+
+    Ligatures such as œ have no base letter and give None.
+    """
+    base = unicodedata.normalize("NFD", char)[:1].upper()
+    return base if len(base) == 1 and base in string.ascii_uppercase else None
+
+
+def letter_matrix() -> np.ndarray:
+    """Matrix of shape (SIZE, 26) folding alphabet indices into letters.
+
+    Multiplying unigram counts by it gives the counts of the 26 letters,
+    case and accents ignored.
+    """
+    matrix = np.zeros((SIZE, 26), dtype=np.int64)
+    for index, char in enumerate(ALPHABET):
+        letter = letter_of(char)
+        if letter is not None:
+            matrix[index, ord(letter) - ord("A")] = 1
+    return matrix
+
+
+def letter_counts(counts: NGramCounts) -> tuple[np.ndarray, np.ndarray]:
+    """Letter unigram (26,) and bigram (26, 26) counts, folded like LdS."""
+    fold = letter_matrix()
+    return counts.unigrams @ fold, fold.T @ counts.bigrams @ fold
+
+
+class CorpusMix:
+    """The counts of several corpora, to blend with any weights.
+
+    Each corpus is counted once (through the per-file cache) and
+    normalized by its own character total, so that its weight does not
+    depend on its size. Blending with new weights is then a single matrix
+    product per n-gram order, and never touches the source text.
+
+    Args:
+        corpora: The corpus subfolders, such as "fr", "en" or "code".
+        directory: The folder containing the corpus subfolders.
+        cache_directory: The per-file counts cache, None to disable it.
+    """
+
+    def __init__(
+        self,
+        corpora: list[str],
+        directory: Path = CORPUS_DIRECTORY,
+        cache_directory: Path | None = CACHE_DIRECTORY,
+    ):
+        self.corpora = list(corpora)
+        self.counts = {
+            name: count_files(
+                corpus_files(Path(directory) / name), cache_directory
+            )
+            for name in self.corpora
+        }
+        empty = [
+            name for name, counts in self.counts.items() if not counts.total
+        ]
+        if empty:
+            raise ValueError(f"Empty corpora: {empty}.")
+
+        # One row of frequencies per corpus, for each n-gram order
+        self._frequencies = {
+            array_name: np.stack(
+                [
+                    getattr(counts, array_name).ravel() / counts.total
+                    for counts in self.counts.values()
+                ]
+            )
+            for array_name in ("unigrams", "bigrams", "trigrams")
+        }
+
+    def blend(self, weights: dict[str, float]) -> NGramCounts:
+        """Blend the corpora n-gram distributions.
+
+        Args:
+            weights: The weight of each corpus, e.g.
+                {"fr": 0.6, "en": 0.25, "code": 0.15}. Missing corpora get
+                a zero weight, and the weights are normalized to sum to 1.
+
+        Returns:
+            Frequencies (float arrays whose unigrams sum to 1), usable
+            wherever counts are expected.
+        """
+        unknown = set(weights) - set(self.counts)
+        if unknown:
+            raise KeyError(f"Corpora not loaded: {sorted(unknown)}.")
+        if any(weight < 0 for weight in weights.values()):
+            raise ValueError(f"Negative weight in {weights}.")
+        weight_total = sum(weights.values())
+        if not weight_total:
+            raise ValueError("At least one corpus needs a positive weight.")
+
+        vector = np.array(
+            [weights.get(name, 0) / weight_total for name in self.corpora]
+        )
+        characters: dict[str, float] = {}
+        for name, factor in zip(self.corpora, vector):
+            counts = self.counts[name]
+            for char, count in counts.characters.items():
+                characters[char] = (
+                    characters.get(char, 0.0) + factor * count / counts.total
+                )
+        return NGramCounts(
+            characters=characters,
+            unigrams=vector @ self._frequencies["unigrams"],
+            bigrams=(vector @ self._frequencies["bigrams"]).reshape(SIZE, SIZE),
+            trigrams=(vector @ self._frequencies["trigrams"]).reshape(
+                SIZE, SIZE, SIZE
+            ),
+        )
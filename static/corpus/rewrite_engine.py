@@ -0,0 +1,335 @@
+"""
+Single-pass multi-pattern rewriting engine for the corpus conversion rules.
+
+A stage is an ordered list of (pattern, replacement) rules that used to be
+applied with one str.replace call per rule. Consecutive rules that cannot
+interact are merged into a single pass: a trie-shaped regular expression
+that rewrites all their occurrences in one linear scan of the text.
+The result is byte-identical to applying str.replace rule after rule.
+
+A stage can also be unordered, like a set of hotstrings: every position
+is then rewritten by the longest matching pattern in one single scan, and
+rules may be restricted to the start of a word.
+"""
+
+import re
+from collections import Counter
+
+# A rule is a (pattern, replacement) pair, optionally followed by a flag
+# restricting its matches to the start of a word (unordered stages only)
+Rule = tuple[str, str] | tuple[str, str, bool]
+
+# Costs relative to one str.replace call on the same text. str.replace
+# relies on a vectorized substring search, whereas the regex engine tries a
+# match at every position whose character may start a pattern. A single
+# scan thus only pays off when many rules share few first characters
+# (measured on the French corpus with CPython 3.13).
+REGEX_SCAN_COST = 8
+REGEX_BRANCH_COST = 2
+
+
+def can_overlap(first: str, second: str, include_aligned: bool = True) -> bool:
+    """Tell whether two strings can cover common characters of a same text.
+
+    Every relative offset of `second` against `first` is tried: the strings
+    overlap at an offset when they agree on all the positions they share.
+
+    Args:
+        first: The first string.
+        second: The second string.
+        include_aligned: Whether the offset 0 (same start) is considered.
+
+    Returns:
+        True if an overlapping placement exists.
+    """
+    for offset in range(1 - len(second), len(first)):
+        if offset == 0 and not include_aligned:
+            continue
+        start = max(0, offset)
+        end = min(len(first), offset + len(second))
+        if first[start:end] == second[start - offset : end - offset]:
+            return True
+    return False
+
+
+def rules_conflict(earlier: Rule, later: Rule) -> bool:
+    """Tell whether `later` cannot share a scan with the preceding `earlier`.
+
+    Sharing a scan is only safe when the later pattern can neither match
+    inside or across the text written by the earlier rule, nor overlap an
+    earlier occurrence from another starting position. Occurrences sharing
+    the same start are fine: the scan keeps the earlier rule's priority.
+    """
+    earlier_pattern, earlier_replacement = earlier[:2]
+    later_pattern = later[0]
+    if not earlier_replacement:
+        # Deleting text joins its neighbours, which may create new matches
+        return True
+    if can_overlap(earlier_replacement, later_pattern):
+        return True
+    return can_overlap(earlier_pattern, later_pattern, include_aligned=False)
+
+
+def split_into_passes(rules: list[Rule]) -> list[list[Rule]]:
+    """Greedily split ordered rules into runs of non-conflicting rules."""
+    passes: list[list[Rule]] = []
+    for rule in rules:
+        if not rule[0]:
+            raise ValueError(f"Empty pattern in rule {rule!r}.")
+        if rule[2:] and rule[2]:
+            raise ValueError(f"Word start rule {rule!r} in an ordered stage.")
+        if passes and not any(
+            rules_conflict(previous, rule) for previous in passes[-1]
+        ):
+            passes[-1].append(rule)
+        else:
+            passes.append([rule])
+    return passes
+
+
+def _trie_regex(node: dict) -> str:
+    """Build the regex source matching the longest pattern stored in a trie.
+
+    Children are tried before the terminal marker (the "" key), so the
+    longest pattern wins at each position. A pattern that must end a word
+    is followed by a negative lookahead.
+    """
+    branches = [
+        re.escape(char) + _trie_regex(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if node.get(""):
+        branches.append(r"(?!\w)")
+    if not branches:
+        return ""
+    if len(branches) == 1 and "" not in node:
+        return branches[0]
+    source = "(?:" + "|".join(branches) + ")"
+    if "" in node and not node[""]:
+        source += "?"
+    return source
+
+
+def _build_trie(patterns, word_end: set[str] = frozenset()) -> dict:
+    """Store patterns in a nested dict.
+
+    The "" key marks the end of a pattern, its value telling whether the
+    pattern must end a word.
+    """
+    trie: dict = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[""] = pattern in word_end
+    return trie
+
+
+class RewritePass:
+    """A run of non-conflicting rules, applied as if in a single scan.
+
+    The rules of a pass give the same result whether they are applied one
+    after the other or all at once, so the pass uses whichever is cheaper:
+    one scan with the compiled trie, or one str.replace per rule.
+
+    With `longest_match`, the rules are unordered instead: the scan always
+    rewrites the longest pattern matching at each position, and rules whose
+    word start flag is set only match where no word character precedes.
+    """
+
+    def __init__(self, rules: list[Rule], longest_match: bool = False):
+        self.replacements: dict[str, str] = {}
+        word_start: set[str] = set()
+        for pattern, replacement, *flags in rules:
+            if not pattern:
+                raise ValueError(f"Empty pattern for {replacement!r}.")
+            if pattern in self.replacements:
+                continue
+            # In an ordered pass, a pattern extending an earlier one never
+            # fires: the earlier rule always rewrites that position first
+            if not longest_match and any(
+                pattern.startswith(known) for known in self.replacements
+            ):
+                continue
+            self.replacements[pattern] = replacement
+            if flags and flags[0]:
+                word_start.add(pattern)
+
+        self.regex: re.Pattern | None = None
+        if longest_match:
+            self.regex = re.compile(
+                longest_match_regex(self.replacements, word_start)
+            )
+            return
+
+        # Rules rewriting a doubled character (the repeat key) are matched
+        # together through a backreference instead of one branch each,
+        # unless they start a longer pattern that must keep priority
+        doubled = {
+            pattern[0]
+            for pattern in self.replacements
+            if len(pattern) == 2
+            and pattern[0] == pattern[1]
+            and not any(
+                other != pattern and other.startswith(pattern)
+                for other in self.replacements
+            )
+        }
+
+        # Among the remaining rules, a pattern that is a prefix of another
+        # one comes later in the stage, so the longest match is the rule
+        # that str.replace would have applied first
+        trie = _build_trie(
+            pattern
+            for pattern in self.replacements
+            if not (len(pattern) == 2 and pattern[0] in doubled)
+        )
+
+        branch_count = len(trie) + (1 if doubled else 0)
+        scan_cost = REGEX_SCAN_COST + REGEX_BRANCH_COST * branch_count
+        if scan_cost < len(self.replacements):
+            branches = []
+            if doubled:
+                char_class = "".join(
+                    re.escape(char) for char in sorted(doubled)
+                )
+                branches.append(f"([{char_class}])\\1")
+            if trie:
+                branches.append(_trie_regex(trie))
+            self.regex = re.compile("|".join(branches))
+
+    def _replace(self, match: re.Match) -> str:
+        return self.replacements[match.group()]
+
+    def apply(self, text: str, hits: Counter | None = None) -> str:
+        """Rewrite every occurrence of the pass patterns in `text`.
+
+        Args:
+            text: The text to rewrite.
+            hits: If given, incremented by the number of rewrites of each
+                pattern (slower).
+        """
+        if self.regex is None:
+            for pattern, replacement in self.replacements.items():
+                if hits is not None:
+                    # Same non-overlapping occurrences as str.replace
+                    hits[pattern] += text.count(pattern)
+                text = text.replace(pattern, replacement)
+            return text
+        if hits is None:
+            return self.regex.sub(self._replace, text)
+
+        def replace_and_count(match: re.Match) -> str:
+            pattern = match.group()
+            hits[pattern] += 1
+            return self.replacements[pattern]
+
+        return self.regex.sub(replace_and_count, text)
+
+    def to_dict(self) -> dict:
+        """Return the compiled pass as JSON-serializable data."""
+        return {
+            "replacements": self.replacements,
+            "regex": self.regex.pattern if self.regex else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RewritePass":
+        """Rebuild a pass from `to_dict` data without recompiling the trie."""
+        rewrite_pass = cls.__new__(cls)
+        rewrite_pass.replacements = dict(data["replacements"])
+        rewrite_pass.regex = (
+            re.compile(data["regex"]) if data["regex"] is not None else None
+        )
+        return rewrite_pass
+
+
+def longest_match_regex(
+    patterns, word_start: set[str], word_end: set[str] = frozenset()
+) -> str:
+    """Build the regex source of the longest pattern at each position.
+
+    At the start of a word every pattern may match, elsewhere only the
+    patterns without the word start flag: the first branch is tried where
+    no word character precedes, the second one everywhere else. The
+    patterns of `word_end` only match where no word character follows.
+    """
+    all_patterns = _trie_regex(_build_trie(patterns, word_end))
+    if not word_start:
+        source = all_patterns
+    else:
+        anywhere = [
+            pattern for pattern in patterns if pattern not in word_start
+        ]
+        source = rf"(?<!\w){all_patterns}"
+        if anywhere:
+            source += "|" + _trie_regex(_build_trie(anywhere, word_end))
+
+    # Rules rewriting a doubled character after a context of fixed length
+    # (the repeat key) are first filtered with a backreference lookahead,
+    # much cheaper than walking the trie at every letter
+    lengths = {len(pattern) for pattern in patterns}
+    if len(lengths) == 1 and all(
+        len(pattern) >= 2 and pattern[-1] == pattern[-2] for pattern in patterns
+    ):
+        context = lengths.pop() - 2
+        source = rf"(?=(?s:.{{{context}}}(.)\1))(?:{source})"
+    return source
+
+
+class RewriteStage:
+    """A list of rules, compiled into as few scans as possible.
+
+    Args:
+        rules: The rules, in application order.
+        ordered: Whether the rules apply one after the other, like chained
+            str.replace calls. Otherwise, they are applied like hotstrings:
+            all at once, the longest matching pattern winning.
+    """
+
+    def __init__(self, rules: list[Rule], ordered: bool = True):
+        if ordered:
+            self.passes = [RewritePass(run) for run in split_into_passes(rules)]
+        else:
+            self.passes = [RewritePass(rules, longest_match=True)]
+
+    @property
+    def patterns(self) -> list[str]:
+        """All the patterns the stage may rewrite."""
+        return [
+            pattern
+            for rewrite_pass in self.passes
+            for pattern in rewrite_pass.replacements
+        ]
+
+    @property
+    def replacements(self) -> dict[str, str]:
+        """The replacement of every pattern the stage may rewrite."""
+        return {
+            pattern: replacement
+            for rewrite_pass in self.passes
+            for pattern, replacement in rewrite_pass.replacements.items()
+        }
+
+    def apply(self, text: str, hits: Counter | None = None) -> str:
+        """Return `text` with all the rules of the stage applied.
+
+        If `hits` is given, it counts the rewrites of each pattern.
+        """
+        for rewrite_pass in self.passes:
+            text = rewrite_pass.apply(text, hits)
+        return text
+
+    def to_dict(self) -> dict:
+        """Return the compiled stage as JSON-serializable data."""
+        return {
+            "passes": [rewrite_pass.to_dict() for rewrite_pass in self.passes]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RewriteStage":
+        """Rebuild a stage from `to_dict` data."""
+        stage = cls.__new__(cls)
+        stage.passes = [RewritePass.from_dict(item) for item in data["passes"]]
+        return stage
@@ -0,0 +1,294 @@
+"""
+Impact of each Ergopti+ hotstring on the same finger bigrams of the corpus.
+
+Typing a trigger instead of its output changes the bigrams inside the
+occurrence and the two bigrams at its edges. For every rule, these changes
+are computed from the occurrences found by the suffix index, as a vector
+of character bigram counts. All the rules are then scored at once: the
+stacked vectors are multiplied by the same finger bigram and same finger
+distance masks of the layout, in a single matrix product.
+"""
+
+import json
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from hotstrings_rules import (
+    DRIVERS_DIRECTORY,
+    HOTSTRINGS_DIRECTORY,
+    OUTPUT_NORMALIZATION,
+    TRIGGER_NORMALIZATION,
+    load_hotstrings,
+)
+from layout_metrics import (
+    LAYOUTS_DIRECTORY,
+    LayoutEvaluator,
+    load_layout,
+    typed_character,
+)
+from ngrams import (
+    ALPHABET,
+    CORPUS_DIRECTORY,
+    OTHER,
+    SIZE,
+    corpus_files,
+    count_files,
+    encode,
+)
+from suffix_index import CorpusIndex, SuffixIndex
+
+sys.path.append(str(DRIVERS_DIRECTORY))
+
+from utilities.mappings_functions import (  # noqa: E402
+    generate_case_variants_for_trigger_replacement,
+)
+
+DEFAULT_LAYOUT = LAYOUTS_DIRECTORY / "ergopti_v2.2.json"
+
+# The hotstring files meant to reduce same finger bigrams and distances
+PLUS_FILES = (
+    "plus/sfb_reduction.toml",
+    "plus/comma.toml",
+    "plus/qu.toml",
+    "plus/e_deadkey.toml",
+)
+
+_WORD_CHARACTER = re.compile(r"\w")
+
+
+def load_plus_layout(path: Path = DEFAULT_LAYOUT) -> dict[str, str]:
+    """Read a layout JSON file with the characters added by Ergopti+.
+
+    Keys with a "Primary+" character (★ on the J key) type it instead of
+    their own character. The straight apostrophe of the hotstrings is typed
+    on the key of the typographic one.
+    """
+    layout = load_layout(path)
+    with open(path, encoding="utf-8") as file:
+        keys = json.load(file)["keys"]
+    for key in keys:
+        plus = key.get("Primary+", "")
+        if len(plus) == 1 and key["key"] in layout:
+            layout[plus] = layout[key["key"]]
+    if "’" in layout:
+        layout.setdefault("'", layout["’"])
+    return layout
+
+
+@dataclass
+class RuleImpact:
+    """Changes caused by typing the trigger of a rule instead of its output.
+
+    Attributes:
+        source: The TOML file of the rule.
+        trigger: The typed trigger.
+        output: The output replaced on the corpus.
+        occurrences: The number of occurrences of the output, all case
+            variants included.
+        sfb: The change of the same finger bigram rate.
+        same_finger_distance: The relative change of the distance
+            travelled by a finger typing two consecutive keys alone, summed
+            over the same finger bigrams. The moves between the keys of
+            different fingers are not counted.
+        keystrokes: The change of the number of keystrokes.
+    """
+
+    source: str
+    trigger: str
+    output: str
+    occurrences: int
+    sfb: float
+    same_finger_distance: float
+    keystrokes: int
+
+
+class RuleImpactEstimator:
+    """Estimate the impact of rules applied one at a time on a corpus.
+
+    Args:
+        evaluator: The evaluator of the corpus n-gram counts, giving the
+            baseline bigrams.
+        layout: The character to key code mapping.
+        index: The suffix index of the same corpus, to find the output
+            occurrences.
+    """
+
+    def __init__(
+        self,
+        evaluator: LayoutEvaluator,
+        layout: dict[str, str],
+        index: SuffixIndex,
+    ):
+        self.index = index
+        characters = evaluator.characters
+        # Characters outside of the evaluator share the last index
+        self.size = len(characters) + 1
+        self.fold = np.full(SIZE, len(characters))
+        self.fold[:OTHER] = [
+            characters.index(typed_character(char)) for char in ALPHABET
+        ]
+
+        keyboard = evaluator.keyboard
+        placement = np.append(evaluator.placement(layout), keyboard.none)
+        first, second = np.divmod(np.arange(self.size**2), self.size)
+        first, second = placement[first], placement[second]
+        hand = np.append(keyboard.hand, -1)
+        finger = np.append(keyboard.finger, -1)
+        row = np.append(keyboard.row, 0)
+        column = np.append(keyboard.column, 0)
+        real = (first != keyboard.none) & (second != keyboard.none)
+        same_finger = (
+            real
+            & (first != second)
+            & (hand[first] == hand[second])
+            & (finger[first] == finger[second])
+        )
+        travel = np.hypot(
+            row[first] - row[second], column[first] - column[second]
+        )
+        # Columns: bigrams on keys, same finger bigrams, distance travelled
+        # by the finger of the same finger bigrams
+        self.masks = np.stack(
+            [real, same_finger, np.where(same_finger, travel, 0.0)], axis=1
+        )
+
+        positions, counts = evaluator.bigrams
+        self.baseline = np.bincount(
+            positions[0] * self.size + positions[1],
+            weights=counts,
+            minlength=self.size**2,
+        )
+
+    def _folded(self, text: str) -> np.ndarray:
+        return self.fold[encode(text)]
+
+    def _neighbours(self, positions: np.ndarray) -> str:
+        """The characters at `positions` of the index, NUL outside."""
+        inside = (positions >= 0) & (positions < len(self.index))
+        codes = np.zeros(len(positions), dtype="<u4")
+        codes[inside] = self.index.text[positions[inside]]
+        return codes.tobytes().decode("utf-32-le")
+
+    def bigram_delta(
+        self, output: str, trigger: str, word_start: bool
+    ) -> tuple[int, np.ndarray]:
+        """Occurrences of `output` and bigram changes of typing `trigger`.
+
+        Returns:
+            The number of occurrences, and the change of the count of
+            each character bigram, flattened.
+        """
+        starts = self.index.positions(output).astype(np.int64)
+        before = self._neighbours(starts - 1)
+        if word_start:
+            keep = [not _WORD_CHARACTER.match(char) for char in before]
+            starts = starts[np.array(keep, dtype=bool)]
+            before = "".join(char for char, kept in zip(before, keep) if kept)
+        after = self._neighbours(starts + len(output))
+        occurrences = len(starts)
+
+        delta = np.zeros(self.size**2)
+        for text, sign in ((trigger, 1), (output, -1)):
+            folded = self._folded(text)
+            inner = folded[:-1] * self.size + folded[1:]
+            delta += (
+                sign * occurrences * np.bincount(inner, minlength=self.size**2)
+            )
+            if occurrences:
+                edges = np.concatenate(
+                    [
+                        self._folded(before) * self.size + folded[0],
+                        folded[-1] * self.size + self._folded(after),
+                    ]
+                )
+                delta += sign * np.bincount(edges, minlength=self.size**2)
+        return occurrences, delta
+
+    def estimate(
+        self, rules: list[tuple[str, str, str, bool]]
+    ) -> list[RuleImpact]:
+        """Impact of each (source, trigger, output, is_word) hotstring.
+
+        The case variants of a hotstring are counted together. Every rule
+        is applied alone to the corpus, whose baseline is shared.
+        """
+        occurrences = np.zeros(len(rules), dtype=np.int64)
+        keystrokes = np.zeros(len(rules), dtype=np.int64)
+        deltas = np.zeros((len(rules), self.size**2))
+        for i, (_, trigger, output, is_word) in enumerate(rules):
+            variants = generate_case_variants_for_trigger_replacement(
+                trigger, output
+            )
+            for variant_trigger, variant_output in variants:
+                pattern = variant_output.translate(OUTPUT_NORMALIZATION)
+                typed = variant_trigger.translate(TRIGGER_NORMALIZATION)
+                count, delta = self.bigram_delta(pattern, typed, is_word)
+                occurrences[i] += count
+                keystrokes[i] += count * (len(typed) - len(pattern))
+                deltas[i] += delta
+
+        total, sfb, sfb_distance = self.baseline @ self.masks
+        new_total, new_sfb, new_sfb_distance = (
+            (self.baseline + deltas) @ self.masks
+        ).T
+        sfb_change = new_sfb / new_total - sfb / total
+        distance_change = new_sfb_distance / sfb_distance - 1
+        return [
+            RuleImpact(
+                source,
+                trigger,
+                output,
+                int(occurrences[i]),
+                float(sfb_change[i]),
+                float(distance_change[i]),
+                int(keystrokes[i]),
+            )
+            for i, (source, trigger, output, _) in enumerate(rules)
+        ]
+
+
+def load_rules(files=PLUS_FILES) -> list[tuple[str, str, str, bool]]:
+    """The (source, trigger, output, is_word) hotstrings of TOML files.
+
+    Hotstrings whose trigger equals their output, which only block
+    another one while typing, are skipped.
+    """
+    return [
+        (name, trigger, output, is_word)
+        for name in files
+        for trigger, output, is_word, _ in load_hotstrings(
+            HOTSTRINGS_DIRECTORY / name
+        )
+        if trigger != output
+    ]
+
+
+def main(corpus="fr", layout_path=DEFAULT_LAYOUT):
+    evaluator = LayoutEvaluator(
+        count_files(corpus_files(CORPUS_DIRECTORY / corpus))
+    )
+    estimator = RuleImpactEstimator(
+        evaluator,
+        load_plus_layout(layout_path),
+        CorpusIndex([corpus]).indexes[corpus],
+    )
+    impacts = estimator.estimate(load_rules())
+
+    print(
+        f"{'Fichier':<24} {'Déclencheur':<12} {'Sortie':<10} "
+        f"{'Occurrences':>11} {'SFB':>9} {'Dist. SFB':>9} {'Frappes':>8}"
+    )
+    for impact in sorted(impacts, key=lambda impact: impact.sfb):
+        print(
+            f"{impact.source:<24} {impact.trigger!r:<12} "
+            f"{impact.output!r:<10} {impact.occurrences:>11} "
+            f"{impact.sfb:>+9.3%} {impact.same_finger_distance:>+9.3%} "
+            f"{impact.keystrokes:>+8}"
+        )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
@@ -0,0 +1,248 @@
+"""
+Dynamic SFB analysis, generating the tables of analyse_dynamique_sfbs.xlsx.
+
+The spreadsheet sums, for each finger of the consonant block, the
+frequencies of the bigrams of the letters it types. Here the same tables
+are computed twice: on the corpus as written (static), and on the corpus
+as typed in Ergopti+ (dynamic), that is once converted by
+conversion_corpus. The repeat key then replaces doubled letters, the ★ key
+replaces whole words, and the dead key substitutions replace accented
+letters, so the bigrams they remove no longer count as SFBs.
+
+The counts of the converted files are cached like the corpus counts, keyed
+by the content of each file and by the hash of the hotstring rules: after a
+rule changes, only the conversion is run again.
+"""
+
+import csv
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from conversion_corpus import (
+    CONVERSION_APOSTROPHE_TYPO,
+    CONVERSION_CIRCONFLEXE_SEPARE,
+    convertir_texte,
+)
+from generate_frequencies import FREQUENCIES_DIRECTORY
+from hotstrings_rules import hotstrings_hash
+from ngrams import (
+    ALPHABET,
+    ALPHABET_VERSION,
+    CORPUS_DIRECTORY,
+    SIZE,
+    NGramCounts,
+    corpus_files,
+    count_files,
+    count_text,
+    load_counts,
+    read_corpus_text,
+    save_counts,
+)
+
+CACHE_DIRECTORY = Path(__file__).resolve().parent / "cache" / "converted"
+REPORT_NAME = "analyse_dynamique_sfbs"
+
+# The letters typed by each finger, from the "Disposition" sheet
+FINGER_LETTERS = {
+    "1er doigt": "DSCFMV",
+    "2e doigt": "LNH",
+    "3e doigt": "PTG",
+    "4e doigt": "’RXQJ",
+}
+# Maximum total SFB frequency of the consonant block
+SFB_THRESHOLD = 0.047
+
+# Characters typed on the key of a letter of the disposition: the ★ key
+# replaces the J key in Ergopti+, the apostrophe is converted to straight
+KEY_ALIASES = {"★": "J", "'": "’"}
+
+
+def key_labels() -> list[str]:
+    """The labels of the bigram table: the 26 letters, then the others."""
+    letters = [chr(code) for code in range(ord("A"), ord("Z") + 1)]
+    others = {
+        letter
+        for finger in FINGER_LETTERS.values()
+        for letter in finger
+        if letter not in letters
+    }
+    return letters + sorted(others)
+
+
+def label_matrix(labels: list[str]) -> np.ndarray:
+    """Matrix of shape (SIZE, len(labels)) folding characters into labels.
+
+    Unaccented letters count in either case, accented letters are typed on
+    other keys and left out, like the characters outside the disposition.
+    """
+    matrix = np.zeros((SIZE, len(labels)), dtype=np.int64)
+    for index, char in enumerate(ALPHABET):
+        label = KEY_ALIASES.get(char, char.upper())
+        if label in labels:
+            matrix[index, labels.index(label)] = 1
+    return matrix
+
+
+def conversion_hash() -> str:
+    """Hash of every rule applied by the conversion of the corpus."""
+    digest = hashlib.sha256(hotstrings_hash().encode())
+    digest.update(repr(CONVERSION_APOSTROPHE_TYPO).encode())
+    digest.update(repr(CONVERSION_CIRCONFLEXE_SEPARE).encode())
+    return digest.hexdigest()
+
+
+def count_converted_files(
+    paths: list[Path], cache_directory: Path = CACHE_DIRECTORY
+) -> NGramCounts:
+    """Counts of the corpus files once converted, cached per file."""
+    rules = conversion_hash()[:16]
+    counts = NGramCounts.empty()
+    for path in paths:
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        cache_path = (
+            cache_directory / f"{digest}_{rules}_v{ALPHABET_VERSION}.npz"
+        )
+        if cache_path.exists():
+            load_counts(cache_path, counts)
+            continue
+        file_counts = count_text(convertir_texte(read_corpus_text(path)))
+        save_counts(file_counts, cache_path)
+        counts += file_counts
+    return counts
+
+
+def sfb_tables(counts: NGramCounts) -> dict:
+    """The tables of the spreadsheet, computed from corpus counts.
+
+    Frequencies are relative to the number of keystrokes on the letter
+    keys (A to Z, and ★ on the J key), as in the LdS exports the
+    spreadsheet was filled with.
+
+    Returns:
+        "bigrammes": the frequency of every label bigram;
+        "doigts": for each finger, the frequency of the bigrams of its
+        letters and their sum; "total": the sum of all fingers.
+    """
+    labels = key_labels()
+    fold = label_matrix(labels)
+    bigrams = fold.T @ counts.bigrams @ fold
+    letters = int(counts.unigrams @ fold[:, :26].sum(axis=1))
+    frequencies = bigrams / max(letters, 1)
+
+    fingers = {}
+    for finger, finger_letters in FINGER_LETTERS.items():
+        indices = [labels.index(letter) for letter in finger_letters]
+        block = frequencies[np.ix_(indices, indices)]
+        fingers[finger] = {
+            "bigrammes": {
+                first + second: float(block[i, j])
+                for i, first in enumerate(finger_letters)
+                for j, second in enumerate(finger_letters)
+            },
+            "somme": float(block.sum()),
+        }
+    return {
+        "lettres": letters,
+        "bigrammes": {
+            first + second: float(frequencies[i, j])
+            for i, first in enumerate(labels)
+            for j, second in enumerate(labels)
+        },
+        "doigts": fingers,
+        "total": sum(finger["somme"] for finger in fingers.values()),
+    }
+
+
+def write_reports(analyses: dict, directory: Path = FREQUENCIES_DIRECTORY):
+    """Write the analyses to a JSON file and one CSV file per table."""
+    path = directory / f"{REPORT_NAME}.json"
+    path.write_text(
+        json.dumps(analyses, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    names = list(analyses)
+
+    def write_csv(table: str, header: list[str], rows) -> None:
+        path = directory / f"{REPORT_NAME} - {table}.csv"
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    first = analyses[names[0]]
+    write_csv(
+        "Bigrammes",
+        ["Lettres", *(f"Fréquence {name}" for name in names)],
+        sorted(
+            (
+                [pair, *(analyses[name]["bigrammes"][pair] for name in names)]
+                for pair in first["bigrammes"]
+            ),
+            key=lambda row: -row[-1],
+        ),
+    )
+    write_csv(
+        "Bigrammes par doigt",
+        ["Doigt", "Lettres", *(f"Fréquence {name}" for name in names)],
+        (
+            [
+                finger,
+                pair,
+                *(
+                    analyses[name]["doigts"][finger]["bigrammes"][pair]
+                    for name in names
+                ),
+            ]
+            for finger, table in first["doigts"].items()
+            for pair in table["bigrammes"]
+        ),
+    )
+    write_csv(
+        "Disposition",
+        ["Doigt", "Lettres", *(f"SFB {name}" for name in names)],
+        [
+            *(
+                [
+                    finger,
+                    FINGER_LETTERS[finger],
+                    *(
+                        analyses[name]["doigts"][finger]["somme"]
+                        for name in names
+                    ),
+                ]
+                for finger in FINGER_LETTERS
+            ),
+            ["Total", "", *(analyses[name]["total"] for name in names)],
+        ],
+    )
+
+
+def main(corpus="fr"):
+    start = time.perf_counter()
+    paths = corpus_files(CORPUS_DIRECTORY / corpus)
+    analyses = {
+        "statique": sfb_tables(count_files(paths)),
+        "dynamique": sfb_tables(count_converted_files(paths)),
+    }
+    write_reports(analyses)
+
+    print(f"{'Doigt':<10} {'Lettres':<8} {'Statique':>9} {'Dynamique':>9}")
+    for finger, letters in FINGER_LETTERS.items():
+        print(
+            f"{finger:<10} {letters:<8} "
+            f"{analyses['statique']['doigts'][finger]['somme']:>9.2%} "
+            f"{analyses['dynamique']['doigts'][finger]['somme']:>9.2%}"
+        )
+    print(
+        f"{'Total':<19} {analyses['statique']['total']:>9.2%} "
+        f"{analyses['dynamique']['total']:>9.2%} "
+        f"(seuil {SFB_THRESHOLD:.1%})"
+    )
+    print(f"Analyse écrite en {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
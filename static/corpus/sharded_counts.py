@@ -0,0 +1,270 @@
+"""
+Map-reduce n-gram counting of large corpus files across processes.
+
+Each file is split into shards of about SHARD_SIZE bytes, cut after a line
+feed, and the shards are counted by a pool of worker processes. Every
+worker owns a slot of a shared memory block, holding unigram, bigram and
+trigram arrays of fixed shape, and adds the counts of its shards into it
+in place. Once all the shards of a file are counted, the parent sums the
+slots: the large arrays never go through pickling, only the small dict of
+the exact character counts does.
+
+A shard is counted after the last two characters preceding it, with
+`count_text(skip=2)`, so the n-grams spanning two shards are counted once
+and the counts are exactly those of the whole file.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+from ngrams import (
+    CACHE_DIRECTORY,
+    CORPUS_DIRECTORY,
+    FALLBACK_ENCODING,
+    SIZE,
+    NGramCounts,
+    cache_key,
+    corpus_files,
+    count_chunks,
+    count_text,
+    is_compressed,
+    load_counts,
+    read_corpus_chunks,
+    save_counts,
+)
+
+# Bytes counted by a worker at a time
+SHARD_SIZE = 16 << 20
+
+# Bytes read before a shard to find its two previous characters, at least
+# two characters in any supported encoding
+PREFIX_SIZE = 16
+
+SLOT_LENGTH = SIZE + SIZE**2 + SIZE**3
+
+
+def line_shards(path: Path, shard_size: int = SHARD_SIZE):
+    """Byte ranges (start, end) of the shards of a file.
+
+    Each shard ends right after a line feed, a single byte in UTF-8 and
+    Latin-1 that no multibyte character contains. A compressed file cannot
+    be split without decompressing it, and is a single shard.
+    """
+    size = path.stat().st_size
+    if is_compressed(path):
+        return [(0, size)]
+
+    shards = []
+    start = 0
+    with open(path, "rb") as file:
+        while size - start > shard_size:
+            end = start + shard_size
+            file.seek(end)
+            while block := file.read(1 << 16):
+                index = block.find(b"\n")
+                if index >= 0:
+                    end += index + 1
+                    break
+                end += len(block)
+            shards.append((start, end))
+            start = end
+    if start < size or not shards:
+        shards.append((start, size))
+    return shards
+
+
+def _normalized(data: bytes, encoding: str, errors: str = "strict") -> str:
+    text = data.decode(encoding, errors)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def count_shard(path: Path, start: int, end: int, encoding: str):
+    """Count the bytes [start, end[ of a corpus file."""
+    if is_compressed(path):
+        return count_chunks(read_corpus_chunks(path, encoding))
+    with open(path, "rb") as file:
+        prefix_start = max(start - PREFIX_SIZE, 0)
+        file.seek(prefix_start)
+        prefix = file.read(start - prefix_start)
+        data = file.read(end - start)
+    # The prefix may start inside a character, which is ignored
+    previous = _normalized(prefix, encoding, "ignore")[-2:]
+    return count_text(previous + _normalized(data, encoding), len(previous))
+
+
+def _slot_arrays(buffer, slot: int) -> tuple[np.ndarray, ...]:
+    """The unigram, bigram and trigram arrays of a slot of `buffer`."""
+    flat = np.ndarray(
+        SLOT_LENGTH,
+        dtype=np.int64,
+        buffer=buffer,
+        offset=slot * SLOT_LENGTH * 8,
+    )
+    return (
+        flat[:SIZE],
+        flat[SIZE : SIZE + SIZE**2].reshape(SIZE, SIZE),
+        flat[SIZE + SIZE**2 :].reshape(SIZE, SIZE, SIZE),
+    )
+
+
+_memory = None
+_arrays = None
+
+
+def _attach(name: str, next_slot, slots: int) -> None:
+    """Initialize a worker: attach the shared block and claim a slot."""
+    global _memory, _arrays
+    with next_slot.get_lock():
+        slot = next_slot.value
+        next_slot.value += 1
+    if slot >= slots:
+        raise RuntimeError("More workers than shared memory slots.")
+    # The parent owns the block and unlinks it, workers do not track it
+    _memory = shared_memory.SharedMemory(name, track=False)
+    _arrays = _slot_arrays(_memory.buf, slot)
+
+
+def _count_into_slot(path: Path, start: int, end: int, encoding: str):
+    """Worker task: add the counts of a shard to the slot of the worker.
+
+    Returns:
+        The exact character counts of the shard.
+    """
+    counts = count_shard(path, start, end, encoding)
+    unigrams, bigrams, trigrams = _arrays
+    unigrams += counts.unigrams
+    bigrams += counts.bigrams
+    trigrams += counts.trigrams
+    return counts.characters
+
+
+class ShardedCounter:
+    """A pool of counting processes and their shared memory slots.
+
+    Args:
+        nb_processes: The number of worker processes, one per core by
+            default.
+        shard_size: The size of the shards, in bytes.
+    """
+
+    def __init__(
+        self, nb_processes: int | None = None, shard_size: int = SHARD_SIZE
+    ):
+        self.nb_processes = nb_processes or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=self.nb_processes * SLOT_LENGTH * 8
+        )
+        self._slots = [
+            _slot_arrays(self._memory.buf, slot)
+            for slot in range(self.nb_processes)
+        ]
+        self._reset()
+        self._executor = ProcessPoolExecutor(
+            self.nb_processes,
+            initializer=_attach,
+            initargs=(
+                self._memory.name,
+                multiprocessing.Value("i", 0),
+                self.nb_processes,
+            ),
+        )
+
+    def __enter__(self) -> "ShardedCounter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._slots = []
+        self._memory.close()
+        self._memory.unlink()
+
+    def _reset(self) -> None:
+        for arrays in self._slots:
+            for array in arrays:
+                array[...] = 0
+
+    def _count(self, path: Path, encoding: str) -> NGramCounts:
+        futures = [
+            self._executor.submit(_count_into_slot, path, start, end, encoding)
+            for start, end in line_shards(path, self.shard_size)
+        ]
+        # Every shard is done before the slots are read or reset
+        wait(futures)
+        counts = NGramCounts.empty()
+        for future in futures:
+            for char, count in future.result().items():
+                counts.characters[char] = counts.characters.get(char, 0) + count
+        for unigrams, bigrams, trigrams in self._slots:
+            counts.unigrams += unigrams
+            counts.bigrams += bigrams
+            counts.trigrams += trigrams
+        return counts
+
+    def count_file(self, path: Path) -> NGramCounts:
+        """Count a corpus file, decoded as UTF-8 or else Latin-1."""
+        try:
+            return self._count(path, "utf-8")
+        except UnicodeDecodeError:
+            self._reset()
+            return self._count(path, FALLBACK_ENCODING)
+        finally:
+            self._reset()
+
+
+def count_files(
+    paths: list[Path],
+    cache_directory: Path | None = CACHE_DIRECTORY,
+    nb_processes: int | None = None,
+    shard_size: int = SHARD_SIZE,
+) -> NGramCounts:
+    """Sum the n-gram counts of corpus files, like `ngrams.count_files`.
+
+    The cached files are read from the cache, the others are counted by a
+    ShardedCounter, started only if needed, and then cached.
+    """
+    total = NGramCounts.empty()
+    counter = None
+    try:
+        for path in paths:
+            cache_path = None
+            if cache_directory is not None:
+                key = cache_key(Path(path).read_bytes())
+                cache_path = Path(cache_directory) / f"{key}.npz"
+                if cache_path.exists():
+                    load_counts(cache_path, total)
+                    continue
+            if counter is None:
+                counter = ShardedCounter(nb_processes, shard_size)
+            counts = counter.count_file(path)
+            if cache_path is not None:
+                save_counts(counts, cache_path)
+            total += counts
+    finally:
+        if counter is not None:
+            counter.close()
+    return total
+
+
+def main(corpus="fr", nb_processes=None):
+    paths = corpus_files(CORPUS_DIRECTORY / corpus)
+    megabytes = sum(path.stat().st_size for path in paths) / 1e6
+    start = time.perf_counter()
+    counts = count_files(paths, cache_directory=None, nb_processes=nb_processes)
+    duration = time.perf_counter() - start
+    print(
+        f"Corpus {corpus} : {counts.total} caractères, {megabytes:.1f} Mo "
+        f"comptés en {duration:.2f} s ({megabytes / duration:.1f} Mo/s)"
+    )
+
+
+if __name__ == "__main__":
+    main(corpus="fr")
@@ -0,0 +1,263 @@
+"""
+Suffix array index of each corpus, for instant substring frequency queries.
+
+The files of a corpus subfolder are normalized like the first conversion
+stage (straight apostrophes), joined with NUL separators and indexed by a
+suffix array and its LCP array. The arrays are cached in cache/suffixes as
+.npy files and memory-mapped, so loading an index is immediate and counting
+the occurrences of a substring is a binary search over the suffixes.
+"""
+
+import bisect
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from hotstrings_rules import OUTPUT_NORMALIZATION
+from ngrams import CORPUS_DIRECTORY, corpus_files, read_corpus_text
+
+CACHE_DIRECTORY = Path(__file__).resolve().parent / "cache" / "suffixes"
+
+# Bump when the normalization or the stored arrays change
+INDEX_VERSION = 1
+
+# Separates the files in the indexed text: no occurrence spans two files
+SEPARATOR = "\0"
+
+
+def corpus_text(paths: list[Path]) -> str:
+    """The normalized text of files, each one followed by SEPARATOR."""
+    return "".join(
+        read_corpus_text(path).translate(OUTPUT_NORMALIZATION) + SEPARATOR
+        for path in paths
+    )
+
+
+def suffix_array(codes: np.ndarray) -> np.ndarray:
+    """Start positions of the suffixes of `codes`, in lexicographic order.
+
+    Prefix doubling: at each round, the suffixes are sorted by their first
+    2k characters from the ranks of their first k characters. Suffixes
+    already alone in their group keep their position and are no longer
+    sorted, so the rounds shrink quickly on natural text.
+    """
+    size = len(codes)
+    suffixes = np.argsort(codes, kind="stable")
+    sorted_codes = codes[suffixes]
+    slots = np.arange(size)
+    starts = np.ones(size, dtype=bool)
+    starts[1:] = sorted_codes[1:] != sorted_codes[:-1]
+
+    # Rank of a suffix: the position of the first suffix of its group
+    ranks = np.empty(size, dtype=np.int64)
+    ranks[suffixes] = np.maximum.accumulate(np.where(starts, slots, 0))
+    ends = np.append(starts[1:], True)
+    unsorted = slots[~(starts & ends)]
+
+    length = 1
+    while len(unsorted):
+        group = suffixes[unsorted]
+        following = group + length
+        second_ranks = np.where(
+            following < size, ranks[np.minimum(following, size - 1)], -1
+        )
+        keys = ranks[group] * (size + 1) + second_ranks + 1
+        order = np.argsort(keys)
+        keys = keys[order]
+        group = group[order]
+        suffixes[unsorted] = group
+
+        starts = np.ones(len(group), dtype=bool)
+        starts[1:] = keys[1:] != keys[:-1]
+        ranks[group] = np.maximum.accumulate(np.where(starts, unsorted, 0))
+        ends = np.append(starts[1:], True)
+        unsorted = unsorted[~(starts & ends)]
+        length *= 2
+    return suffixes.astype(np.int32)
+
+
+def lcp_array(codes: np.ndarray, suffixes: np.ndarray) -> np.ndarray:
+    """Length of the common prefix of each suffix with the previous one.
+
+    All the neighbouring pairs are compared one character further at each
+    step, only the pairs still equal going on to the next one.
+    """
+    size = len(codes)
+    lcp = np.zeros(size, dtype=np.int32)
+    # A character past the end differs from every other one
+    padded = np.append(codes.astype(np.int64), -1)
+    first = suffixes[:-1].astype(np.int64)
+    second = suffixes[1:].astype(np.int64)
+    pairs = np.arange(1, size)
+    length = 0
+    while len(pairs):
+        first_chars = padded[np.minimum(first + length, size)]
+        equal = first_chars == padded[np.minimum(second + length, size)]
+        equal &= first_chars >= 0
+        first, second, pairs = first[equal], second[equal], pairs[equal]
+        length += 1
+        lcp[pairs] = length
+    return lcp
+
+
+def files_hash(paths: list[Path], version: int = INDEX_VERSION) -> str:
+    """SHA-256 of a format version and of the names and content of files."""
+    digest = hashlib.sha256(f"{version}\n".encode())
+    for path in paths:
+        content = path.read_bytes()
+        digest.update(f"{path.name}\n{len(content)}\n".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class SuffixIndex:
+    """Suffix and LCP arrays of a text, memory-mapped from a directory.
+
+    Attributes:
+        text: The code points of the indexed text.
+        suffixes: The start positions of its suffixes, sorted.
+        lcp: The common prefix length of each suffix with the previous one.
+    """
+
+    def __init__(self, directory: Path):
+        self.text = np.load(directory / "text.npy", mmap_mode="r")
+        self.suffixes = np.load(directory / "suffixes.npy", mmap_mode="r")
+        self.lcp = np.load(directory / "lcp.npy", mmap_mode="r")
+
+    @staticmethod
+    def build(text: str, directory: Path) -> None:
+        """Index `text` into `directory`."""
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        suffixes = suffix_array(codes)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "text.npy", codes)
+        np.save(directory / "suffixes.npy", suffixes)
+        np.save(directory / "lcp.npy", lcp_array(codes, suffixes))
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def substring(self, position: int, length: int) -> str:
+        codes = self.text[position : position + length]
+        return codes.tobytes().decode("utf-32-le")
+
+    def suffix_range(self, pattern: str) -> tuple[int, int]:
+        """Range of the sorted suffixes starting with `pattern`."""
+        pattern = pattern.translate(OUTPUT_NORMALIZATION)
+        if not pattern:
+            return 0, len(self)
+
+        def prefix(position):
+            return self.substring(position, len(pattern))
+
+        low = bisect.bisect_left(self.suffixes, pattern, key=prefix)
+        high = bisect.bisect_right(self.suffixes, pattern, lo=low, key=prefix)
+        return low, high
+
+    def count(self, pattern: str) -> int:
+        """Number of occurrences of `pattern`, overlapping ones included."""
+        low, high = self.suffix_range(pattern)
+        return high - low
+
+    def positions(self, pattern: str) -> np.ndarray:
+        """Start positions of the occurrences of `pattern`, sorted."""
+        low, high = self.suffix_range(pattern)
+        return np.sort(self.suffixes[low:high])
+
+    def most_common(self, length: int, limit: int = 20):
+        """The most frequent substrings of `length` characters.
+
+        Consecutive suffixes sharing their first `length` characters form
+        runs delimited by the LCP array, one run per substring.
+
+        Returns:
+            (substring, count) pairs, by decreasing count. Substrings
+            spanning two files are left out.
+        """
+        runs = np.flatnonzero(np.asarray(self.lcp) < length)
+        counts = np.diff(np.append(runs, len(self)))
+        common = []
+        for run in np.argsort(-counts, kind="stable"):
+            substring = self.substring(int(self.suffixes[runs[run]]), length)
+            if len(substring) == length and SEPARATOR not in substring:
+                common.append((substring, int(counts[run])))
+                if len(common) == limit:
+                    break
+        return common
+
+
+class CorpusIndex:
+    """One suffix index per corpus subfolder, built on first use.
+
+    An index is rebuilt when the files of its corpus change.
+
+    Args:
+        corpora: The names of the corpus subfolders, all of them by
+            default.
+    """
+
+    def __init__(
+        self,
+        corpora: list[str] | None = None,
+        directory: Path = CORPUS_DIRECTORY,
+        cache_directory: Path = CACHE_DIRECTORY,
+    ):
+        if corpora is None:
+            corpora = sorted(
+                path.name for path in directory.iterdir() if path.is_dir()
+            )
+        self.indexes = {
+            corpus: self._load(directory / corpus, cache_directory / corpus)
+            for corpus in corpora
+        }
+
+    @staticmethod
+    def _load(corpus_directory: Path, index_directory: Path) -> SuffixIndex:
+        paths = corpus_files(corpus_directory)
+        digest = files_hash(paths)
+        info_path = index_directory / "index.json"
+        if info_path.exists():
+            info = json.loads(info_path.read_text(encoding="utf-8"))
+            if info.get("hash") == digest:
+                return SuffixIndex(index_directory)
+
+        # The info file is written last, as the mark of a complete index
+        info_path.unlink(missing_ok=True)
+        SuffixIndex.build(corpus_text(paths), index_directory)
+        info = {
+            "hash": digest,
+            "files": [path.name for path in paths],
+        }
+        info_path.write_text(json.dumps(info, ensure_ascii=False), "utf-8")
+        return SuffixIndex(index_directory)
+
+    def count(self, pattern: str) -> dict[str, int]:
+        """Number of occurrences of `pattern` in each corpus."""
+        return {
+            corpus: index.count(pattern)
+            for corpus, index in self.indexes.items()
+        }
+
+
+def main(candidates=("sx", "sk", "cx", "ck", "hc", "wh", "ction", "qu'")):
+    start = time.perf_counter()
+    index = CorpusIndex()
+    print(f"Index chargés en {time.perf_counter() - start:.2f} s")
+
+    corpora = list(index.indexes)
+    print(f"{'Motif':<10}" + "".join(f"{corpus:>10}" for corpus in corpora))
+    start = time.perf_counter()
+    for candidate in candidates:
+        counts = index.count(candidate)
+        print(
+            f"{candidate!r:<10}"
+            + "".join(f"{counts[corpus]:>10}" for corpus in corpora)
+        )
+    duration = (time.perf_counter() - start) / len(candidates)
+    print(f"Requête sur tous les corpus : {duration * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
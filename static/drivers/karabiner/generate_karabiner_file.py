@@ -11,14 +11,13 @@ key positions.
 """
 
 import json
-import re
 import sys
 from collections import defaultdict
 from pathlib import Path
 from typing import Dict, List, Optional, Union
 
 sys.path.append(str(Path(__file__).parent.parent.resolve()))
-from utilities.keylayout_extraction import extract_keymap_body
+from utilities.keylayout_extraction import SymbolTable
 from utilities.mappings_functions import (
     unescape_xml_characters,
 )
@@ -71,21 +70,15 @@ def get_keycode_map(keylayout_path: str) -> KeycodeMap:
     """
     keycode_map: KeycodeMap = defaultdict(list)
     with open(keylayout_path, encoding="utf-8") as f:
-        content = f.read()
-        for layer_index in [0, 2, 5, 6]:
-            keymap_content = extract_keymap_body(content, layer_index)
-            for match in re.finditer(
-                r'<key code="(\d+)" (action|output)="([^"]+)"',
-                keymap_content,
-            ):
-                code = int(match.group(1))
-                if code > 50:
-                    continue
-                output = match.group(3)
-                if output:
-                    keycode_map[output].append(
-                        {"keycode": code, "layer": layer_index}
-                    )
+        symbol_table = SymbolTable(f.read())
+    for layer_index in [0, 2, 5, 6]:
+        if layer_index not in symbol_table.keys:
+            raise ValueError(f'<keyMap index="{layer_index}"> block not found.')
+        for code, key in enumerate(symbol_table.keys[layer_index][:51]):
+            if key is not None:
+                keycode_map[key[1]].append(
+                    {"keycode": code, "layer": layer_index}
+                )
 
     # Manual multi-key entry for '➜'
     keycode_map["➜"] = [
@@ -3,7 +3,7 @@ import re
 import sys
 from logging import getLogger
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Dict, List, Tuple
 
 import yaml
 
@@ -14,11 +14,7 @@ sys.path.insert(0, str(script_dir.parent))
 
 from levels import LEVELS
 from unused_symbols import UNUSED_SYMBOLS
-from utilities.keylayout_extraction import (
-    extract_actions_body,
-    extract_keymap_body,
-    get_symbol,
-)
+from utilities.keylayout_extraction import SymbolTable
 
 data_dir: Path = Path(__file__).parent / "data"
 LINUX_TO_MACOS_KEYCODES: list[Tuple[str, str]] = json.loads(
@@ -56,15 +52,13 @@ def generate_xkb(
     }
     available_symbols: set[str] = set(UNUSED_SYMBOLS)
 
-    keymaps: List[Any] = extract_keymaps(keylayout_data)
-    actions_body = extract_actions_body(keylayout_data)
+    keymaps: List[List[str]] = extract_keymaps(keylayout_data)
 
     for xkb_key, macos_code in LINUX_TO_MACOS_KEYCODES:
         symbols, comment_symbols = generate_symbols_and_comments(
             xkb_key,
             macos_code,
             keymaps,
-            actions_body,
             mapped_symbols,
             available_symbols,
         )
@@ -78,9 +72,12 @@ def generate_xkb(
     return xkb_template, mapped_symbols
 
 
-def extract_keymaps(keylayout_data: str) -> List[Any]:
+def extract_keymaps(keylayout_data: str) -> List[List[str]]:
     """Extracts keymaps from the keylayout XML for each level.
 
+    The symbols of the keylayout are resolved once, so that each keymap is
+    a list of symbols indexed by macOS code.
+
     Args:
         keylayout_data: The keylayout XML data.
 
@@ -88,8 +85,9 @@ def extract_keymaps(keylayout_data: str) -> List[Any]:
         List of keymaps for each level.
     """
     logger.info("Extracting keymaps…")
+    symbol_table = SymbolTable(keylayout_data)
     keymaps = [
-        extract_keymap_body(keylayout_data, i)
+        symbol_table.key_map(i)
         for i in [
             LEVELS["Base"],
             LEVELS["CapsLock"],
@@ -105,9 +103,8 @@ def extract_keymaps(keylayout_data: str) -> List[Any]:
 
 def generate_symbols_and_comments(
     xkb_key: str,
-    macos_code: str,
-    keymaps: List[Any],
-    actions_body: str,
+    macos_code: int,
+    keymaps: List[List[str]],
     mapped_symbols: Dict[str, str],
     available_symbols: set[str],
 ) -> Tuple[List[str], List[str]]:
@@ -116,7 +113,7 @@ def generate_symbols_and_comments(
     Args:
         xkb_key: XKB key name.
         macos_code: Associated macOS code.
-        keymaps: List of keymaps for each level.
+        keymaps: List of keymaps for each level, as symbols by macOS code.
 
     Returns:
         Tuple (list of symbols, list of comments).
@@ -124,8 +121,8 @@ def generate_symbols_and_comments(
     logger.info("Generating for key %s", xkb_key)
     symbols: List[str] = []
     comment_symbols: List[str] = []
-    for layer, keymap_body in enumerate(keymaps):
-        symbol = get_symbol(keymap_body, macos_code, actions_body)
+    for layer, keymap in enumerate(keymaps):
+        symbol = keymap[macos_code] if macos_code < len(keymap) else ""
         if layer != 0 and macos_code == 8 and symbol == "★":
             symbol = "j"
         linux_name = get_linux_name_from_output(
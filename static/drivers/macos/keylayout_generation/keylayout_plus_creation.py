@@ -3,15 +3,11 @@ Keylayout Plus generation utilities for Ergopti:
 create a variant with extra dead key features and symbol modifications.
 """
 
-import re
-
 from data.lists import EXTRA_KEYS
 from tests.run_all_tests import validate_keylayout
 from utilities.keyboard_id import set_unique_keyboard_id
 from utilities.keylayout_extraction import extract_version
-from utilities.keylayout_modification import (
-    modify_name_from_file,
-)
+from utilities.keylayout_model import KeyLayout
 from utilities.keylayout_sorting import sort_keylayout
 from utilities.logger import logger
 from utilities.output_action_modification import (
@@ -29,17 +25,21 @@ def create_keylayout_plus(content: str, variant_number: int):
     logger.info("%s🔧 Starting keylayout plus creation…", LOGS_INDENTATION)
 
     version = extract_version(content)
-    content = modify_name_from_file(content, f"Ergopti+ {version}")
+    # The modifications share the parsed keylayout and its action index
+    layout = KeyLayout.parse(content)
+    layout.keyboard["name"] = f"Ergopti+ {version}"
 
     logger.info(
         "%s➕ Modifying AltGr and ShiftAltGr symbols for Ergopti+…",
         LOGS_INDENTATION,
     )
-    content = ergopti_plus_magic_modifications(content)
-    content = ergopti_plus_altgr_modifications(content)
-    content = ergopti_plus_shiftaltgr_modifications(content)
+    layout = ergopti_plus_magic_modifications(layout)
+    layout = ergopti_plus_altgr_modifications(layout)
+    layout = ergopti_plus_shiftaltgr_modifications(layout)
 
-    content = replace_action_to_output_extra_keys(content, EXTRA_KEYS)
+    content = replace_action_to_output_extra_keys(
+        layout.to_string(), EXTRA_KEYS
+    )
     content = sort_keylayout(content)
     content = set_unique_keyboard_id(content, variant_number)
 
@@ -49,7 +49,7 @@ def create_keylayout_plus(content: str, variant_number: int):
     return content
 
 
-def ergopti_plus_magic_modifications(body: str) -> str:
+def ergopti_plus_magic_modifications(layout: KeyLayout) -> KeyLayout:
     """
     - Replace <when state="none" ...> in <action id="j"> by output="★"
     - In <keyMap index="0">, set <key code="30" output="j"/>
@@ -61,47 +61,21 @@ def ergopti_plus_magic_modifications(body: str) -> str:
     )
 
     # Ensure <action id="j"> block exists
-    body = ensure_action_block_exists(body, "j")
-
-    # Replace <when state="none" ...> in <action id="j"> by output="★"
-    def repl(match):
-        header, block, footer = match.groups()
-        block = re.sub(
-            r'<when state="none"[^>]*>',
-            '<when state="none" output="★"/>',
-            block,
-        )
-        return f"{header}{block}{footer}"
-
-    pattern = r'(<action id="j">)(.*?)(</action>)'
-    body = re.sub(pattern, repl, body, flags=re.DOTALL)
+    layout = ensure_action_block_exists(layout, "j")
+    layout.set_action_output("j", "★")
 
     # Couche 0 : output="j"
-    def repl0(match):
-        header, body0, footer = match.groups()
-        body0 = re.sub(r'\n\t\t\t<key[^>]*code="30"[^>]*/?>', "", body0)
-        body0 = body0.rstrip() + '\n\t\t\t<key code="30" output="j"/>'
-        return f"{header}{body0}{footer}"
-
-    body = re.sub(
-        r'(<keyMap index="0">)(.*?)(</keyMap>)', repl0, body, flags=re.DOTALL
-    )
+    for key_map in layout.key_maps(0):
+        key_map.set_key(30, "output", "j")
 
     # Couche 6 : action="¨"
-    def repl6(match):
-        header, body6, footer = match.groups()
-        body6 = re.sub(r'\n\t\t\t<key[^>]*code="30"[^>]*/?>', "", body6)
-        body6 = body6.rstrip() + '\n\t\t\t<key code="30" action="¨"/>'
-        return f"{header}{body6}{footer}"
-
-    body = re.sub(
-        r'(<keyMap index="6">)(.*?)(</keyMap>)', repl6, body, flags=re.DOTALL
-    )
+    for key_map in layout.key_maps(6):
+        key_map.set_key(30, "action", "¨")
 
-    return body
+    return layout
 
 
-def ergopti_plus_altgr_modifications(body: str) -> str:
+def ergopti_plus_altgr_modifications(layout: KeyLayout) -> KeyLayout:
     """
     In <keyMap index="5">:
       - If a <key ...> has output="ç" or action="ç", replace its output/action attributes
@@ -112,80 +86,45 @@ def ergopti_plus_altgr_modifications(body: str) -> str:
         with a single output="où".
       - Do NOT touch other <key> elements.
     After the keyMap modification, ensure <action id="!"> and <action id="%"> exist
-    (inserted before the first </actions> if missing).
+    (added at the end of the actions if missing).
     """
     logger.info(
         "%sModifying AltGr symbols in <keyMap index=5>…",
         LOGS_INDENTATION + "\t",
     )
 
-    def replace_in_keymap(match):
-        header, body, footer = match.groups()
-
-        def repl_key(key_match):
-            key_tag = key_match.group(0)
+    replacements = {
+        "ç": ("action", "!"),
+        "œ": ("action", "%"),
+        "ù": ("output", "où"),
+    }
+    for key_map in layout.key_maps(5):
+        for key in key_map.keys.values():
+            if key.value in replacements:
+                key.kind, key.value = replacements[key.value]
 
-            if re.search(r'(?:\boutput|\baction)="ç"', key_tag):
-                new_tag = re.sub(r'\s+(?:output|action)="[^"]*"', "", key_tag)
-                return (
-                    new_tag[:-2].rstrip() + ' action="!"/>'
-                    if new_tag.endswith("/>")
-                    else new_tag[:-1].rstrip() + ' action="!">'
-                )
+    layout = ensure_action_block_exists(layout, "!")
+    layout = ensure_action_block_exists(layout, "%")
 
-            if re.search(r'(?:\boutput|\baction)="œ"', key_tag):
-                new_tag = re.sub(r'\s+(?:output|action)="[^"]*"', "", key_tag)
-                return (
-                    new_tag[:-2].rstrip() + ' action="%"/>'
-                    if new_tag.endswith("/>")
-                    else new_tag[:-1].rstrip() + ' action="%">'
-                )
+    return layout
 
-            if re.search(r'(?:\boutput|\baction)="ù"', key_tag):
-                new_tag = re.sub(r'\s+(?:output|action)="[^"]*"', "", key_tag)
-                return (
-                    new_tag[:-2].rstrip() + ' output="où"/>'
-                    if new_tag.endswith("/>")
-                    else new_tag[:-1].rstrip() + ' output="où">'
-                )
 
-            return key_tag
-
-        body_fixed = re.sub(r"<key\b[^>]*\/?>", repl_key, body)
-        return f"{header}{body_fixed}{footer}"
-
-    pattern = r'(<keyMap index="5">)(.*?)(</keyMap>)'
-    fixed = re.sub(pattern, replace_in_keymap, body, flags=re.DOTALL)
-
-    fixed = ensure_action_block_exists(fixed, "!")
-    fixed = ensure_action_block_exists(fixed, "%")
-
-    return fixed
-
-
-def ergopti_plus_shiftaltgr_modifications(body):
+def ergopti_plus_shiftaltgr_modifications(layout: KeyLayout) -> KeyLayout:
     logger.info(
         "%sModifying Shift+AltGr symbols in <keyMap index=6,7>…",
         LOGS_INDENTATION + "\t",
     )
 
     # This code replaces specific outputs in keymap index 6 = Shift + AltGr
-    def replace_in_keymap(match):
-        header, body, footer = match.groups()
-        # output="Œ" ou action="Œ" → output=" %"
-        body = re.sub(r'(<key[^>]*)(output|action)="Œ"', r'\1output=" %"', body)
-        # output="Ç" ou action="Ç" → output=" !"
-        body = re.sub(r'(<key[^>]*)(output|action)="Ç"', r'\1output=" !"', body)
-        # output="Ù" ou action="Ù" → output="Où"
-        body = re.sub(r'(<key[^>]*)(output|action)="Ù"', r'\1output="Où"', body)
-        return f"{header}{body}{footer}"
-
+    replacements = {
+        "Œ": " %",  # output="Œ" ou action="Œ" → output=" %"
+        "Ç": " !",  # output="Ç" ou action="Ç" → output=" !"
+        "Ù": "Où",  # output="Ù" ou action="Ù" → output="Où"
+    }
     for idx in (6, 7):
-        body = re.sub(
-            rf'(<keyMap index="{idx}">)(.*?)(</keyMap>)',
-            replace_in_keymap,
-            body,
-            flags=re.DOTALL,
-        )
-
-    return body
+        for key_map in layout.key_maps(idx):
+            for key in key_map.keys.values():
+                if key.value in replacements:
+                    key.kind, key.value = "output", replacements[key.value]
+
+    return layout
@@ -0,0 +1,238 @@
+"""
+Index of a keylayout document, shared by the validation checks.
+
+The document is tokenized once into its tags, with their attributes, quotes
+and line numbers, and the blocks the checks look at are gathered in the same
+pass: the keyMaps of each keyMapSet with their keys, the actions of the
+<actions> block with their <when> elements, and the <when> elements of the
+<terminators> block.
+
+Unlike KeyLayout.parse, the tokenization accepts invalid documents, such as
+duplicate codes or keys without a code, so that the checks can report them.
+The elements that never hold others, like <key> and <when>, are leaves even
+when they are not self-closed: an unclosed <key> cannot swallow the keys
+following it.
+"""
+
+import re
+from collections import Counter
+
+_TOKEN = re.compile(
+    r"<!--.*?-->"
+    r"|<!\w[^>]*>"
+    r"|<\?(\w+)((?:[^>\"']|\"[^\"]*\"|'[^']*')*?)\?>"
+    r"|<(/?)(\w+)((?:[^>\"']|\"[^\"]*\"|'[^']*')*?)(/?)>",
+    flags=re.DOTALL,
+)
+_ATTRIBUTE = re.compile(r"(\w+)\s*=\s*([\"'])(.*?)\2", flags=re.DOTALL)
+
+# Elements without children, always written self-closed
+LEAF_ELEMENTS = frozenset({"key", "when", "layout", "modifier"})
+
+
+class Tag:
+    """A tag of the document, as written.
+
+    Attributes:
+        name: The tag name, the target of an XML declaration.
+        kind: "open", "close", "empty" (self-closing) or "prolog".
+        attributes: The value of each attribute, the first one if repeated.
+        names: The attribute names, in their order in the tag.
+        quotes: The quote of each attribute value, in the same order.
+        text: The tag as written.
+        line: The line number of the tag, starting at 1.
+        start: The offset of the tag in the document.
+    """
+
+    __slots__ = (
+        "name",
+        "kind",
+        "attributes",
+        "names",
+        "quotes",
+        "text",
+        "line",
+        "start",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        attributes_text: str,
+        text: str,
+        line: int,
+        start: int,
+    ):
+        attributes = _ATTRIBUTE.findall(attributes_text)
+        self.name = name
+        self.kind = kind
+        # Reversed, so that the first value of a repeated attribute wins
+        self.attributes = {
+            attribute: value for attribute, _, value in reversed(attributes)
+        }
+        self.names = [attribute for attribute, _, _ in attributes]
+        self.quotes = [quote for _, quote, _ in attributes]
+        self.text = text
+        self.line = line
+        self.start = start
+
+
+class Block:
+    """An element, with the elements directly inside it.
+
+    Attributes:
+        tag: The opening or self-closing tag of the element.
+        children: The elements directly inside it, in document order.
+        end: The offset of the end of the element, None while unclosed.
+    """
+
+    __slots__ = ("tag", "children", "end")
+
+    def __init__(self, tag: Tag):
+        self.tag = tag
+        self.children = []
+        self.end = None
+
+    @property
+    def name(self) -> str:
+        return self.tag.name
+
+    def get(self, attribute: str) -> str | None:
+        """The value of an attribute, None if missing."""
+        return self.tag.attributes.get(attribute)
+
+    def children_named(self, name: str) -> list["Block"]:
+        return [child for child in self.children if child.name == name]
+
+    def descendants_named(self, name: str) -> list["Block"]:
+        """The elements of a name at any depth inside it, in document
+        order."""
+        found = []
+        for child in self.children:
+            if child.name == name:
+                found.append(child)
+            found += child.descendants_named(name)
+        return found
+
+    @property
+    def label(self) -> str:
+        """The index of a keyMap, as displayed by the checks."""
+        index = self.get("index")
+        return f'index="{index}"' if index is not None else "<unknown>"
+
+
+class KeylayoutIndex:
+    """A keylayout document, tokenized once.
+
+    Attributes:
+        body: The document.
+        lines: The lines of the document.
+        tags: Every tag, in document order.
+        counts: The number of elements of each tag name.
+        keyboard: The first <keyboard> element, None if missing.
+        key_map_sets: The <keyMapSet> elements.
+        key_maps: Every <keyMap> element, with its keys as children.
+        actions: The actions of the first <actions> block, with their
+            <when> elements as children, None without an <actions> block.
+        terminators: The first <terminators> element, with its <when>
+            elements as children, None if missing.
+        unclosed_leaves: The tags of the leaf elements written as opening
+            tags instead of self-closed ones.
+        unclosed_elements: The tags of the elements without a closing tag
+            of their own: closed by the closing tag of an element holding
+            them, or still open at the end of the document.
+    """
+
+    def __init__(self, body: str):
+        self.body = body
+        self.lines = body.splitlines()
+        self.tags = []
+        self.counts = Counter()
+        self.keyboard = None
+        self.key_map_sets = []
+        self.key_maps = []
+        self.actions = None
+        self.terminators = None
+        self.unclosed_leaves = []
+        self.unclosed_elements = []
+
+        actions_block = None
+        stack = []  # Open elements, innermost last
+        line = 1
+        position = 0
+        for match in _TOKEN.finditer(body):
+            if match.group(1):
+                name, kind, attributes = (
+                    match.group(1),
+                    "prolog",
+                    match.group(2),
+                )
+            elif match.group(4):
+                name, attributes = match.group(4), match.group(5)
+                if match.group(3):
+                    kind = "close"
+                elif match.group(6):
+                    kind = "empty"
+                else:
+                    kind = "open"
+            else:
+                continue  # Comment or doctype
+            line += body.count("\n", position, match.start())
+            position = match.start()
+            tag = Tag(name, kind, attributes, match.group(0), line, position)
+            self.tags.append(tag)
+
+            if kind == "prolog":
+                continue
+            if kind == "close":
+                # Close the innermost element of this name, and those it holds
+                for depth in range(len(stack) - 1, -1, -1):
+                    if stack[depth].name == name:
+                        for block in stack[depth:]:
+                            block.end = match.end()
+                        self.unclosed_elements += [
+                            block.tag for block in stack[depth + 1 :]
+                        ]
+                        del stack[depth:]
+                        break
+                continue
+
+            self.counts[name] += 1
+            block = Block(tag)
+            parent = stack[-1] if stack else None
+            if parent is not None:
+                parent.children.append(block)
+            if name == "keyboard" and self.keyboard is None:
+                self.keyboard = block
+            elif name == "keyMapSet":
+                self.key_map_sets.append(block)
+            elif name == "keyMap":
+                self.key_maps.append(block)
+            elif name == "actions" and actions_block is None:
+                actions_block = block
+                self.actions = []
+            elif (
+                name == "action"
+                and actions_block is not None
+                and parent is actions_block
+            ):
+                self.actions.append(block)
+            elif name == "terminators" and self.terminators is None:
+                self.terminators = block
+            if kind == "open" and name in LEAF_ELEMENTS:
+                self.unclosed_leaves.append(tag)
+            if kind == "empty" or name in LEAF_ELEMENTS:
+                block.end = match.end()
+            else:
+                stack.append(block)
+        self.unclosed_elements += [block.tag for block in stack]
+
+    @classmethod
+    def of(cls, body: "str | KeylayoutIndex") -> "KeylayoutIndex":
+        """The index of a document, itself if it is already indexed."""
+        return body if isinstance(body, cls) else cls(body)
+
+    def text(self, block: Block) -> str:
+        """An element as written, up to its closing tag."""
+        return self.body[block.tag.start : block.end]
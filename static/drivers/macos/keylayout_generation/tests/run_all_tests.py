@@ -1,7 +1,10 @@
 """Tests for validating a keylayout."""
 
+import time
+
 from utilities.logger import logger
 
+from .keylayout_index import KeylayoutIndex
 from .tests_cosmetic import (
     check_ascending_actions,
     check_ascending_keymaps,
@@ -31,10 +34,12 @@ from .tests_presence_uniqueness import (
 )
 from .tests_structure_syntax import (
     check_consistent_attribute_quotes,
+    check_elements_closed,
     check_forbidden_empty_attribute_values,
     check_forbidden_tags_or_attributes,
     check_keyboard_element_children,
     check_keyboard_id_format,
+    check_leaf_elements_self_closed,
     check_max_min_code_state_values,
     check_required_blocks_presence,
     check_valid_xml_structure,
@@ -43,62 +48,82 @@ from .tests_structure_syntax import (
 
 LOGS_INDENTATION = "\t"
 
+# The checks of each group, in their order of execution. They only read the
+# index of the document, so that they can run in any order.
+CHECKS = {
+    "XML structure & syntax checks": (
+        check_valid_xml_structure,
+        check_leaf_elements_self_closed,
+        check_elements_closed,
+        check_keyboard_element_children,
+        check_required_blocks_presence,
+        check_forbidden_tags_or_attributes,
+        check_forbidden_empty_attribute_values,
+        check_keyboard_id_format,
+        check_consistent_attribute_quotes,
+        check_xml_attribute_errors,
+        check_max_min_code_state_values,
+    ),
+    "Key & Action presence/uniqueness checks": (
+        check_each_key_has_a_code,
+        check_each_action_has_id,
+        check_unique_keymap_indices,
+        check_unique_codes_in_keymaps,
+        check_unique_action_ids,
+        check_each_key_has_either_output_or_action,
+    ),
+    "Action & KeyMap cross-references": (
+        check_each_action_in_keymaps_defined_in_actions,
+        check_each_action_in_keymaps_is_used,
+    ),
+    "Action/When/Terminator logic checks": (
+        check_each_action_has_when_state_none,
+        check_each_action_when_states_unique,
+        check_terminators_when_states_unique,
+        check_when_states_defined_in_terminators,
+        check_each_when_has_output_or_next,
+    ),
+    "Cosmetic & ordering checks": (
+        check_indentation_consistency,
+        check_no_empty_lines,
+        check_ascending_keymaps,
+        check_ascending_keys_in_keymaps,
+        check_ascending_actions,
+        check_attribute_order,
+    ),
+}
+
 
-def validate_keylayout(content: str) -> None:
+def validate_keylayout(content: str) -> dict[str, float]:
     """
     Run all validation checks on the provided keylayout content.
+    The content is tokenized once, and every check runs on this index.
     Raises ValueError if any check fails.
+
+    Returns the duration of the indexing and of each check, in seconds.
     """
     logger.launch("%s🔎 Validating keylayout…", LOGS_INDENTATION)
 
-    logger.info(
-        "%s=== XML structure & syntax checks ===", LOGS_INDENTATION + "     "
-    )
-    check_valid_xml_structure(content)
-    check_keyboard_element_children(content)
-    check_required_blocks_presence(content)
-    check_forbidden_tags_or_attributes(content)
-    check_forbidden_empty_attribute_values(content)
-    check_keyboard_id_format(content)
-    check_consistent_attribute_quotes(content)
-    check_xml_attribute_errors(content)
-    check_max_min_code_state_values(content)
-
-    logger.info(
-        "%s=== Key & Action presence/uniqueness checks ===",
-        LOGS_INDENTATION + "     ",
-    )
-    check_each_key_has_a_code(content)
-    check_each_action_has_id(content)
-    check_unique_keymap_indices(content)
-    check_unique_codes_in_keymaps(content)
-    check_unique_action_ids(content)
-    check_each_key_has_either_output_or_action(content)
+    start = time.perf_counter()
+    index = KeylayoutIndex(content)
+    timings = {"index": time.perf_counter() - start}
 
-    logger.info(
-        "%s=== Action & KeyMap cross-references ===", LOGS_INDENTATION + "     "
-    )
-    check_each_action_in_keymaps_defined_in_actions(content)
-    check_each_action_in_keymaps_is_used(content)
+    for group, checks in CHECKS.items():
+        logger.info("%s=== %s ===", LOGS_INDENTATION + "     ", group)
+        for check in checks:
+            check_start = time.perf_counter()
+            check(index)
+            timings[check.__name__] = time.perf_counter() - check_start
 
-    logger.info(
-        "%s=== Action/When/Terminator logic checks ===",
-        LOGS_INDENTATION + "     ",
+    for name, duration in sorted(
+        timings.items(), key=lambda item: item[1], reverse=True
+    ):
+        logger.debug(
+            "%s%s: %.1f ms", LOGS_INDENTATION + "\t", name, duration * 1000
+        )
+    logger.success(
+        "%sKeylayout validation passed in %.1f ms.",
+        LOGS_INDENTATION,
+        (time.perf_counter() - start) * 1000,
     )
-    check_each_action_has_when_state_none(content)
-    check_each_action_when_states_unique(content)
-    check_terminators_when_states_unique(content)
-    check_when_states_defined_in_terminators(content)
-    check_each_when_has_output_or_next(content)
-
-    logger.info(
-        "%s=== Cosmetic & ordering checks ===", LOGS_INDENTATION + "     "
-    )
-    check_indentation_consistency(content)
-    check_no_empty_lines(content)
-    check_ascending_keymaps(content)
-    check_ascending_keys_in_keymaps(content)
-    check_ascending_actions(content)
-    check_attribute_order(content)
-
-    logger.success("%sKeylayout validation passed.", LOGS_INDENTATION)
+    return timings
@@ -5,10 +5,12 @@ import unicodedata
 
 from utilities.logger import logger
 
+from .keylayout_index import KeylayoutIndex
+
 LOGS_INDENTATION = "\t\t"
 
 
-def check_indentation_consistency(body: str) -> None:
+def check_indentation_consistency(body: str | KeylayoutIndex) -> None:
     """
     Check that all lines in the body have consistent indentation.
     Self-closing tags (<tag ... />) are considered children but not pushed to the stack.
@@ -22,7 +24,7 @@ def check_indentation_consistency(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    lines = body.splitlines()
+    lines = KeylayoutIndex.of(body).lines
     stack = []  # Stack to track (tag, indentation)
     inconsistencies = []
 
@@ -102,7 +104,7 @@ def check_indentation_consistency(body: str) -> None:
         )
 
 
-def check_no_empty_lines(body: str) -> None:
+def check_no_empty_lines(body: str | KeylayoutIndex) -> None:
     """
     Ensure there are no empty lines in the body, ignoring leading and trailing empty lines.
     Raises ValueError if empty lines are found.
@@ -110,7 +112,7 @@ def check_no_empty_lines(body: str) -> None:
     """
     logger.info("%s🔹 Checking for empty lines…", LOGS_INDENTATION)
 
-    lines = body.splitlines()
+    lines = KeylayoutIndex.of(body).lines
     empty_lines_info = []
     for i, line in enumerate(lines, start=1):
         if not line.strip():
@@ -132,7 +134,7 @@ def check_no_empty_lines(body: str) -> None:
         logger.success("%sNo empty lines detected.", LOGS_INDENTATION + "\t")
 
 
-def check_ascending_keymaps(body: str) -> None:
+def check_ascending_keymaps(body: str | KeylayoutIndex) -> None:
     """
     Ensure that all <keyMap> blocks are defined in ascending order by their index.
     Raises ValueError if any keyMap is out of order.
@@ -142,15 +144,14 @@ def check_ascending_keymaps(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    keymapset_blocks = re.findall(
-        r"<keyMapSet[^>]*>(.*?)</keyMapSet>", body, flags=re.DOTALL
-    )
+    keymapset_blocks = KeylayoutIndex.of(body).key_map_sets
     all_ok = True
-    for idx, keymapset_body in enumerate(keymapset_blocks):
-        keymap_matches = re.findall(
-            r'<keyMap\s+index=["\'](\d+)["\']', keymapset_body
-        )
-        indices = [int(i) for i in keymap_matches]
+    for idx, keymapset in enumerate(keymapset_blocks):
+        indices = [
+            int(keymap.get("index"))
+            for keymap in keymapset.children_named("keyMap")
+            if (keymap.get("index") or "").isdigit()
+        ]
         last_index = -1
         out_of_order = []
         for pos, i in enumerate(indices):
@@ -183,7 +184,7 @@ def check_ascending_keymaps(body: str) -> None:
         )
 
 
-def check_ascending_keys_in_keymaps(body: str) -> None:
+def check_ascending_keys_in_keymaps(body: str | KeylayoutIndex) -> None:
     """
     Ensure that all <key> elements inside each <keyMap> are in ascending order by code.
     Raises ValueError if any <key> is out of order.
@@ -196,20 +197,15 @@ def check_ascending_keys_in_keymaps(body: str) -> None:
     issues_found = {}
 
     # Iterate over each <keyMap> block
-    for keymap_match in re.finditer(
-        r"<keyMap[^>]*>(.*?)</keyMap>", body, flags=re.DOTALL
-    ):
-        keymap_block = keymap_match.group(0)
-
-        # Extract index
-        index_match = re.search(r'index=["\']([^"\']+)["\']', keymap_block)
-        keymap_label = (
-            f'index="{index_match.group(1)}"' if index_match else "<unknown>"
-        )
+    for keymap in KeylayoutIndex.of(body).key_maps:
+        keymap_label = keymap.label
 
         # Extract codes from <key> elements
-        key_matches = re.findall(r'<key[^>]*code=["\'](\d+)["\']', keymap_block)
-        codes = [int(code) for code in key_matches]
+        codes = [
+            int(key.get("code"))
+            for key in keymap.children_named("key")
+            if (key.get("code") or "").isdigit()
+        ]
 
         # Check order
         last_code = -1
@@ -243,7 +239,7 @@ def check_ascending_keys_in_keymaps(body: str) -> None:
         )
 
 
-def check_ascending_actions(body: str) -> None:
+def check_ascending_actions(body: str | KeylayoutIndex) -> None:
     """
     Verify that all <action> blocks inside <actions> blocks are in alphabetical order by ID.
     Uses the same sort_key logic as sort_actions.
@@ -254,7 +250,11 @@ def check_ascending_actions(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    action_matches = re.findall(r'<action\s+id=["\']([^"\']+)["\']', body)
+    action_matches = [
+        action.get("id")
+        for action in KeylayoutIndex.of(body).actions or []
+        if action.get("id")
+    ]
     last_key = None
     out_of_order = []
 
@@ -313,7 +313,7 @@ def sort_key(id_str: str):
     return tuple(key)
 
 
-def check_attribute_order(body: str) -> None:
+def check_attribute_order(body: str | KeylayoutIndex) -> None:
     """
     Checks that attributes always appear in the same order in <key>, <action>, <when>.
     """
@@ -325,20 +325,17 @@ def check_attribute_order(body: str) -> None:
         "when": ["state", "output", "next"],
     }
 
-    for tag, expected in expected_orders.items():
-        # Regex to match the opening tag and capture attributes
-        pattern = re.compile(rf"<{tag}\s+([^>/]+?)[/?>]")
-        for match in pattern.finditer(body):
-            attrs_str = match.group(1)
-            # Extract attribute names in order
-            attrs = re.findall(r"(\w+)=", attrs_str)
+    for element in KeylayoutIndex.of(body).tags:
+        expected = expected_orders.get(element.name)
+        if expected is not None and element.kind in ("open", "empty"):
+            tag, attrs = element.name, element.names
             if len(attrs) > 1:
                 filtered = [a for a in expected if a in attrs]
                 actual = [a for a in attrs if a in expected]
                 if actual != filtered:
                     logger.error(
                         "%sAttribute order incorrect in <%s>: %s (expected: %s)",
-                        {LOGS_INDENTATION} + "\t",
+                        LOGS_INDENTATION + "\t",
                         tag,
                         attrs,
                         expected,
@@ -1,13 +1,15 @@
 """Tests for validating cross-references in a keylayout."""
 
-import re
-
 from utilities.logger import logger
 
+from .keylayout_index import KeylayoutIndex
+
 LOGS_INDENTATION = "\t\t"
 
 
-def check_each_action_in_keymaps_defined_in_actions(body: str) -> None:
+def check_each_action_in_keymaps_defined_in_actions(
+    body: str | KeylayoutIndex,
+) -> None:
     """
     Ensure that all action names used in keyMaps are defined as <action id="..."> in <actions>.
     Raises ValueError if any keyMap action is missing in <actions>.
@@ -19,39 +21,25 @@ def check_each_action_in_keymaps_defined_in_actions(body: str) -> None:
     )
 
     # Extract all action IDs defined in <actions>
-    actions_match = re.search(
-        r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL
-    )
-    if not actions_match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
         return
 
-    _, actions_body, _ = actions_match.groups()
-    defined_actions = set(re.findall(r'id=["\']([^"\']+)["\']', actions_body))
+    defined_actions = {action.get("id") for action in index.actions}
 
     missing_actions_found = {}
 
     # Iterate over each <keyMap> block
-    for keymap_match in re.finditer(
-        r"<keyMap[^>]*>(.*?)</keyMap>", body, flags=re.DOTALL
-    ):
-        keymap_block = keymap_match.group(0)
-        index_match = re.search(r'index=["\']([^"\']+)["\']', keymap_block)
-        keymap_label = (
-            f'index="{index_match.group(1)}"' if index_match else "<unknown>"
-        )
-
+    for keymap in index.key_maps:
         # Find all <key> elements with an action attribute
-        keys_with_action = re.findall(
-            r'(<key[^>]*action=["\']([^"\']+)["\'][^>]*/>)', keymap_block
-        )
-
-        for full_tag, action_name in keys_with_action:
-            if action_name not in defined_actions:
-                missing_actions_found.setdefault(keymap_label, []).append(
-                    full_tag
+        for key in keymap.children_named("key"):
+            action_name = key.get("action")
+            if action_name and action_name not in defined_actions:
+                missing_actions_found.setdefault(keymap.label, []).append(
+                    key.tag.text
                 )
 
     if missing_actions_found:
@@ -73,7 +61,7 @@ def check_each_action_in_keymaps_defined_in_actions(body: str) -> None:
         )
 
 
-def check_each_action_in_keymaps_is_used(body: str) -> None:
+def check_each_action_in_keymaps_is_used(body: str | KeylayoutIndex) -> None:
     """
     Ensure that every <action id="..."> in <actions> is referenced by at least one <key> in keyMaps.
     """
@@ -83,31 +71,24 @@ def check_each_action_in_keymaps_is_used(body: str) -> None:
     )
 
     # Extract the <actions> block
-    actions_match = re.search(
-        r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL
-    )
-    if not actions_match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
         return
 
-    _, actions_body, _ = actions_match.groups()
-
-    # Find all <action> blocks and map them by id
-    action_blocks = re.findall(
-        r"(\s*<action\b.*?>.*?</action>)", actions_body, flags=re.DOTALL
-    )
+    # Map the <action> blocks by id
     defined_actions = {
-        re.search(r'id=["\']([^"\']+)["\']', blk).group(1): blk
-        for blk in action_blocks
+        action.get("id"): index.text(action) for action in index.actions
     }
 
     # Find all actions used in keyMaps
-    used_action_matches = re.findall(
-        r'<key[^>]*action=["\']([^"\']+)["\'][^>]*/>', body
-    )
-    used_actions = set(used_action_matches)
+    used_actions = {
+        key.get("action")
+        for keymap in index.key_maps
+        for key in keymap.children_named("key")
+    }
 
     # Detect unused actions
     unused_action_ids = list(set(defined_actions.keys()) - used_actions)
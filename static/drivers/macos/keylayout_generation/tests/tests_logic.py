@@ -1,13 +1,13 @@
 """Tests for validating logic in a keylayout."""
 
-import re
-
 from utilities.logger import logger
 
+from .keylayout_index import KeylayoutIndex
+
 LOGS_INDENTATION = "\t\t"
 
 
-def check_each_action_has_when_state_none(body: str) -> None:
+def check_each_action_has_when_state_none(body: str | KeylayoutIndex) -> None:
     """
     Ensure that every <action> block contains at least one <when> with state="none".
     Raises ValueError if any <action> is missing a 'state="none"' definition.
@@ -18,20 +18,18 @@ def check_each_action_has_when_state_none(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    # Extract <action> blocks
-    action_blocks = re.findall(
-        r"(<action\b.*?>.*?</action>)", body, flags=re.DOTALL
-    )
+    index = KeylayoutIndex.of(body)
     offending_actions = []
 
-    for block in action_blocks:
-        # Extract id if present
-        id_match = re.search(r'id=["\']([^"\']+)["\']', block)
-        action_id = id_match.group(1) if id_match else "<unknown>"
+    for action in index.actions or []:
+        action_id = action.get("id") or "<unknown>"
 
         # Check if at least one <when state="none"> exists
-        if not re.search(r'<when\b[^>]*state=["\']none["\']', block):
-            offending_actions.append((action_id, block))
+        if not any(
+            when.get("state") == "none"
+            for when in action.children_named("when")
+        ):
+            offending_actions.append((action_id, index.text(action)))
 
     if offending_actions:
         logger.info(
@@ -50,7 +48,7 @@ def check_each_action_has_when_state_none(body: str) -> None:
         )
 
 
-def check_each_action_when_states_unique(body: str) -> None:
+def check_each_action_when_states_unique(body: str | KeylayoutIndex) -> None:
     """
     Ensure that within each <action> block, all <when> states are unique.
     Raises ValueError if duplicate states are found inside the same <action>.
@@ -61,19 +59,15 @@ def check_each_action_when_states_unique(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    # Extract <action> blocks
-    action_blocks = re.findall(
-        r"(<action\b.*?>.*?</action>)", body, flags=re.DOTALL
-    )
+    index = KeylayoutIndex.of(body)
     duplicates_found = {}
 
-    for block in action_blocks:
-        # Extract id if present
-        id_match = re.search(r'id=["\']([^"\']+)["\']', block)
-        action_id = id_match.group(1) if id_match else "<unknown>"
+    for action in index.actions or []:
+        action_id = action.get("id") or "<unknown>"
 
         # Collect states in this action
-        states = re.findall(r'state=["\']([^"\']+)["\']', block)
+        whens = action.children_named("when")
+        states = [when.get("state") for when in whens if when.get("state")]
         seen = set()
         duplicates = []
 
@@ -84,25 +78,22 @@ def check_each_action_when_states_unique(body: str) -> None:
                 seen.add(s)
 
         if duplicates:
-            duplicates_found[action_id] = (block, duplicates)
+            duplicates_found[action_id] = (whens, duplicates)
 
     if duplicates_found:
         logger.info(
             "%sDuplicate <when> states found inside <action> blocks:",
             LOGS_INDENTATION + "\t",
         )
-        for action_id, (block, duplicates) in duplicates_found.items():
+        for action_id, (whens, duplicates) in duplicates_found.items():
             logger.info(
                 "%s• Action ID « %s »:", LOGS_INDENTATION + "\t\t", action_id
             )
-            # Extract all <when ...> tags from the action block
-            when_blocks = re.findall(r"(<when\b[^>]*?/>)", block)
             # Print only the duplicated states
-            for when_tag in when_blocks:
-                state_match = re.search(r'state=["\']([^"\']+)["\']', when_tag)
-                if state_match and state_match.group(1) in duplicates:
+            for when in whens:
+                if when.get("state") in duplicates:
                     logger.info(
-                        "%s— %s", LOGS_INDENTATION + "\t\t\t", when_tag.strip()
+                        "%s— %s", LOGS_INDENTATION + "\t\t\t", when.tag.text
                     )
         raise ValueError(
             "Some <action> blocks contain duplicate <when> states."
@@ -114,7 +105,7 @@ def check_each_action_when_states_unique(body: str) -> None:
         )
 
 
-def check_terminators_when_states_unique(body: str) -> None:
+def check_terminators_when_states_unique(body: str | KeylayoutIndex) -> None:
     """
     Ensure that all <when> states inside the <terminators> block are unique.
     Raises ValueError if duplicate states are found.
@@ -124,19 +115,17 @@ def check_terminators_when_states_unique(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    # Extract the <terminators> block
-    match = re.search(
-        r"<terminators[^>]*>(.*?)</terminators>", body, flags=re.DOTALL
-    )
-    if not match:
+    terminators = KeylayoutIndex.of(body).terminators
+    if terminators is None:
         logger.warning(
             "%sNo <terminators> block found, skipping.",
             LOGS_INDENTATION + "\t",
         )
         return
 
-    terminators_body = match.group(1)
-    states = re.findall(r'state=["\']([^"\']+)["\']', terminators_body)
+    states = [
+        when.get("state") for when in terminators.children if when.get("state")
+    ]
     seen = set()
     duplicates = []
 
@@ -163,7 +152,9 @@ def check_terminators_when_states_unique(body: str) -> None:
         )
 
 
-def check_when_states_defined_in_terminators(body: str) -> None:
+def check_when_states_defined_in_terminators(
+    body: str | KeylayoutIndex,
+) -> None:
     """
     Ensure that every state used in a <when> inside <actions> is defined in the <terminators> block.
     Raises ValueError if any state is missing in <terminators>.
@@ -174,33 +165,31 @@ def check_when_states_defined_in_terminators(body: str) -> None:
     )
 
     # Extract all states used in <when> inside <actions>
-    actions_match = re.search(
-        r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL
-    )
-    if not actions_match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
         return
-    _, actions_body, _ = actions_match.groups()
-    when_states = set(
-        re.findall(r'<when[^>]*state=["\']([^"\']+)["\']', actions_body)
-    )
+    when_states = {
+        when.get("state")
+        for action in index.actions
+        for when in action.children_named("when")
+        if when.get("state")
+    }
 
     # Extract all states defined in <terminators>
-    terminators_match = re.search(
-        r"<terminators[^>]*>(.*?)</terminators>", body, flags=re.DOTALL
-    )
-    if not terminators_match:
+    if index.terminators is None:
         logger.warning(
             "%sNo <terminators> block found, skipping.",
             LOGS_INDENTATION + "\t",
         )
         return
-    terminators_body = terminators_match.group(1)
-    terminator_states = set(
-        re.findall(r'state=["\']([^"\']+)["\']', terminators_body)
-    )
+    terminator_states = {
+        when.get("state")
+        for when in index.terminators.children
+        if when.get("state")
+    }
 
     # Exclude special states (like 'none') if needed
     special_states = {"none"}
@@ -224,7 +213,7 @@ def check_when_states_defined_in_terminators(body: str) -> None:
         )
 
 
-def check_each_when_has_output_or_next(body: str) -> None:
+def check_each_when_has_output_or_next(body: str | KeylayoutIndex) -> None:
     """
     Ensure that every <when> block inside <actions> has at least one of 'output' or 'next'.
     Raises ValueError if any <when> is missing both attributes.
@@ -235,38 +224,26 @@ def check_each_when_has_output_or_next(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    # Extract the <actions> block
-    match = re.search(r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL)
-    if not match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
         return
 
-    _, actions_body, _ = match.groups()
-
-    # Find all <action>...</action> blocks
-    action_blocks = re.findall(
-        r"(<action\b.*?>.*?</action>)", actions_body, flags=re.DOTALL
-    )
-
     violations = {}
 
-    for action_block in action_blocks:
-        id_match = re.search(r'id=["\']([^"\']+)["\']', action_block)
-        action_id = id_match.group(1) if id_match else "<unknown>"
+    for action in index.actions:
+        action_id = action.get("id") or "<unknown>"
 
-        # Find all <when> tags inside this action
-        when_blocks = re.findall(r"(<when\b[^>]*?/>)", action_block)
-        for when_tag in when_blocks:
-            has_output = bool(
-                re.search(r'output=["\']([^"\']+)["\']', when_tag)
-            )
-            has_next = bool(re.search(r'next=["\']([^"\']+)["\']', when_tag))
+        # Check all <when> tags inside this action
+        for when in action.children_named("when"):
+            has_output = bool(when.get("output"))
+            has_next = bool(when.get("next"))
 
             # Violation if neither output nor next is present
             if not (has_output or has_next):
-                violations.setdefault(action_id, []).append(when_tag)
+                violations.setdefault(action_id, []).append(when.tag.text)
 
     if violations:
         logger.error(
@@ -1,13 +1,13 @@
 """Tests for validating presence and uniqueness in a keylayout."""
 
-import re
-
 from utilities.logger import logger
 
+from .keylayout_index import KeylayoutIndex
+
 LOGS_INDENTATION = "\t\t"
 
 
-def check_each_key_has_a_code(body: str) -> None:
+def check_each_key_has_a_code(body: str | KeylayoutIndex) -> None:
     """
     Ensure that every <key> element inside <keyMap> blocks has a code attribute.
     Raises ValueError if any <key> is missing its code.
@@ -15,29 +15,17 @@ def check_each_key_has_a_code(body: str) -> None:
     """
     logger.info("%s🔹 Checking that every <key> has a code…", LOGS_INDENTATION)
 
+    index = KeylayoutIndex.of(body)
     missing_code_found = {}
 
     # Iterate over each <keyMap> block
-    for keymap_match in re.finditer(
-        r"<keyMap[^>]*>(.*?)</keyMap>", body, flags=re.DOTALL
-    ):
-        keymap_block = keymap_match.group(0)
-
-        # Extract index for logging
-        index_match = re.search(r'index=["\']([^"\']+)["\']', keymap_block)
-        keymap_label = (
-            f'index="{index_match.group(1)}"' if index_match else "<unknown>"
-        )
-
-        # Find all <key> elements in this keyMap
-        key_tags = re.findall(r"(<key\b[^>]*>)", keymap_block)
-
+    for keymap in index.key_maps:
         # Check each <key> for a code attribute
-        for key_tag in key_tags:
-            if not re.search(r'code=["\']([^"\']+)["\']', key_tag):
-                if keymap_label not in missing_code_found:
-                    missing_code_found[keymap_label] = []
-                missing_code_found[keymap_label].append(key_tag)
+        for key in keymap.children_named("key"):
+            if not key.get("code"):
+                if keymap.label not in missing_code_found:
+                    missing_code_found[keymap.label] = []
+                missing_code_found[keymap.label].append(key.tag.text)
 
     if missing_code_found:
         logger.error(
@@ -58,7 +46,7 @@ def check_each_key_has_a_code(body: str) -> None:
         )
 
 
-def check_each_action_has_id(body: str) -> None:
+def check_each_action_has_id(body: str | KeylayoutIndex) -> None:
     """
     Ensure that every <action> element inside the <actions> block has an ID attribute.
     Raises ValueError if any <action> is missing its ID.
@@ -70,25 +58,19 @@ def check_each_action_has_id(body: str) -> None:
 
     missing_id_found = {}
 
-    # Extract the <actions> block
-    match = re.search(r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL)
-    if not match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
         return
 
-    _, actions_body, _ = match.groups()
-
-    # Find all <action> elements in the <actions> block
-    action_tags = re.findall(
-        r"(<action\b.*?>.*?</action>)", actions_body, flags=re.DOTALL
-    )
-
     # Check each <action> for an ID attribute
-    for action_tag in action_tags:
-        if not re.search(r'id=["\']([^"\']+)["\']', action_tag):
-            missing_id_found.setdefault("<actions>", []).append(action_tag)
+    for action in index.actions:
+        if not action.get("id"):
+            missing_id_found.setdefault("<actions>", []).append(
+                index.text(action)
+            )
 
     if missing_id_found:
         logger.error(
@@ -106,7 +88,7 @@ def check_each_action_has_id(body: str) -> None:
         )
 
 
-def check_unique_keymap_indices(body: str) -> None:
+def check_unique_keymap_indices(body: str | KeylayoutIndex) -> None:
     """
     Checks that no <keyMap> index is duplicated.
     """
@@ -114,12 +96,14 @@ def check_unique_keymap_indices(body: str) -> None:
         "%s🔹 Checking unique <keyMap> indices in each <keyMapSet>…",
         LOGS_INDENTATION,
     )
-    keymapset_blocks = re.findall(
-        r"<keyMapSet[^>]*>(.*?)</keyMapSet>", body, flags=re.DOTALL
-    )
+    keymapset_blocks = KeylayoutIndex.of(body).key_map_sets
     all_ok = True
-    for idx, keymapset_body in enumerate(keymapset_blocks):
-        indices = re.findall(r'<keyMap\s+index=["\'](\d+)["\']', keymapset_body)
+    for idx, keymapset in enumerate(keymapset_blocks):
+        indices = [
+            keymap.get("index")
+            for keymap in keymapset.descendants_named("keyMap")
+            if keymap.get("index") is not None
+        ]
         duplicates = set([x for x in indices if indices.count(x) > 1])
         if duplicates:
             logger.error(
@@ -144,7 +128,7 @@ def check_unique_keymap_indices(body: str) -> None:
         )
 
 
-def check_unique_codes_in_keymaps(body: str) -> None:
+def check_unique_codes_in_keymaps(body: str | KeylayoutIndex) -> None:
     """
     Ensure that within each <keyMap>...</keyMap>, all key code attributes are unique.
     Raises ValueError if duplicates are found.
@@ -158,25 +142,15 @@ def check_unique_codes_in_keymaps(body: str) -> None:
     duplicates_found = {}
 
     # Iterate over each <keyMap> block
-    for keymap_match in re.finditer(
-        r"<keyMap[^>]*>(.*?)</keyMap>", body, flags=re.DOTALL
-    ):
-        keymap_block = keymap_match.group(0)
-
-        # Extract index
-        index_match = re.search(r'index=["\']([^"\']+)["\']', keymap_block)
-        keymap_label = (
-            f'index="{index_match.group(1)}"' if index_match else "<unknown>"
-        )
-
-        # Find all <key> elements and their code attributes
-        key_matches = re.findall(
-            r'(<key[^>]*code=["\']([^"\']+)["\'][^>]*/>)', keymap_block
-        )
+    for keymap in KeylayoutIndex.of(body).key_maps:
+        keymap_label = keymap.label
         key_codes_dict = {}
 
-        # Iterate over all matches of <key> elements and their code attributes
-        for full_key_tag, key_code in key_matches:
+        # Iterate over all <key> elements and their code attributes
+        for key in keymap.children_named("key"):
+            full_key_tag, key_code = key.tag.text, key.get("code")
+            if not key_code:
+                continue
             if key_code not in key_codes_dict:
                 # If this code is not yet in the dictionary, create a new list for it
                 key_codes_dict[key_code] = []
@@ -214,7 +188,7 @@ def check_unique_codes_in_keymaps(body: str) -> None:
         )
 
 
-def check_unique_action_ids(body: str) -> None:
+def check_unique_action_ids(body: str | KeylayoutIndex) -> None:
     """
     Ensure that all <action id="..."> blocks inside <actions> have unique ids.
     Raises ValueError if duplicates are found.
@@ -225,29 +199,21 @@ def check_unique_action_ids(body: str) -> None:
         LOGS_INDENTATION,
     )
 
-    # Extract the <actions> block
-    match = re.search(r"(<actions.*?>)(.*?)(</actions>)", body, flags=re.DOTALL)
-    if not match:
+    index = KeylayoutIndex.of(body)
+    if index.actions is None:
         logger.warning(
             "%sNo <actions> block found, skipping.", LOGS_INDENTATION + "\t"
         )
-        return body
-
-    _, actions_body, _ = match.groups()
+        return
 
-    # Find all <action>...</action> blocks (including nested content)
-    action_blocks = re.findall(
-        r"(\s*<action\b.*?>.*?</action>)", actions_body, flags=re.DOTALL
-    )
     ids_dict = {}
 
     # Iterate over all <action> blocks and map by ID
-    for action_block in action_blocks:
-        id_match = re.search(r'id=["\']([^"\']+)["\']', action_block)
-        action_id = id_match.group(1) if id_match else "<unknown>"
+    for action in index.actions:
+        action_id = action.get("id") or "<unknown>"
         if action_id not in ids_dict:
             ids_dict[action_id] = []
-        ids_dict[action_id].append(action_block)
+        ids_dict[action_id].append(index.text(action))
 
     duplicates_found = {
         action_id: blocks
@@ -270,7 +236,9 @@ def check_unique_action_ids(body: str) -> None:
         logger.success("%sNo duplicate action IDs.", LOGS_INDENTATION + "\t")
 
 
-def check_each_key_has_either_output_or_action(body: str) -> None:
+def check_each_key_has_either_output_or_action(
+    body: str | KeylayoutIndex,
+) -> None:
     """
     Ensure that each <key> element in all <keyMap> blocks has either
     an output or an action defined, but not both.
@@ -285,21 +253,13 @@ def check_each_key_has_either_output_or_action(body: str) -> None:
     violations = {}
 
     # Iterate over each <keyMap> block
-    for keymap_match in re.finditer(
-        r"<keyMap[^>]*>(.*?)</keyMap>", body, flags=re.DOTALL
-    ):
-        keymap_block = keymap_match.group(0)
-        index_match = re.search(r'index=["\']([^"\']+)["\']', keymap_block)
-        keymap_label = (
-            f'index="{index_match.group(1)}"' if index_match else "<unknown>"
-        )
-
-        # Find all <key> elements
-        key_tags = re.findall(r"(<key[^>]+/>)", keymap_block)
+    for keymap in KeylayoutIndex.of(body).key_maps:
+        keymap_label = keymap.label
 
-        for key_tag in key_tags:
-            has_output = bool(re.search(r'output=["\'][^"\']+["\']', key_tag))
-            has_action = bool(re.search(r'action=["\'][^"\']+["\']', key_tag))
+        for key in keymap.children_named("key"):
+            key_tag = key.tag.text
+            has_output = bool(key.get("output"))
+            has_action = bool(key.get("action"))
 
             if not has_output and not has_action:
                 # Neither output nor action
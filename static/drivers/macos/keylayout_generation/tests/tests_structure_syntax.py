@@ -5,18 +5,21 @@ import re
 from lxml import etree as lxml_etree
 from utilities.logger import logger
 
+from .keylayout_index import LEAF_ELEMENTS, KeylayoutIndex
+
 LOGS_INDENTATION = "\t\t"
 
 
-def check_valid_xml_structure(body: str) -> None:
+def check_valid_xml_structure(body: str | KeylayoutIndex) -> None:
     """
     Checks that the XML is well-formed (all tags opened/closed, no illegal characters, etc.).
     """
     logger.info("%s🔹 Checking XML structure validity…", LOGS_INDENTATION)
+    index = KeylayoutIndex.of(body)
     try:
         try:
             parser = lxml_etree.XMLParser(recover=True, resolve_entities=True)
-            lxml_etree.fromstring(body.encode("utf-8"), parser)
+            lxml_etree.fromstring(index.body.encode("utf-8"), parser)
         except ImportError:
             logger.warning("%slxml is not installed.", LOGS_INDENTATION + "\t")
     except Exception as e:
@@ -26,7 +29,59 @@ def check_valid_xml_structure(body: str) -> None:
     logger.success("%sXML structure is valid.", LOGS_INDENTATION + "\t")
 
 
-def check_keyboard_element_children(body: str) -> None:
+def check_leaf_elements_self_closed(body: str | KeylayoutIndex) -> None:
+    """
+    Checks that the elements without children (<key>, <when>, <layout>,
+    <modifier>) are self-closed, like <key code="0" output="a"/>.
+    """
+    logger.info(
+        "%s🔹 Checking that %s elements are self-closed…",
+        LOGS_INDENTATION,
+        ", ".join(f"<{name}>" for name in sorted(LEAF_ELEMENTS)),
+    )
+    index = KeylayoutIndex.of(body)
+    for tag in index.unclosed_leaves:
+        logger.error(
+            "%sUnclosed <%s> at line %d: %s",
+            LOGS_INDENTATION + "\t",
+            tag.name,
+            tag.line,
+            tag.text,
+        )
+    if index.unclosed_leaves:
+        raise ValueError(
+            f"{len(index.unclosed_leaves)} element(s) not self-closed."
+        )
+
+    logger.success(
+        "%sAll leaf elements are self-closed.", LOGS_INDENTATION + "\t"
+    )
+
+
+def check_elements_closed(body: str | KeylayoutIndex) -> None:
+    """
+    Checks that every element is closed by its own closing tag, and not by
+    the closing tag of an element holding it or by the end of the file.
+    """
+    logger.info("%s🔹 Checking that every element is closed…", LOGS_INDENTATION)
+    index = KeylayoutIndex.of(body)
+    for tag in index.unclosed_elements:
+        logger.error(
+            "%sUnclosed <%s> at line %d: %s",
+            LOGS_INDENTATION + "\t",
+            tag.name,
+            tag.line,
+            tag.text,
+        )
+    if index.unclosed_elements:
+        raise ValueError(
+            f"{len(index.unclosed_elements)} element(s) not closed."
+        )
+
+    logger.success("%sAll elements are closed.", LOGS_INDENTATION + "\t")
+
+
+def check_keyboard_element_children(body: str | KeylayoutIndex) -> None:
     """
     Checks that <keyboard> contains exactly one <layouts>,
     at least one <modifierMap> and <keyMapSet>,
@@ -35,29 +90,22 @@ def check_keyboard_element_children(body: str) -> None:
     logger.info(
         "%s🔹 Checking <keyboard> element children structure…", LOGS_INDENTATION
     )
-    match = re.search(r"<keyboard[^>]*>(.*)</keyboard>", body, flags=re.DOTALL)
-    if not match:
+    index = KeylayoutIndex.of(body)
+    if index.keyboard is None or index.keyboard.end is None:
         raise ValueError("No <keyboard> block found.")
 
-    inner = match.group(1)
-    # Count first-level child tags
-    layouts = re.findall(r"<layouts[ >]", inner)
-    modifiermaps = re.findall(r"<modifierMap[ >]", inner)
-    keymapsets = re.findall(r"<keyMapSet[ >]", inner)
-    actions = re.findall(r"<actions[ >]", inner)
-    terminators = re.findall(r"<terminators[ >]", inner)
-
-    if len(layouts) != 1:
+    counts = index.counts
+    if counts["layouts"] != 1:
         raise ValueError(
-            f"<keyboard> must contain exactly one <layouts> (found {len(layouts)})"
+            f"<keyboard> must contain exactly one <layouts> (found {counts['layouts']})"
         )
-    if len(modifiermaps) < 1:
+    if counts["modifierMap"] < 1:
         raise ValueError("<keyboard> must contain at least one <modifierMap>.")
-    if len(keymapsets) < 1:
+    if counts["keyMapSet"] < 1:
         raise ValueError("<keyboard> must contain at least one <keyMapSet>.")
-    if len(actions) > 1:
+    if counts["actions"] > 1:
         raise ValueError("<keyboard> must contain at most one <actions>.")
-    if len(terminators) > 1:
+    if counts["terminators"] > 1:
         raise ValueError("<keyboard> must contain at most one <terminators>.")
     logger.success(
         "%s<keyboard> element children structure is valid.",
@@ -65,15 +113,16 @@ def check_keyboard_element_children(body: str) -> None:
     )
 
 
-def check_required_blocks_presence(body: str) -> None:
+def check_required_blocks_presence(body: str | KeylayoutIndex) -> None:
     """
     Checks that all required blocks are present.
     """
     logger.info("%s🔹 Checking required blocks presence…", LOGS_INDENTATION)
 
+    index = KeylayoutIndex.of(body)
     required = ["keyMapSet", "actions", "terminators"]
     for block in required:
-        if not re.search(rf"<{block}[^>]*>", body):
+        if not index.counts[block]:
             logger.error(
                 "%sRequired block <%s> missing.", LOGS_INDENTATION + "\t", block
             )
@@ -84,7 +133,7 @@ def check_required_blocks_presence(body: str) -> None:
     )
 
 
-def check_forbidden_tags_or_attributes(body: str) -> None:
+def check_forbidden_tags_or_attributes(body: str | KeylayoutIndex) -> None:
     """
     Checks that no forbidden tag or attribute is present.
     """
@@ -127,25 +176,42 @@ def check_forbidden_tags_or_attributes(body: str) -> None:
         "state",
         "version",
     }
-    for tag in re.findall(r"<(/?)(\w+)", body):
-        if tag[1] not in allowed_tags:
-            logger.error(
-                "%sForbidden tag: <%s>.", LOGS_INDENTATION + "\t", tag[1]
-            )
-            raise ValueError(f"Forbidden tag: <{tag[1]}>.")
-    for attr in re.findall(r"(\w+)=", body):
-        if attr not in allowed_attrs:
+    index = KeylayoutIndex.of(body)
+    for tag in index.tags:
+        # A "<" inside a tag starts a tag within an attribute value
+        names = [] if tag.kind == "prolog" else [tag.name]
+        names += re.findall(r"<(\w+)", tag.text[1:])
+        for name in names:
+            if name not in allowed_tags:
+                logger.error(
+                    "%sForbidden tag: <%s>.", LOGS_INDENTATION + "\t", name
+                )
+                raise ValueError(f"Forbidden tag: <{name}>.")
+        if "<" in tag.text[1:]:
             logger.error(
-                "%sForbidden attribute: %s.", LOGS_INDENTATION + "\t", attr
+                "%sUnescaped '<' at line %d: %s",
+                LOGS_INDENTATION + "\t",
+                tag.line,
+                tag.text,
             )
-            raise ValueError(f"Forbidden attribute: {attr}.")
+            raise ValueError(f"Unescaped '<' at line {tag.line}.")
+    # The XML declaration holds the version and encoding attributes
+    for tag in index.tags:
+        for attr in tag.names:
+            if attr not in allowed_attrs:
+                logger.error(
+                    "%sForbidden attribute: %s.", LOGS_INDENTATION + "\t", attr
+                )
+                raise ValueError(f"Forbidden attribute: {attr}.")
 
     logger.success(
         "%sNo forbidden tags or attributes.", LOGS_INDENTATION + "\t"
     )
 
 
-def check_forbidden_empty_attribute_values(body: str) -> None:
+def check_forbidden_empty_attribute_values(
+    body: str | KeylayoutIndex,
+) -> None:
     """
     Checks that no required attribute is empty (except output).
     """
@@ -153,14 +219,15 @@ def check_forbidden_empty_attribute_values(body: str) -> None:
         "%s🔹 Checking forbidden empty attribute values…",
         LOGS_INDENTATION,
     )
+    index = KeylayoutIndex.of(body)
     forbidden = ["id", "code", "action", "state"]
-    for match in re.finditer(r"<(\w+)[^>]*>", body):
-        tag = match.group(0)
+    for element in index.tags:
+        if element.kind not in ("open", "empty"):
+            continue
+        tag = element.text
         for attr in forbidden:
-            # Match attribute value (quotes included)
-            attr_match = re.search(rf'{attr}=["\'](.*?)["\']', tag)
-            if attr_match:
-                value = attr_match.group(1)
+            value = element.attributes.get(attr)
+            if value is not None:
                 # Allow a single space as a valid value, but not empty or only whitespace
                 if value == "":
                     logger.error(
@@ -184,16 +251,16 @@ def check_forbidden_empty_attribute_values(body: str) -> None:
     )
 
 
-def check_keyboard_id_format(body: str) -> None:
+def check_keyboard_id_format(body: str | KeylayoutIndex) -> None:
     """
     Check that the keylayout id starts with a minus sign and after that <=8 digits.
     """
     logger.info("%s🔹 Checking <keyboard> id format…", LOGS_INDENTATION)
-    match = re.search(r'<keyboard[^>]* id="([^"]+)"', body)
-    if not match:
+    index = KeylayoutIndex.of(body)
+    kid = index.keyboard.get("id") if index.keyboard is not None else None
+    if not kid:
         raise ValueError("No <keyboard id=...> found.")
 
-    kid = match.group(1)
     if not kid.startswith("-"):
         raise ValueError(f"<keyboard> id does not start with '-': {kid}")
     rest = kid[1:]
@@ -211,13 +278,14 @@ def check_keyboard_id_format(body: str) -> None:
     logger.success("%s<keyboard> id format is valid.", LOGS_INDENTATION + "\t")
 
 
-def check_consistent_attribute_quotes(body: str) -> None:
+def check_consistent_attribute_quotes(body: str | KeylayoutIndex) -> None:
     """
     Check that all attributes use the same type of quotes (single or double) throughout the file.
     """
     logger.info("%s🔹 Checking consistent attribute quotes…", LOGS_INDENTATION)
     # Extract all quote types used for attribute values
-    quotes = re.findall(r'\w+=("|\')', body)
+    index = KeylayoutIndex.of(body)
+    quotes = [quote for tag in index.tags for quote in tag.quotes]
     if quotes:
         if not all(q == quotes[0] for q in quotes):
             logger.error(
@@ -230,7 +298,7 @@ def check_consistent_attribute_quotes(body: str) -> None:
     )
 
 
-def check_xml_attribute_errors(body: str) -> None:
+def check_xml_attribute_errors(body: str | KeylayoutIndex) -> None:
     """
     Ensure XML attributes are well-formed.
     Raises ValueError if malformed attributes are found.
@@ -238,34 +306,35 @@ def check_xml_attribute_errors(body: str) -> None:
     """
     logger.info("%s🔹 Checking for malformed XML attributes…", LOGS_INDENTATION)
 
-    lines = body.splitlines()
+    # Checked line by line, as a malformed attribute may break the tags
+    lines = KeylayoutIndex.of(body).lines
     errors = []
 
     for i, line in enumerate(lines, start=1):
-        stripped = line.strip()
-        if not stripped:
-            continue
-
-        # Find all attribute assignments
-        # Match pattern: key = "value" or key = 'value'
-        attr_matches = re.findall(r'(\w+\s*=\s*["\'].*?["\']?)', line)
-        for attr in attr_matches:
-            # Must contain =
-            if "=" not in attr:
-                errors.append((i, line.strip(), "Missing '=' in attribute"))
-                continue
-
-            _, value = attr.split("=", 1)
-            value = value.strip()
-
-            # Value must start and end with same quote
-            if not (
-                (value.startswith('"') and value.endswith('"'))
-                or (value.startswith("'") and value.endswith("'"))
-            ):
-                errors.append(
-                    (i, line.strip(), "Attribute value not properly quoted")
-                )
+        # The pattern below only captures the opening quote of a value and
+        # the next character if it is a quote: a value can only be badly
+        # quoted on a line holding "' or '"
+        if "\"'" in line or "'\"" in line:
+            # Find all attribute assignments
+            # Match pattern: key = "value" or key = 'value'
+            attr_matches = re.findall(r'(\w+\s*=\s*["\'].*?["\']?)', line)
+            for attr in attr_matches:
+                # Must contain =
+                if "=" not in attr:
+                    errors.append((i, line.strip(), "Missing '=' in attribute"))
+                    continue
+
+                _, value = attr.split("=", 1)
+                value = value.strip()
+
+                # Value must start and end with same quote
+                if not (
+                    (value.startswith('"') and value.endswith('"'))
+                    or (value.startswith("'") and value.endswith("'"))
+                ):
+                    errors.append(
+                        (i, line.strip(), "Attribute value not properly quoted")
+                    )
 
         # Check for unclosed quotes anywhere in the line
         # Count total " and ' not escaped
@@ -291,13 +360,21 @@ def check_xml_attribute_errors(body: str) -> None:
         )
 
 
-def check_max_min_code_state_values(body: str) -> None:
+def check_max_min_code_state_values(body: str | KeylayoutIndex) -> None:
     """
     Checks that code and state numeric values are within reasonable bounds.
     """
     logger.info("%s🔹 Checking code/state value ranges…", LOGS_INDENTATION)
 
-    for code in re.findall(r'code=["\'](-?\d+)["\']', body):
+    index = KeylayoutIndex.of(body)
+    values = {"code": [], "state": []}
+    for tag in index.tags:
+        for attr, attr_values in values.items():
+            value = tag.attributes.get(attr)
+            if value is not None and re.fullmatch(r"-?\d+", value):
+                attr_values.append(value)
+
+    for code in values["code"]:
         val = int(code)
         if val < 0 or val > 255:
             logger.error(
@@ -305,7 +382,7 @@ def check_max_min_code_state_values(body: str) -> None:
             )
             raise ValueError(f"Code value out of range: {val}")
 
-    for state in re.findall(r'state=["\'](-?\d+)["\']', body):
+    for state in values["state"]:
         val = int(state)
         if val < 0 or val > 1000:
             logger.error(
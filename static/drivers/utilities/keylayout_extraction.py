@@ -15,6 +15,13 @@ from .logger import logger
 
 LOGS_INDENTATION = "\t"
 
+_KEY_MAP = re.compile(r'<keyMap index="(\d+)">(.*?)</keyMap>', flags=re.DOTALL)
+_KEY = re.compile(r'<key[^>]*code="(\d+)"[^>]*\b(output|action)="([^"]+)"')
+_ACTION = re.compile(
+    r'<action[^>]*id="([^"]+)"[^>]*>(.*?)</action>', flags=re.DOTALL
+)
+_WHEN_NONE = re.compile(r'<when[^>]*state="none"[^>]*output="([^"]+)"')
+
 
 def extract_name(content: str) -> str:
     """
@@ -273,3 +280,76 @@ def get_symbol(keymap_body: str, macos_code: int, actions_body: str) -> str:
         return html.unescape(when_none.group(1))
 
     return action_name
+
+
+class SymbolTable:
+    """The resolved symbol of every key of a keylayout, built once.
+
+    The document is scanned a single time: each keyMap becomes a list of
+    symbols indexed by key code, resolved like `get_symbol`, so that looking
+    a key up is a list access instead of a search of the document.
+
+    Attributes:
+        outputs: The unescaped output of each action in the none state,
+            by action id. Actions without one are missing.
+        keys: By keyMap index, the (kind, value) of each key code as written
+            in the file, None for a missing key.
+        symbols: By keyMap index, the resolved symbol of each key code, ""
+            for a missing key.
+    """
+
+    __slots__ = ("outputs", "keys", "symbols")
+
+    def __init__(self, content: str):
+        logger.info(
+            "%s🔹 Resolving the symbols of the keylayout…",
+            LOGS_INDENTATION + "\t",
+        )
+        self.outputs = {}
+        seen = set()
+        for match in _ACTION.finditer(extract_actions_body(content)):
+            # The first action of an id wins, even without a none output
+            if match.group(1) in seen:
+                continue
+            seen.add(match.group(1))
+            when_none = _WHEN_NONE.search(match.group(2))
+            if when_none:
+                self.outputs[match.group(1)] = html.unescape(when_none.group(1))
+
+        self.keys = {}
+        self.symbols = {}
+        for key_map in _KEY_MAP.finditer(content):
+            index = int(key_map.group(1))
+            if index in self.keys:
+                # Like extract_keymap_body, the first keyMap of an index wins
+                continue
+            found = {}
+            for key in _KEY.finditer(key_map.group(2)):
+                found.setdefault(
+                    int(key.group(1)), (key.group(2), key.group(3))
+                )
+            keys = [None] * (max(found, default=-1) + 1)
+            symbols = [""] * len(keys)
+            for code, (kind, value) in found.items():
+                keys[code] = (kind, value)
+                symbols[code] = self._resolve(kind, value)
+            self.keys[index] = keys
+            self.symbols[index] = symbols
+
+    def _resolve(self, kind: str, value: str) -> str:
+        value = html.unescape(value)
+        if kind == "output":
+            return value
+        # The action ids are looked up as written, like in get_symbol
+        return self.outputs.get(value, value)
+
+    def key_map(self, index: int) -> list[str]:
+        """The symbols of a keyMap, indexed by key code."""
+        if index not in self.symbols:
+            raise ValueError(f'<keyMap index="{index}"> block not found.')
+        return self.symbols[index]
+
+    def symbol(self, index: int, macos_code: int) -> str:
+        """The symbol of a key code in a keyMap, "" if the key is missing."""
+        symbols = self.key_map(index)
+        return symbols[macos_code] if 0 <= macos_code < len(symbols) else ""
@@ -0,0 +1,653 @@
+"""
+In-memory model of a keylayout file.
+
+A keylayout is parsed once into a KeyLayout: its keyMapSets hold keyMaps
+mapping each key code to an output or an action, its actions map each id to
+the <when> elements of each state, and its terminators map each state to its
+output. The edits are made through methods, and the document is serialized
+once, tab-indented, in the canonical order of the validators after `sort()`.
+
+Attribute values are kept as written in the file, entities included, so
+that an unchanged part of a document is serialized exactly as parsed.
+"""
+
+import re
+import unicodedata
+
+_TOKEN = re.compile(
+    r"<!--.*?-->"
+    r"|<[?!][^>]*>"
+    r"|<(/?)(\w+)((?:\s+\w+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*)\s*(/?)>",
+    flags=re.DOTALL,
+)
+_ATTRIBUTE = re.compile(r"(\w+)\s*=\s*([\"'])(.*?)\2")
+_STATE_NUMBER = re.compile(r"s(\d+)")
+
+# Attributes of a <when>, in their serialization order
+WHEN_ATTRIBUTES = ("state", "output", "next")
+
+
+def sort_key(id_str: str):
+    """
+    Key function for sorting or comparison:
+    - Lowercase letters = 0
+    - Uppercase letters = 1
+    - Symbols/numbers = 2
+    """
+
+    def normalize_id(id_str: str) -> str:
+        """
+        Normalize ID for sorting:
+        - Strip accents to base letters
+        - Preserve original case (so lowercase sorts before uppercase)
+        """
+        nfkd = unicodedata.normalize("NFKD", id_str)
+        return "".join([c for c in nfkd if not unicodedata.combining(c)])
+
+    normalized = normalize_id(id_str)
+    key = []
+    for c in normalized:
+        if c.islower():
+            key.append((0, c))
+        elif c.isupper():
+            key.append((1, c))
+        else:
+            key.append((2, c))
+    return tuple(key)
+
+
+def state_number(state: str) -> int:
+    """Number of a state like "s12_apostrophe", 0 if it has none."""
+    match = _STATE_NUMBER.search(state)
+    return int(match.group(1)) if match else 0
+
+
+def _attributes(text: str) -> dict[str, str]:
+    return {name: value for name, _, value in _ATTRIBUTE.findall(text)}
+
+
+def _quoted(value: str) -> str:
+    """An attribute value in double quotes, or in single quotes if it
+    contains a double quote, as KbdEdit writes it."""
+    return f"'{value}'" if '"' in value else f'"{value}"'
+
+
+def _tag(name: str, attributes: dict[str, str], closed: bool = False) -> str:
+    attributes = "".join(
+        f" {attribute}={_quoted(value)}"
+        for attribute, value in attributes.items()
+    )
+    return f"<{name}{attributes}{'/' if closed else ''}>"
+
+
+def _rekey(items: dict, entries) -> None:
+    """Replace the entries of a dict in place, so that the references to
+    it stay valid."""
+    entries = list(entries)
+    items.clear()
+    items.update(entries)
+
+
+def _elements(text: str):
+    """Yield the (name, attributes, kind) of each element of a document.
+
+    The kind is "open", "close" or "empty". XML declarations, doctypes and
+    comments are yielded as ("", text, "prolog").
+    """
+    position = 0
+    for match in _TOKEN.finditer(text):
+        if text[position : match.start()].strip():
+            raise ValueError(
+                f"Unexpected text in keylayout: "
+                f"{text[position : match.start()].strip()[:40]!r}"
+            )
+        position = match.end()
+        closing, name, attributes, empty = match.groups()
+        if name is None:
+            yield "", match.group(0), "prolog"
+        elif closing:
+            yield name, {}, "close"
+        else:
+            yield name, _attributes(attributes), "empty" if empty else "open"
+    if text[position:].strip():
+        raise ValueError(
+            f"Unexpected text in keylayout: {text[position:].strip()[:40]!r}"
+        )
+
+
+class Key:
+    """A <key code="…" output="…"/> or <key code="…" action="…"/>."""
+
+    __slots__ = ("code", "kind", "value")
+
+    def __init__(self, code: int, kind: str, value: str):
+        self.code = code
+        self.kind = kind
+        self.value = value
+
+    @classmethod
+    def from_attributes(cls, attributes: dict[str, str]) -> "Key":
+        kinds = [kind for kind in ("output", "action") if kind in attributes]
+        if "code" not in attributes or len(kinds) != 1:
+            raise ValueError(f"Invalid <key> attributes: {attributes}")
+        return cls(int(attributes["code"]), kinds[0], attributes[kinds[0]])
+
+    def __str__(self) -> str:
+        return f'<key code="{self.code}" {self.kind}={_quoted(self.value)}/>'
+
+
+class KeyMap:
+    """A <keyMap>, its keys by code."""
+
+    __slots__ = ("index", "keys")
+
+    def __init__(self, index: int | None, keys: dict[int, Key] | None = None):
+        self.index = index
+        self.keys = {} if keys is None else keys
+
+    @classmethod
+    def from_body(cls, body: str, index: int | None = None) -> "KeyMap":
+        """Parse the <key> elements of the inner body of a keyMap."""
+        key_map = cls(index)
+        for name, attributes, _ in _elements(body):
+            if name != "key":
+                raise ValueError(f"Unexpected <{name}> in keyMap {index}.")
+            key_map.add_key(Key.from_attributes(attributes))
+        return key_map
+
+    def add_key(self, key: Key) -> None:
+        if key.code in self.keys:
+            raise ValueError(
+                f"Duplicate key code {key.code} in keyMap {self.index}."
+            )
+        self.keys[key.code] = key
+
+    def set_key(self, code: int, kind: str, value: str) -> None:
+        """Set the output or action of a key, appended if it is missing."""
+        self.keys.pop(code, None)
+        self.keys[code] = Key(code, kind, value)
+
+    def sort(self) -> None:
+        self.keys = dict(sorted(self.keys.items()))
+
+    def body(self) -> str:
+        """The inner body of the keyMap, as extracted from a document."""
+        keys = "".join(f"\n\t\t\t{key}" for key in self.keys.values())
+        return f"{keys}\n\t\t"
+
+
+class KeyMapSet:
+    """A <keyMapSet>, its keyMaps by index."""
+
+    __slots__ = ("id", "key_maps")
+
+    def __init__(self, id: str, key_maps: dict[int, KeyMap] | None = None):
+        self.id = id
+        self.key_maps = {} if key_maps is None else key_maps
+
+
+class When:
+    """A <when> of an action or of the terminators."""
+
+    __slots__ = ("state", "output", "next")
+
+    def __init__(
+        self, state: str, output: str | None = None, next: str | None = None
+    ):
+        self.state = state
+        self.output = output
+        self.next = next
+
+    @classmethod
+    def from_attributes(cls, attributes: dict[str, str]) -> "When":
+        if "state" not in attributes or set(attributes).difference(
+            WHEN_ATTRIBUTES
+        ):
+            raise ValueError(f"Unsupported <when> attributes: {attributes}")
+        return cls(
+            attributes["state"],
+            attributes.get("output"),
+            attributes.get("next"),
+        )
+
+    def __str__(self) -> str:
+        attributes = {
+            name: getattr(self, name)
+            for name in WHEN_ATTRIBUTES
+            if getattr(self, name) is not None
+        }
+        return _tag("when", attributes, closed=True)
+
+
+class Action:
+    """An <action>, its <when> elements by state."""
+
+    __slots__ = ("id", "whens")
+
+    def __init__(self, id: str, whens: dict[str, When] | None = None):
+        self.id = id
+        self.whens = {} if whens is None else whens
+
+    def add_when(self, when: When) -> None:
+        if when.state in self.whens:
+            raise ValueError(
+                f'Action "{self.id}" already has state {when.state} defined.'
+            )
+        self.whens[when.state] = when
+
+
+class KeyLayout:
+    """A parsed keylayout document.
+
+    Attributes:
+        prolog: The XML declaration and doctype lines.
+        keyboard: The attributes of the <keyboard> element.
+        layouts: The attributes of each <layout> element.
+        modifier_map: The attributes of the <modifierMap> element.
+        key_map_selects: The `keys` of the <modifier> elements of each
+            <keyMapSelect>, by mapIndex.
+        key_map_sets: The keyMapSets by id.
+        actions: The index of the actions by id, None without an <actions>
+            block. Edits and sorts update it in place, so that a reference
+            to it stays valid: looking an action up is a dict access.
+        terminators: The terminators by state, None without a
+            <terminators> block.
+    """
+
+    __slots__ = (
+        "prolog",
+        "keyboard",
+        "layouts",
+        "modifier_map",
+        "key_map_selects",
+        "key_map_sets",
+        "actions",
+        "terminators",
+    )
+
+    def __init__(self):
+        self.prolog = []
+        self.keyboard = {}
+        self.layouts = []
+        self.modifier_map = {}
+        self.key_map_selects = {}
+        self.key_map_sets = {}
+        self.actions = None
+        self.terminators = None
+
+    @classmethod
+    def parse(cls, text: str) -> "KeyLayout":
+        """Parse a keylayout document. Comments are dropped.
+
+        A fragment, like a lone <keyMapSelect> block, is parsed into the
+        parts of the model it defines.
+        """
+        layout = cls()
+        key_map_set = key_map = action = select = None
+        parents = []
+        for name, attributes, kind in _elements(text):
+            if kind == "prolog":
+                if not attributes.startswith("<!--"):
+                    layout.prolog.append(attributes)
+                continue
+            if kind == "close":
+                if not parents or parents.pop() != name:
+                    raise ValueError(f"Unexpected </{name}> in keylayout.")
+                continue
+            parent = parents[-1] if parents else None
+            if kind == "open":
+                parents.append(name)
+
+            if name == "keyboard":
+                layout.keyboard = attributes
+            elif name == "layouts":
+                pass
+            elif name == "layout" and parent == "layouts":
+                layout.layouts.append(attributes)
+            elif name == "modifierMap":
+                layout.modifier_map = attributes
+            elif name == "keyMapSelect":
+                select = layout.key_map_selects.setdefault(
+                    int(attributes["mapIndex"]), []
+                )
+            elif name == "modifier" and parent == "keyMapSelect":
+                select.append(attributes["keys"])
+            elif name == "keyMapSet":
+                key_map_set = KeyMapSet(attributes["id"])
+                layout.key_map_sets[key_map_set.id] = key_map_set
+            elif name == "keyMap" and parent == "keyMapSet":
+                key_map = KeyMap(int(attributes["index"]))
+                if key_map.index in key_map_set.key_maps:
+                    raise ValueError(f"Duplicate keyMap {key_map.index}.")
+                key_map_set.key_maps[key_map.index] = key_map
+            elif name == "key" and parent == "keyMap":
+                key_map.add_key(Key.from_attributes(attributes))
+            elif name == "actions":
+                if layout.actions is None:
+                    layout.actions = {}
+            elif name == "action" and parent == "actions":
+                action = Action(attributes["id"])
+                if action.id in layout.actions:
+                    raise ValueError(f'Duplicate action "{action.id}".')
+                layout.actions[action.id] = action
+            elif name == "when" and parent == "action":
+                action.add_when(When.from_attributes(attributes))
+            elif name == "terminators":
+                if layout.terminators is None:
+                    layout.terminators = {}
+            elif name == "when" and parent == "terminators":
+                when = When.from_attributes(attributes)
+                if when.state in layout.terminators:
+                    raise ValueError(f"Duplicate terminator {when.state}.")
+                layout.terminators[when.state] = when
+            else:
+                raise ValueError(f"Unsupported <{name}> in keylayout.")
+        if parents:
+            raise ValueError(f"Unclosed <{parents[-1]}> in keylayout.")
+        return layout
+
+    # ---- Serialization ----
+
+    def to_string(self) -> str:
+        """Serialize the document, tab-indented, in the order of the model."""
+        lines = [*self.prolog, _tag("keyboard", self.keyboard), "\t<layouts>"]
+        lines += [
+            f"\t\t{_tag('layout', attributes, closed=True)}"
+            for attributes in self.layouts
+        ]
+        lines += ["\t</layouts>", f"\t{_tag('modifierMap', self.modifier_map)}"]
+        for index, modifiers in self.key_map_selects.items():
+            lines.append(f'\t\t<keyMapSelect mapIndex="{index}">')
+            lines += [
+                f"\t\t\t<modifier keys={_quoted(keys)}/>" for keys in modifiers
+            ]
+            lines.append("\t\t</keyMapSelect>")
+        lines.append("\t</modifierMap>")
+        for key_map_set in self.key_map_sets.values():
+            lines.append(f"\t<keyMapSet id={_quoted(key_map_set.id)}>")
+            for key_map in key_map_set.key_maps.values():
+                lines.append(f'\t\t<keyMap index="{key_map.index}">')
+                lines += [f"\t\t\t{key}" for key in key_map.keys.values()]
+                lines.append("\t\t</keyMap>")
+            lines.append("\t</keyMapSet>")
+        if self.actions is not None:
+            lines.append("\t<actions>")
+            for action in self.actions.values():
+                lines.append(f"\t\t<action id={_quoted(action.id)}>")
+                lines += [f"\t\t\t{when}" for when in action.whens.values()]
+                lines.append("\t\t</action>")
+            lines.append("\t</actions>")
+        if self.terminators is not None:
+            lines.append("\t<terminators>")
+            lines += [f"\t\t{when}" for when in self.terminators.values()]
+            lines.append("\t</terminators>")
+        lines.append("</keyboard>")
+        return "\n".join(lines)
+
+    # ---- Sorting ----
+
+    def standardize_declaration(self) -> None:
+        self.prolog = [
+            line.replace('encoding="utf-8"', 'encoding="UTF-8"')
+            for line in self.prolog
+        ]
+
+    def sort_modifiers(self) -> None:
+        """Sort the modifier keys of each <modifier>, case-insensitively."""
+        for modifiers in self.key_map_selects.values():
+            modifiers[:] = [
+                " ".join(sorted(keys.split(), key=str.casefold)) if keys else ""
+                for keys in modifiers
+            ]
+
+    def sort_key_maps(self) -> None:
+        for key_map_set in self.key_map_sets.values():
+            key_map_set.key_maps = dict(sorted(key_map_set.key_maps.items()))
+
+    def sort_keys(self) -> None:
+        for key_map_set in self.key_map_sets.values():
+            for key_map in key_map_set.key_maps.values():
+                key_map.sort()
+
+    def sort_actions(self) -> None:
+        """Sort the actions by id, lowercase letters first."""
+        if self.actions is not None:
+            _rekey(
+                self.actions,
+                sorted(
+                    self.actions.items(), key=lambda item: sort_key(item[0])
+                ),
+            )
+
+    def sort_terminators(self) -> None:
+        if self.terminators is not None:
+            _rekey(
+                self.terminators,
+                sorted(
+                    self.terminators.items(),
+                    key=lambda item: state_number(item[0]),
+                ),
+            )
+
+    def sort(self) -> None:
+        """Put the document in the canonical order of the validators."""
+        self.standardize_declaration()
+        self.sort_modifiers()
+        self.sort_key_maps()
+        self.sort_keys()
+        self.sort_actions()
+        self.sort_terminators()
+
+    # ---- keyMaps ----
+
+    def key_maps(self, index: int) -> list[KeyMap]:
+        """The keyMaps of an index, one per keyMapSet defining it."""
+        return [
+            key_map_set.key_maps[index]
+            for key_map_set in self.key_map_sets.values()
+            if index in key_map_set.key_maps
+        ]
+
+    def key_map(self, index: int) -> KeyMap:
+        """The keyMap of an index in the first keyMapSet defining it."""
+        key_maps = self.key_maps(index)
+        if not key_maps:
+            raise ValueError(f'<keyMap index="{index}"> block not found.')
+        return key_maps[0]
+
+    def all_keys(self):
+        """Yield every key of every keyMap."""
+        for key_map_set in self.key_map_sets.values():
+            for key_map in key_map_set.key_maps.values():
+                yield from key_map.keys.values()
+
+    def replace_key_map(self, index: int, keys: dict[int, Key]) -> None:
+        """Replace the keys of the keyMaps of an index with copies of `keys`."""
+        for key_map in self.key_maps(index):
+            key_map.keys = {
+                code: Key(key.code, key.kind, key.value)
+                for code, key in keys.items()
+            }
+
+    def delete_key_map(self, index: int) -> None:
+        """Remove the keyMaps of an index and their keyMapSelect."""
+        self.key_map_selects.pop(index, None)
+        for key_map_set in self.key_map_sets.values():
+            key_map_set.key_maps.pop(index, None)
+
+    def replace_key_map_select(
+        self, index: int, new_index: int, modifiers: list[str]
+    ) -> None:
+        """Replace a keyMapSelect in place, by the one of `new_index`."""
+        if index in self.key_map_selects:
+            self.key_map_selects = {
+                (new_index if i == index else i): (
+                    list(modifiers) if i == index else keys
+                )
+                for i, keys in self.key_map_selects.items()
+            }
+
+    def change_key_map_index(self, old_index: int, new_index: int) -> None:
+        """Renumber a keyMap and its keyMapSelect, in place."""
+
+        def renamed(items: dict) -> dict:
+            return {
+                (new_index if i == old_index else i): value
+                for i, value in items.items()
+            }
+
+        self.key_map_selects = renamed(self.key_map_selects)
+        for key_map_set in self.key_map_sets.values():
+            if old_index in key_map_set.key_maps:
+                key_map_set.key_maps[old_index].index = new_index
+            key_map_set.key_maps = renamed(key_map_set.key_maps)
+
+    def swap_keys(self, code1: int, code2: int) -> None:
+        """Swap two key codes in every keyMap."""
+        for key_map_set in self.key_map_sets.values():
+            for key_map in key_map_set.key_maps.values():
+                keys = key_map.keys
+                first, second = keys.get(code1), keys.get(code2)
+                key_map.keys = {
+                    (
+                        code2 if key is first else code1 if key is second else c
+                    ): key
+                    for c, key in keys.items()
+                }
+                for key, code in ((first, code2), (second, code1)):
+                    if key is not None:
+                        key.code = code
+
+    def rename_modifier_map(self, new_id: str) -> None:
+        """Rename the modifierMap and the references of the layouts."""
+        old_id = self.modifier_map.get("id")
+        if old_id is None:
+            return
+        self.modifier_map["id"] = new_id
+        for attributes in self.layouts:
+            if attributes.get("modifiers") == old_id:
+                attributes["modifiers"] = new_id
+
+    def rename_key_map_set(self, old_id: str, new_id: str) -> None:
+        """Rename a keyMapSet and the references of the layouts."""
+        self.key_map_sets = {
+            (new_id if id == old_id else id): key_map_set
+            for id, key_map_set in self.key_map_sets.items()
+        }
+        self.key_map_sets[new_id].id = new_id
+        for attributes in self.layouts:
+            if attributes.get("mapSet") == old_id:
+                attributes["mapSet"] = new_id
+
+    def map_attribute_values(self, function) -> None:
+        """Apply a function to the value of every attribute of the document.
+
+        The XML declaration and doctype are left as is.
+        """
+        for attributes in (self.keyboard, self.modifier_map, *self.layouts):
+            for name, value in attributes.items():
+                attributes[name] = function(value)
+        for modifiers in self.key_map_selects.values():
+            modifiers[:] = [function(keys) for keys in modifiers]
+        for key in self.all_keys():
+            key.value = function(key.value)
+        whens = list((self.terminators or {}).values())
+        if self.actions is not None:
+            _rekey(
+                self.actions,
+                (
+                    (function(action_id), action)
+                    for action_id, action in self.actions.items()
+                ),
+            )
+            for action_id, action in self.actions.items():
+                action.id = action_id
+                whens += action.whens.values()
+        for when in whens:
+            when.state = function(when.state)
+            if when.output is not None:
+                when.output = function(when.output)
+            if when.next is not None:
+                when.next = function(when.next)
+        for action in (self.actions or {}).values():
+            _rekey(
+                action.whens,
+                ((when.state, when) for when in action.whens.values()),
+            )
+        if self.terminators is not None:
+            _rekey(
+                self.terminators,
+                ((when.state, when) for when in self.terminators.values()),
+            )
+
+    # ---- Actions and terminators ----
+
+    def action(self, action_id: str) -> Action | None:
+        """The action of an id, None if missing."""
+        return None if self.actions is None else self.actions.get(action_id)
+
+    def ensure_action(self, action_id: str) -> Action:
+        """The action of an id, appended with its own output if missing."""
+        if self.actions is None:
+            self.actions = {}
+        action = self.actions.get(action_id)
+        if action is None:
+            action = Action(action_id)
+            action.add_when(When("none", output=action_id))
+            self.actions[action_id] = action
+        return action
+
+    def set_action_next_state(self, action_id: str, state: str) -> None:
+        """Make the state none of an action go to another state."""
+        action = self.action(action_id)
+        if action is not None and "none" in action.whens:
+            action.whens["none"] = When("none", next=state)
+
+    def set_action_output(self, action_id: str, output: str) -> None:
+        """Make the state none of an action type an output."""
+        action = self.action(action_id)
+        if action is not None and "none" in action.whens:
+            action.whens["none"] = When("none", output=output)
+
+    def add_action_when(self, action_id: str, state: str, output: str) -> None:
+        """Add a state to an action, created if missing.
+
+        Raises ValueError if the action already has this state.
+        """
+        self.ensure_action(action_id).add_when(When(state, output=output))
+
+    def add_terminator(self, state: str, output: str) -> None:
+        """Add the terminator of a state.
+
+        Raises ValueError if the state already has a terminator.
+        """
+        if self.terminators is None:
+            self.terminators = {}
+        if state in self.terminators:
+            raise ValueError(
+                f"Layer {state} already exists in <terminators> block."
+            )
+        self.terminators[state] = When(state, output=output)
+
+    def use_action(
+        self, action_id: str, extra_keys, indices=(0, 1, 2, 3, 5, 6, 7, 8)
+    ) -> None:
+        """Make the keys typing `action_id` use its action.
+
+        In the keyMaps of `indices`, every key whose output or action is
+        `action_id` triggers the action, except the keys of `extra_keys`,
+        which type it directly.
+        """
+        self.use_actions({action_id}, extra_keys, indices)
+
+    def use_actions(
+        self, action_ids, extra_keys, indices=(0, 1, 2, 3, 5, 6, 7, 8)
+    ) -> None:
+        """`use_action` for a set of action ids, in a single pass."""
+        for index in indices:
+            for key_map in self.key_maps(index):
+                for key in key_map.keys.values():
+                    if key.value in action_ids:
+                        key.kind = (
+                            "output" if key.code in extra_keys else "action"
+                        )
@@ -1,9 +1,11 @@
 """
 Utility for modifying information from keylayout files.
-"""
 
-import re
+Each function parses the keylayout into a KeyLayout, edits it and
+serializes it back. To chain many edits, use the KeyLayout methods directly.
+"""
 
+from .keylayout_model import KeyLayout, KeyMap
 from .logger import logger
 
 LOGS_INDENTATION = "\t"
@@ -14,21 +16,17 @@ def modify_name_from_file(content: str, new_name: str) -> str:
     Modifies the name string (e.g. My Key Layout)
     in the name attribute of the given file.
     """
-
-    content = re.sub(r'name="([^"]+)"', f'name="{new_name}"', content)
-
-    return content
+    layout = KeyLayout.parse(content)
+    layout.keyboard["name"] = new_name
+    return layout.to_string()
 
 
 def replace_keymap(body: str, index: int, new_body: str) -> str:
     """Replace an existing keyMap body while keeping the original <keyMap> tags."""
     logger.info("%s🔹 Replacing keymap %d…", LOGS_INDENTATION + "\t", index)
-    return re.sub(
-        rf'(<keyMap index="{index}">).*?(</keyMap>)',
-        rf"\1{new_body}\2",
-        body,
-        flags=re.DOTALL,
-    )
+    layout = KeyLayout.parse(body)
+    layout.replace_key_map(index, KeyMap.from_body(new_body).keys)
+    return layout.to_string()
 
 
 def delete_keymap(body: str, keymap_index: int) -> str:
@@ -48,25 +46,9 @@ def delete_keymap(body: str, keymap_index: int) -> str:
         keymap_index,
     )
 
-    logger.info(
-        '%sRemoving <keyMapSelect mapIndex="%s"> blocks…',
-        LOGS_INDENTATION + "\n",
-        keymap_index,
-    )
-    keymapselect_pattern = (
-        rf'\n\t*<keyMapSelect mapIndex="{keymap_index}".*?</keyMapSelect>'
-    )
-    body, _ = re.subn(keymapselect_pattern, "", body, flags=re.DOTALL)
-
-    logger.info(
-        '%sRemoving <keyMap index="%s"> blocks…',
-        LOGS_INDENTATION + "\n",
-        keymap_index,
-    )
-    keymap_pattern = rf'<keyMap index="{keymap_index}".*?</keyMap>'
-    body, _ = re.subn(keymap_pattern, "", body, flags=re.DOTALL)
-
-    return body
+    layout = KeyLayout.parse(body)
+    layout.delete_key_map(keymap_index)
+    return layout.to_string()
 
 
 def replace_keymapselect(body: str, index: int, replacement: str) -> str:
@@ -79,10 +61,12 @@ def replace_keymapselect(body: str, index: int, replacement: str) -> str:
         index,
     )
 
-    pattern = rf'<keyMapSelect mapIndex="{index}">.*?</keyMapSelect>'
-    body = re.sub(pattern, replacement, body, flags=re.DOTALL)
-
-    return body
+    layout = KeyLayout.parse(body)
+    ((new_index, modifiers),) = KeyLayout.parse(
+        replacement
+    ).key_map_selects.items()
+    layout.replace_key_map_select(index, new_index, modifiers)
+    return layout.to_string()
 
 
 def change_keymap_id(body: str, old_index: int, new_index: int) -> str:
@@ -103,25 +87,9 @@ def change_keymap_id(body: str, old_index: int, new_index: int) -> str:
         new_index,
     )
 
-    logger.info(
-        '%sUpdating <keyMap index="%s"> to <keyMap index="%s">…',
-        LOGS_INDENTATION + "\t\t",
-        old_index,
-        new_index,
-    )
-    body = re.sub(
-        f'<keyMap index="{old_index}"', f'<keyMap index="{new_index}"', body
-    )
-
-    logger.info(
-        '%sUpdating <keyMapSelect mapIndex="%s"> to <keyMapSelect mapIndex="%s">…',
-        LOGS_INDENTATION + "\t\t",
-        old_index,
-        new_index,
-    )
-    body = re.sub(f'mapIndex="{old_index}"', f'mapIndex="{new_index}"', body)
-
-    return body
+    layout = KeyLayout.parse(body)
+    layout.change_key_map_index(old_index, new_index)
+    return layout.to_string()
 
 
 def replace_modifier_map_id(content: str) -> str:
@@ -134,22 +102,14 @@ def replace_modifier_map_id(content: str) -> str:
         LOGS_INDENTATION + "\t",
     )
 
-    # Find the id value in <modifierMap id="...">
-    match = re.search(r'\t?<modifierMap\s+id="([^"]+)"', content)
-    if not match:
+    layout = KeyLayout.parse(content)
+    if "id" not in layout.modifier_map:
         logger.warning(
             "%sNo <modifierMap id=...> found.", LOGS_INDENTATION + "\t"
         )
         return content
-    old_id = match.group(1)
-
-    # Replace all occurrences of the old id in the content (as attribute value)
-    content = re.sub(
-        rf'([\s"=]){re.escape(old_id)}([\s"/])',
-        r"\1commonModifiers\2",
-        content,
-    )
-    return content
+    layout.rename_modifier_map("commonModifiers")
+    return layout.to_string()
 
 
 def replace_keymapset_id_with_layout(content: str) -> str:
@@ -160,23 +120,15 @@ def replace_keymapset_id_with_layout(content: str) -> str:
         "%s🔹 Replacing <keyMapSet id=...> with id='layout'…",
         LOGS_INDENTATION + "\t",
     )
-    # Find the id value in <keyMapSet id="...">
-    match = re.search(r'<keyMapSet\s+id="([^"]+)"', content)
-    if not match:
+    layout = KeyLayout.parse(content)
+    if not layout.key_map_sets:
         logger.warning(
             "%sNo <keyMapSet id=...> found.", LOGS_INDENTATION + "\t"
         )
         return content
-    old_id = match.group(1)
-    # Replace the id in <keyMapSet ...>
-    content = re.sub(
-        r'(<keyMapSet\s+id=")[^"]+("[^>]*>)', r"\1layout\2", content, count=1
-    )
-    # Replace all references to the old id (e.g. mapSet="16c")
-    content = re.sub(
-        rf'(mapSet=")({re.escape(old_id)})(")', r"\1layout\3", content
-    )
-    return content
+    # Only the first keyMapSet is renamed, with its references (mapSet="16c")
+    layout.rename_key_map_set(next(iter(layout.key_map_sets)), "layout")
+    return layout.to_string()
 
 
 def swap_keys(body: str, key1: int, key2: int) -> str:
@@ -187,7 +139,6 @@ def swap_keys(body: str, key1: int, key2: int) -> str:
         key1,
         key2,
     )
-    body = re.sub(f'code="{key2}"', "TEMP_CODE", body)
-    body = re.sub(f'code="{key1}"', f'code="{key2}"', body)
-    body = re.sub(r"TEMP_CODE", f'code="{key1}"', body)
-    return body
+    layout = KeyLayout.parse(body)
+    layout.swap_keys(key1, key2)
+    return layout.to_string()
@@ -1,51 +1,56 @@
-import re
-
+from utilities.keylayout_model import KeyLayout, KeyMap
+from utilities.layer_names import create_layer_name
 from utilities.logger import logger
 
 LOGS_INDENTATION = "\t"
 
 
+def _edit(body: str | KeyLayout, edit) -> str | KeyLayout:
+    """
+    Apply an edit to a keylayout.
+    A KeyLayout is edited in place and returned: its action index is shared
+    by all the helpers, so that chained edits look actions up in O(1).
+    A string is parsed, edited and serialized back.
+    """
+    if isinstance(body, KeyLayout):
+        edit(body)
+        return body
+    layout = KeyLayout.parse(body)
+    edit(layout)
+    return layout.to_string()
+
+
 def convert_actions_to_outputs(body: str) -> str:
-    """Convert all action="..." attributes to output="..."."""
+    """Convert all action="..." attributes of a keyMap body to output="..."."""
     logger.info(
         "%s🔹 Converting all action attributes to output…",
         LOGS_INDENTATION + "\t",
     )
-    return re.sub(r'action="([^"]+)"', r'output="\1"', body)
+    key_map = KeyMap.from_body(body)
+    for key in key_map.keys.values():
+        key.kind = "output"
+    return key_map.body()
 
 
-def ensure_action_block_exists(body: str, action_id: str) -> str:
+def ensure_action_block_exists(
+    body: str | KeyLayout, action_id: str
+) -> str | KeyLayout:
     """
     Ensure an <action id="..."> block exists.
-    - Matches <action ... id="ID" ...> or <action ... id='ID' ...> wherever the id attribute is placed.
-    - If missing, inserts the block before the closing </actions>, using the same indentation.
+    If missing, it is added at the end of the <actions> block,
+    with <when state="none" output="ID"/>.
     """
     logger.debug(
         '%sEnsuring <action id="%s"> block exists…',
         LOGS_INDENTATION + "\t",
         action_id,
     )
-
-    # Match <action ... id="action_id" ...> or with single quotes, id can be anywhere in the tag
-    pattern = rf'<action\b[^>]*\bid\s*=\s*(["\']){re.escape(action_id)}\1'
-
-    if not re.search(pattern, body):
-        indentation = "\n\t\t"
-        block = (
-            f'{indentation}<action id="{action_id}">{indentation}'
-            f'\t<when state="none" output="{action_id}"/>{indentation}'
-            f"</action>"
-        )
-
-        # Insert the <action> block just before the end of the <actions> block
-        body = re.sub(r"(\s*</actions>)", block + r"\1", body, count=1)
-
-    return body
+    return _edit(body, lambda layout: layout.ensure_action(action_id))
 
 
 def assign_layer_to_action_block_none(
-    body: str, trigger_key: str, layer_name: str
-) -> str:
+    body: str | KeyLayout, trigger_key: str, layer_name: str
+) -> str | KeyLayout:
     """
     Assigns a next state (layer) to a single <action id="..."> in the body.
     Modifies the default <when state="none"/> line to include a 'next' state.
@@ -57,23 +62,15 @@ def assign_layer_to_action_block_none(
         layer_name,
         trigger_key,
     )
-
-    def repl(match):
-        header, body, footer = match.groups()
-        body = re.sub(
-            r'<when state="none"[^>]*>',
-            f'<when state="none" next="{layer_name}"/>',
-            body,
-        )
-        return f"{header}{body}{footer}"
-
-    pattern = rf'(<action id="{re.escape(trigger_key)}">)(.*?)(</action>)'
-    body = re.sub(pattern, repl, body, flags=re.DOTALL)
-
-    return body
+    return _edit(
+        body,
+        lambda layout: layout.set_action_next_state(trigger_key, layer_name),
+    )
 
 
-def add_terminator_state(body: str, output: str, layer_name: int) -> str:
+def add_terminator_state(
+    body: str | KeyLayout, output: str, layer_name: int
+) -> str | KeyLayout:
     """
     Add a <when state="sX" output="..."/> line inside the <terminators> block.
     Raises ValueError if the state already exists.
@@ -84,26 +81,12 @@ def add_terminator_state(body: str, output: str, layer_name: int) -> str:
         layer_name,
         output,
     )
-
-    def repl(match):
-        header, body, footer = match.groups()
-        # Check if layer already exists
-        if re.search(rf'<when state="{re.escape(layer_name)}"', body):
-            raise ValueError(
-                f"Layer {layer_name} already exists in <terminators> block."
-            )
-        new_line = f'\t<when state="{layer_name}" output="{output}"/>'
-        return f"{header}{body}{new_line}\n\t{footer}"
-
-    pattern = r"(<terminators>)(.*?)(</terminators>)"
-    body = re.sub(pattern, repl, body, flags=re.DOTALL)
-
-    return body
+    return _edit(body, lambda layout: layout.add_terminator(layer_name, output))
 
 
 def ensure_key_uses_action_and_not_output(
-    body: str, action_id: str, extra_keys: list[int]
-) -> str:
+    body: str | KeyLayout, action_id: str, extra_keys: list[int]
+) -> str | KeyLayout:
     """
     Ensure that in <keyMap index="0|1|2|3|5|6|7|8"> blocks,
     any <key ... output="action_id" or action="action_id"> becomes
@@ -115,39 +98,12 @@ def ensure_key_uses_action_and_not_output(
         LOGS_INDENTATION + "\t",
         action_id,
     )
-    for idx in (0, 1, 2, 3, 5, 6, 7, 8):
-        pattern = rf'(<keyMap index="{idx}">)(.*?)(</keyMap>)'
-
-        def repl_keymap(m):
-            header, content, footer = m.groups()
-
-            def key_repl(km):
-                tag = km.group(0)
-                code_match = re.search(r'code="(\d+)"', tag)
-                code = int(code_match.group(1)) if code_match else None
-                if re.search(rf'(output|action)="{re.escape(action_id)}"', tag):
-                    new_tag = re.sub(r'\s+(output|action)="[^"]*"', "", tag)
-                    if code in extra_keys:
-                        new_tag = (
-                            new_tag[:-2].rstrip() + f' output="{action_id}"/>'
-                        )
-                    else:
-                        new_tag = (
-                            new_tag[:-2].rstrip() + f' action="{action_id}"/>'
-                        )
-                    return new_tag
-                return tag
-
-            new_content = re.sub(r"<key\b[^>]*?/?>", key_repl, content)
-            return f"{header}{new_content}{footer}"
-
-        body = re.sub(pattern, repl_keymap, body, flags=re.DOTALL)
-    return body
+    return _edit(body, lambda layout: layout.use_action(action_id, extra_keys))
 
 
 def add_action_when_state(
-    body: str, trigger: str, layer: int, output: str
-) -> str:
+    body: str | KeyLayout, trigger: str, layer: int, output: str
+) -> str | KeyLayout:
     """
     Insert a new <when state="sX" output="..."/> line inside the <action id="..."> block.
     Raises a ValueError if a <when> with the same state already exists.
@@ -159,19 +115,84 @@ def add_action_when_state(
         output,
         trigger,
     )
+    return _edit(
+        body, lambda layout: layout.add_action_when(trigger, layer, output)
+    )
 
-    def repl(match):
-        header, body, footer = match.groups()
-        # Check if the state already exists
-        if re.search(rf'state="{re.escape(layer)}"', body):
-            raise ValueError(
-                f'Action "{trigger}" already has state {layer} defined.'
-            )
-        new_line = f'\t<when state="{layer}" output="{output}"/>'
-        return f"{header}{body}{new_line}\n\t\t{footer}"
-
-    pattern = rf'(<action id="{re.escape(trigger)}">)(.*?)(</action>)'
-    body = ensure_action_block_exists(body, trigger)
-    body = re.sub(pattern, repl, body, flags=re.DOTALL)
 
-    return body
+def add_dead_keys(
+    body: str | KeyLayout,
+    mappings: dict,
+    start_layer: int,
+    extra_keys: list[int],
+) -> str | KeyLayout:
+    """
+    Add all the dead keys of a mapping table in a single pass.
+
+    `mappings` maps each feature to its "trigger" key and its "map" of
+    (trigger, output) pairs, like rolls_mappings.plus_mappings. The feature
+    number i gets the layer start_layer + i, and the features without pairs
+    are skipped. For each dead key, as with the helpers above:
+    - its action goes to the layer, which gets a terminator;
+    - each trigger gets an action typing its output in the layer.
+
+    All the changes are computed first, then the keys of every trigger are
+    switched to their actions in one pass over the keyMaps, and the actions
+    and terminators are added to the keylayout, parsed and serialized once
+    if it is a string.
+    Raises ValueError if a layer or an action state already exists.
+    """
+    actions = {}  # Every action id to ensure, by first use
+    next_states = {}
+    terminators = {}
+    whens = []
+    for i, (feature, data) in enumerate(mappings.items()):
+        trigger_key = data["trigger"]
+        layer_name = create_layer_name(start_layer + i, trigger_key)
+        logger.info(
+            "%s🔹 Adding feature '%s' with trigger '%s' at layer %s…",
+            LOGS_INDENTATION + "\t",
+            feature,
+            trigger_key,
+            layer_name,
+        )
+        if not data["map"]:
+            continue
+
+        actions[trigger_key] = None
+        next_states[trigger_key] = layer_name
+        terminators[layer_name] = trigger_key
+
+        for trigger, output in data["map"]:
+            # Skip empty triggers to avoid empty XML action IDs
+            if not trigger or not trigger.strip():
+                logger.debug(
+                    "%s— Skipping empty trigger for output '%s'…",
+                    LOGS_INDENTATION + "\t\t",
+                    output,
+                )
+                continue
+            logger.debug(
+                "%s— Adding output '%s' + '%s' ➜ '%s'…",
+                LOGS_INDENTATION + "\t\t",
+                trigger_key,
+                trigger,
+                output,
+            )
+            actions.setdefault(trigger, None)
+            whens.append((trigger, layer_name, output))
+
+    def apply(layout: KeyLayout) -> None:
+        # Otherwise the keys of the triggers would always type the same
+        # output, despite being in a dead key layer
+        layout.use_actions(actions.keys(), extra_keys)
+        for action_id in actions:
+            layout.ensure_action(action_id)
+        for trigger_key, layer_name in next_states.items():
+            layout.set_action_next_state(trigger_key, layer_name)
+        for layer_name, trigger_key in terminators.items():
+            layout.add_terminator(layer_name, trigger_key)
+        for trigger, layer_name, output in whens:
+            layout.add_action_when(trigger, layer_name, output)
+
+    return _edit(body, apply)
@@ -1,9 +1,6 @@
-import re
-
 from data.symbol_names import ALIAS_TO_ENTITY
 
-from utilities.keylayout_extraction import extract_keymap_body
-from utilities.keylayout_modification import replace_keymap
+from utilities.keylayout_model import KeyLayout, KeyMap
 from utilities.logger import logger
 
 LOGS_INDENTATION = "\t"
@@ -54,52 +51,29 @@ def normalize_attribute_entities(body: str) -> str:
             i += 1
         return "".join(normalized_chars)
 
-    def replace_attribute(match):
-        attr_name = match.group(1)
-        value = match.group(3)
-        return f'{attr_name}="{normalize_value(value)}"'
-
-    # Match attributes like output="...", output='...', action="..."
-    return re.sub(r'(\w+)\s*=\s*(["\'])(.*?)\2', replace_attribute, body)
+    layout = KeyLayout.parse(body)
+    layout.map_attribute_values(normalize_value)
+    return layout.to_string()
 
 
 def replace_action_to_output_extra_keys(
     body: str, extra_keys: list[int]
 ) -> str:
     """Replace action="..." to output="..." for extra keys."""
-
-    def repl(match):
-        code = int(match.group(1))
-        if code in extra_keys:
-            return match.group(0).replace('action="', 'output="')
-        return match.group(0)
-
-    pattern = r'<key code="(\d+)"([^>]*)action="[^"]*"([^>]*)>'
-    fixed_body = re.sub(pattern, repl, body)
-
-    # Special case: code=10/50 action="$" → output="$" (even if not in EXTRA_KEYS)
-    fixed_body = re.sub(
-        r'<key code="10"([^>]*)action="\$"([^>]*)>',
-        r'<key code="10"\1output="$"\2>',
-        fixed_body,
-    )
-    fixed_body = re.sub(
-        r'<key code="50"([^>]*)action="\$"([^>]*)>',
-        r'<key code="50"\1output="$"\2>',
-        fixed_body,
-    )
+    layout = KeyLayout.parse(body)
+    for key in layout.all_keys():
+        # Special case: code=10/50 action="$" → output="$" (even if not in EXTRA_KEYS)
+        if key.code in extra_keys or (
+            key.code in (10, 50) and key.value == "$"
+        ):
+            key.kind = "output"
 
     # Replace action by output for the j key (8) on Shift + AltGr + J (layer 6)
-    keymap_6 = extract_keymap_body(fixed_body, 6)
-    new_keymap_6 = re.sub(
-        r'(<key code="8") action="(.*)"',
-        r'\1 output="\2"',
-        keymap_6,
-    )
-    # Reinsert the modified keymap into the full body and update fixed_body.
-    fixed_body = replace_keymap(fixed_body, 6, new_keymap_6)
+    keymap_6 = layout.key_map(6)
+    if 8 in keymap_6.keys:
+        keymap_6.keys[8].kind = "output"
 
-    return fixed_body
+    return layout.to_string()
 
 
 def modify_accented_letters_shortcuts(body: str) -> str:
@@ -115,15 +89,13 @@ def modify_accented_letters_shortcuts(body: str) -> str:
         "12": "z",
     }
 
+    key_map = KeyMap.from_body(body)
     for code, new_value in replacements.items():
         # Replace the body inside output or action for the given code
-        body = re.sub(
-            rf'(<key code="{code}"[^>]*(output|action)=")[^"]*(")',
-            rf"\1{new_value}\3",
-            body,
-        )
+        if int(code) in key_map.keys:
+            key_map.keys[int(code)].value = new_value
 
-    return body
+    return key_map.body()
 
 
 def fix_ctrl_symbols(body: str) -> str:
@@ -131,10 +103,8 @@ def fix_ctrl_symbols(body: str) -> str:
     logger.info(
         "%s🔹 Fixing keymap 4 symbols in body…", LOGS_INDENTATION + "\t"
     )
-    body = re.sub(
-        r'(<key code="24"[^>]*(output|action)=")[^"]*(")', r"\1+\3", body
-    )
-    body = re.sub(
-        r'(<key code="27"[^>]*(output|action)=")[^"]*(")', r"\1-\3", body
-    )
-    return body
+    key_map = KeyMap.from_body(body)
+    for code, value in ((24, "+"), (27, "-")):
+        if code in key_map.keys:
+            key_map.keys[code].value = value
+    return key_map.body()
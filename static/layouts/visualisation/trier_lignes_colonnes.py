@@ -553,14 +553,19 @@ def custom_sort(item):
     return (int(item["row"]), int(item["column"]))
 
 
-# Trier les données en utilisant la fonction de tri personnalisée
-data_trie = sorted(data["iso"], key=custom_sort)
+def main():
+    # Trier les données en utilisant la fonction de tri personnalisée
+    data_trie = sorted(data["iso"], key=custom_sort)
 
-# Ouverture du fichier en mode écriture avec l'encodage UTF-8
-with open("donnees_triees.json", "w", encoding="utf-8") as fichier:
-    # Écriture des données triées au format JSON dans le fichier
-    json.dump(data_trie, fichier, ensure_ascii=False, indent=4)
+    # Ouverture du fichier en mode écriture avec l'encodage UTF-8
+    with open("donnees_triees.json", "w", encoding="utf-8") as fichier:
+        # Écriture des données triées au format JSON dans le fichier
+        json.dump(data_trie, fichier, ensure_ascii=False, indent=4)
 
-print(
-    "Données triées écrites dans le fichier 'donnees_triees.json' au format JSON avec l'encodage UTF-8."
-)
+    print(
+        "Données triées écrites dans le fichier 'donnees_triees.json' au format JSON avec l'encodage UTF-8."
+    )
+
+
+if __name__ == "__main__":
+    main()